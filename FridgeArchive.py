@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/12/2020
+Project: Rigetti
+File: FridgeArchive.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Compact binary archive of cycle data, read through mmap without parsing.
+
+    The file is a small header, a table of the fridges, then fixed width records sorted by
+    fridge_id and then cycle number:
+
+        header: 'FRIDGEC1' | header size, including the fridge table (uint32) | record size (uint32) |
+                number of records (uint64) | timestamp of the data (int64 microseconds since the epoch) |
+                number of fridges (uint64)
+        fridge: fridge_id (int64) | position of its first record (uint64) | number of records (uint64)
+        record: fridge_id | cycle | cooldown_start | cooldown_end | warmup_start | warmup_end
+                (int64 each, timestamps in seconds since the epoch)
+
+    All little-endian.  Opening an archive only maps it and reads the header and fridge table;
+    the records are used in place as an int64 array view (a NumPy structured array when numpy
+    is installed), and pages are only read from disk as they are touched.  A cycle is found by
+    bisecting the cycle column within its fridge's records, so a million cycle archive opens
+    instantly and a query reads a handful of pages.
+"""
+import bisect
+import mmap
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from FridgeJournal import Timestamp_Key, Timestamp_From_Key
+from FridgeRecords import CycleRecord, FridgeSummary, FridgeTotals, Make_Summary, To_Epoch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+ARCHIVE_MAGIC = b'FRIDGEC1'
+ARCHIVE_HEADER = struct.Struct('<8sIIQqQ')
+ARCHIVE_FRIDGE = struct.Struct('<qQQ')
+RECORD_FIELDS = ['fridge_id', 'cycle', 'cooldown_start', 'cooldown_end', 'warmup_start', 'warmup_end']
+ARCHIVE_RECORD = struct.Struct('<' + 'q' * len(RECORD_FIELDS))
+RECORD_DTYPE = None if numpy is None else numpy.dtype([(field, '<i8') for field in RECORD_FIELDS])
+FIELD_CYCLE = 1
+
+
+class _Column(object):
+    """
+    One field of the records, as a sequence for bisect
+    """
+    def __init__(self, values: memoryview, field: int):
+        self._values = values
+        self._field = field
+
+    def __len__(self) -> int:
+        return len(self._values) // len(RECORD_FIELDS)
+
+    def __getitem__(self, i: int) -> int:
+        return self._values[i * len(RECORD_FIELDS) + self._field]
+
+
+class CycleArchive(object):
+    """
+    A cycle archive opened read-only through mmap
+    """
+    def __init__(self, path: str):
+        if sys.byteorder != 'little':
+            raise ValueError("Cycle archives can only be mapped on little-endian machines")
+        self._path = os.path.abspath(path)
+        with open(self._path, 'rb') as archive_file:
+            self._map = mmap.mmap(archive_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, header_size, record_size, count, timestamp_key, fridge_count = ARCHIVE_HEADER.unpack_from(self._map)
+        if magic != ARCHIVE_MAGIC or record_size != ARCHIVE_RECORD.size or \
+                header_size != ARCHIVE_HEADER.size + fridge_count * ARCHIVE_FRIDGE.size:
+            self._map.close()
+            raise ValueError(f"{self._path} is not a cycle archive")
+        if len(self._map) < header_size + count * record_size:
+            self._map.close()
+            raise ValueError(f"{self._path} is truncated, {count} records expected")
+        if hasattr(self._map, 'madvise'):
+            # Queries bisect all over the file, read-ahead would only pull in pages never looked at
+            self._map.madvise(mmap.MADV_RANDOM)
+        self._count = count
+        self._timestamp = Timestamp_From_Key(timestamp_key)
+        # Flat int64 view of the records, six values each; nothing is copied
+        self._values = memoryview(self._map)[header_size:header_size + count * record_size].cast('q')
+        self._cycles = _Column(self._values, FIELD_CYCLE)
+        # {fridge_id: range of its record positions}, in fridge_id order
+        self._fridges = {fridge_id: range(first, first + number)
+                         for fridge_id, first, number in ARCHIVE_FRIDGE.iter_unpack(
+                             self._map[ARCHIVE_HEADER.size:header_size])}
+        self._header_size = header_size
+
+    def Close(self):
+        self._cycles = None
+        self._values.release()
+        self._map.close()
+
+    def Get_Path(self) -> str:
+        return self._path
+
+    def Get_Timestamp(self) -> datetime:
+        """
+        When the archived data is from
+        """
+        return self._timestamp
+
+    def Get_Number_of_Cycles(self) -> int:
+        return self._count
+
+    def Array(self):
+        """
+        The records in place: a NumPy structured array (fields as in RECORD_FIELDS) if numpy is
+        installed, else a memoryview of shape (records, 6), indexed [record, field]. Only valid until Close.
+        """
+        if numpy is not None:
+            return numpy.frombuffer(self._map, dtype=RECORD_DTYPE, count=self._count, offset=self._header_size)
+        if not self._count:
+            return self._values
+        return self._values.cast('B').cast('q', shape=[self._count, len(RECORD_FIELDS)])
+
+    def List_Fridges(self) -> list:
+        """
+        Fridge ids in the archive, in order
+        """
+        return list(self._fridges)
+
+    def Fridge_Range(self, fridge_id: int) -> range:
+        """
+        Record positions of a fridge's cycles (empty if it has none)
+        """
+        return self._fridges.get(fridge_id, range(0))
+
+    def Record(self, i: int) -> tuple:
+        """
+        Record at a position, as (fridge_id, cycle, cooldown_start, cooldown_end, warmup_start, warmup_end)
+        """
+        return tuple(self._values[i * len(RECORD_FIELDS):(i + 1) * len(RECORD_FIELDS)])
+
+    def Records(self):
+        """
+        Generator over every record, in order, as returned by Record (and by Parse_Log_Line)
+        """
+        for i in range(self._count):
+            yield self.Record(i)
+
+    def List_Cycles_of_Fridge(self, fridge_id: int) -> list:
+        positions = self.Fridge_Range(fridge_id)
+        return [self._cycles[i] for i in positions]
+
+    def Get_Cycle(self, fridge_id: int, cycle: int) -> CycleRecord:
+        """
+        One cycle, linked to the next for its wait time, or None if it is not in the archive
+        """
+        positions = self.Fridge_Range(fridge_id)
+        i = bisect.bisect_left(self._cycles, cycle, positions.start, positions.stop)
+        if i == positions.stop or self._cycles[i] != cycle:
+            return None
+        cycle_record = CycleRecord(*self.Record(i))
+        if i + 1 < positions.stop:
+            cycle_record.next_cycle_start = self._values[(i + 1) * len(RECORD_FIELDS) + 2]
+        cycle_record.update_timestamp = self._timestamp
+        return cycle_record
+
+    def Get_Fridge_Cycle_Data(self, fridge_id: int, offset: int = 0, limit: int = None) -> dict:
+        """
+        {cycle: CycleRecord} of a fridge, each linked to the next for its wait time
+        :param offset: position of the first cycle, negative counts from the end (-10 for the last 10)
+        :param limit: most cycles, default all from offset on; only the records of these are read
+        """
+        positions = self.Fridge_Range(fridge_id)
+        if offset < 0:
+            offset = max(0, len(positions) + offset)
+        positions = positions[offset:] if limit is None else positions[offset:offset + limit]
+        cycles = {}
+        previous = None
+        for i in positions:
+            cycle_record = CycleRecord(*self.Record(i))
+            cycle_record.update_timestamp = self._timestamp
+            if previous is not None:
+                previous.next_cycle_start = cycle_record.cooldown_start
+            cycles[cycle_record.cycle] = previous = cycle_record
+        if previous is not None and positions.stop < self.Fridge_Range(fridge_id).stop:
+            previous.next_cycle_start = self._values[positions.stop * len(RECORD_FIELDS) + 2]
+        return cycles
+
+    def Get_Fridge_Summary_Data(self, fridge_id: int) -> FridgeSummary:
+        """
+        Summary of a fridge, as FridgeData makes it; None if it has no cycles
+        """
+        cycles = self.Get_Fridge_Cycle_Data(fridge_id)
+        if not cycles:
+            return None
+        totals = FridgeTotals()
+        for cycle_record in cycles.values():
+            totals.Add_Cycle(cycle_record)
+            totals.Add_Wait(cycle_record)
+        cycle_ids = list(cycles)
+        total_time = float(cycles[cycle_ids[-1]].warmup_end - cycles[cycle_ids[0]].cooldown_start)
+        summary = Make_Summary(fridge_id, totals.num_of_cycles, total_time, totals.Totals(),
+                               percentiles=totals.Percentiles())
+        summary.update_timestamp = self._timestamp
+        return summary
+
+
+def Cycle_Values(cycle) -> tuple:
+    """
+    The four timestamps of a CycleRecord, or of a cycle dict from an older history record
+    """
+    if isinstance(cycle, CycleRecord):
+        return cycle.cooldown_start, cycle.cooldown_end, cycle.warmup_start, cycle.warmup_end
+    return tuple(To_Epoch(cycle[field]) for field in RECORD_FIELDS[2:])
+
+
+def Write_Archive(path: str, fridge_and_cycle_data: dict, timestamp: datetime = None) -> int:
+    """
+    Write cycle data as an archive, replacing any file there only once it is complete
+    :param path: archive to write
+    :param fridge_and_cycle_data: {fridge_id: {cycle: CycleRecord or dict}}, e.g. a history record's
+    :param timestamp: when the data is from, default now
+    :return:
+    Number of records written
+    """
+    values = array('q')
+    fridges = []
+    for fridge_id in sorted(fridge_and_cycle_data):
+        cycles = fridge_and_cycle_data[fridge_id]
+        if not cycles:
+            continue
+        fridges.append((fridge_id, len(values) // len(RECORD_FIELDS), len(cycles)))
+        for cycle in sorted(cycles):
+            values.append(fridge_id)
+            values.append(cycle)
+            values.extend(Cycle_Values(cycles[cycle]))
+    if sys.byteorder != 'little':
+        values.byteswap()
+    count = len(values) // len(RECORD_FIELDS)
+
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as archive_file:
+        archive_file.write(ARCHIVE_HEADER.pack(ARCHIVE_MAGIC, ARCHIVE_HEADER.size + len(fridges) * ARCHIVE_FRIDGE.size,
+                                               ARCHIVE_RECORD.size, count, Timestamp_Key(timestamp or datetime.now()),
+                                               len(fridges)))
+        archive_file.write(b''.join(ARCHIVE_FRIDGE.pack(*fridge) for fridge in fridges))
+        values.tofile(archive_file)
+    os.replace(temporary_path, path)
+    return count
+
+
+def Is_Archive(path: str) -> bool:
+    """
+    Check whether a file is a cycle archive
+    """
+    with open(path, 'rb') as archive_file:
+        return archive_file.read(len(ARCHIVE_MAGIC)) == ARCHIVE_MAGIC
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/13/2020
+Project: Rigetti
+File: FridgeBackfill.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Backfill a history journal from historical logs of any size.
+
+    The logs are streamed through FridgeData.Ingest a chunk of lines at a time, so memory
+    stays flat however big they are, with progress shown as each chunk is applied.  Every
+    chunk's history record carries the log checkpoints, so TopFridge or FridgeServer started
+    on the same journal and logs afterwards resume from where the backfill got to.
+"""
+import argparse
+import sys
+import time
+from FridgeData import FridgeData, Expand_Log_Paths, FrigeOutput, INGEST_CHUNK_LINES
+
+
+def Backfill(fridge_data: FridgeData, paths: list, chunk_lines: int = INGEST_CHUNK_LINES, output=sys.stdout) -> dict:
+    """
+    Ingest logs one after the other, writing a progress line per chunk
+    :param fridge_data: FridgeData to take the logs in
+    :param paths: log files
+    :param chunk_lines: lines per Update
+    :param output: where progress is written, None for nowhere
+    :return:
+    dict of 'lines', 'bytes', 'rejected' and 'chunks' over all the logs, and 'seconds' taken
+    """
+    totals = {'lines': 0, 'bytes': 0, 'rejected': 0, 'chunks': 0, 'seconds': 0.0}
+    backfill_start = time.perf_counter()
+    for path in paths:
+        path_start = time.perf_counter()
+        progress = None
+        rejected = 0
+        for progress in fridge_data.Ingest(path, chunk_lines):
+            rejected += progress['stats']['rejected']
+            if output is not None:
+                seconds = time.perf_counter() - path_start
+                done = '' if not progress['total_bytes'] else \
+                    f" ({100.0 * progress['bytes'] / progress['total_bytes']:5.1f}%)"
+                output.write(f"  {path}: {progress['lines']:,} lines{done}  "
+                             f"{progress['lines'] / max(seconds, 1e-9):,.0f} lines/s  {rejected:,} rejected\n")
+                output.flush()
+        if progress is not None:
+            totals['lines'] += progress['lines']
+            totals['bytes'] += progress['bytes']
+            totals['chunks'] += progress['chunks']
+            totals['rejected'] += rejected
+    totals['seconds'] = time.perf_counter() - backfill_start
+    return totals
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description="""
+        Backfills a history journal from historical fridge logs, reading them a chunk at a time.
+           """,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument("input_files", nargs='+',
+                        help="Names (or glob patterns, quoted) of the log files to backfill from, in order.")
+    parser.add_argument('--history_file', default="FridgeData.journal", help="History journal to write.")
+    parser.add_argument('--chunk_lines', type=int, default=INGEST_CHUNK_LINES,
+                        help="Lines applied (and written to the history) at a time.")
+    parser.add_argument('--write_behind', action='store_true',
+                        default=False, help="""Write the history journal from a background thread, in batches""")
+    parser.add_argument('--show', action='store_true',
+                        default=False, help="""Show the fridge summaries once the logs are in""")
+    args = parser.parse_args()
+
+    paths = Expand_Log_Paths(args.input_files)
+    if not paths:
+        print(f"No log files match {', '.join(args.input_files)}")
+        sys.exit(1)
+    try:
+        fridge_data = FridgeData(history_file=args.history_file, write_behind=args.write_behind)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    try:
+        totals = Backfill(fridge_data, paths, args.chunk_lines)
+    except KeyboardInterrupt:
+        print("Interrupted, writing out the history so far")
+        sys.exit(1)
+    finally:
+        fridge_data.Close()
+    print(f"Backfilled {totals['lines']:,} lines ({totals['bytes'] / 1e6:,.1f} MB, {totals['rejected']:,} rejected) "
+          f"from {len(paths)} logs in {totals['seconds']:.1f} s, {totals['chunks']:,} history records")
+    if args.show:
+        print(FrigeOutput(fridge_data, showSummary=True, showCycles=False))
@@ -0,0 +1,329 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 11/30/2020
+Project: Rigetti
+File: FridgeBench.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Benchmarks for the fridge log ingestion path, and a suite timing the whole pipeline
+    (update, persistence, rendering, history loading) over synthetic logs of several sizes,
+    with results saved as JSON to compare runs against.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from FridgeData import FridgeData, FrigeOutput, Parse_Log_Line, TIME_FORMAT, VALID_LINE_LEN
+from FridgeJournal import FridgeJournal, HISTORY_CHECKPOINT
+from FridgeArchive import CycleArchive
+from FridgeLogGenerator import Generate_Log_Lines
+from FridgeRecords import CycleRecord, From_Epoch
+
+# Suite sizes, fridges x cycles per fridge
+SUITE_SIZES = "10x100,100x100,100x1000"
+# Timings shorter than this are mostly noise, and not compared between runs
+COMPARE_MIN_SECONDS = 0.01
+
+
+def Synthetic_Lines(number_of_lines: int, seed: int = 0) -> list:
+    """
+    Make valid log lines: a few fridges, consecutive cycles of a few days each
+    """
+    rng = random.Random(seed)
+    lines = []
+    start = datetime(2019, 1, 1)
+    fridges = max(1, number_of_lines // 1000)
+    for n in range(number_of_lines):
+        fridge_id = n % fridges
+        cycle = n // fridges
+        cooldown_start = start + timedelta(days=7 * cycle, minutes=rng.randint(0, 600))
+        cooldown_end = cooldown_start + timedelta(minutes=rng.randint(1000, 2000))
+        warmup_start = cooldown_end + timedelta(minutes=rng.randint(5000, 6000))
+        warmup_end = warmup_start + timedelta(minutes=rng.randint(1000, 2000))
+        lines.append(f"{fridge_id},{cycle}," +
+                     ",".join(t.strftime(TIME_FORMAT) for t in [cooldown_start, cooldown_end, warmup_start, warmup_end]))
+    return lines
+
+
+def Legacy_Parse_Log_Line(line: str):
+    """
+    The original ingestion path: split and strptime in _is_valid_data, then split and strptime again in Update
+    """
+    if len(line.strip().split(',')) != VALID_LINE_LEN:
+        return None
+    fridge_id, cooldown_number, cooldown_start, cooldown_end, warmup_start, warmup_end = line.split(',')
+    try:
+        int(fridge_id)
+        int(cooldown_number)
+    except Exception:
+        return None
+    try:
+        if datetime.strptime(cooldown_end, TIME_FORMAT) < datetime.strptime(cooldown_start, TIME_FORMAT):
+            return None
+        if datetime.strptime(cooldown_end, TIME_FORMAT) < datetime.strptime(cooldown_start, TIME_FORMAT):
+            return None
+    except Exception:
+        return None
+    data = line.strip().split(',')
+    return [int(data[0]), int(data[1])] + [datetime.strptime(data[i], TIME_FORMAT) for i in range(2, 6)]
+
+
+def Time_Parser(parse, lines: list) -> float:
+    """
+    :return:
+    Lines per second
+    """
+    start = time.perf_counter()
+    for line in lines:
+        parse(line)
+    return len(lines) / (time.perf_counter() - start)
+
+
+def Legacy_Cycles(lines: list) -> dict:
+    """
+    Cycles held the original way: a defaultdict per cycle of datetimes and derived values
+    """
+    cycles = defaultdict(None)
+    update_timestamp = datetime.now()
+    for n, line in enumerate(lines):
+        record, reject_reason = Parse_Log_Line(line)
+        fridge_id = record[0]
+        cooldown_start, cooldown_end, warmup_start, warmup_end = [From_Epoch(seconds) for seconds in record[2:]]
+        data = defaultdict(None)
+        data['cooldown_start'] = cooldown_start
+        data['cooldown_end'] = cooldown_end
+        data['warmup_start'] = warmup_start
+        data['warmup_end'] = warmup_end
+        data['update_timestamp'] = update_timestamp
+        data['fridge_id'] = fridge_id
+        data['cooldown_time'] = (cooldown_end - cooldown_start).total_seconds()
+        data['running_time'] = (warmup_start - cooldown_end).total_seconds()
+        data['warmup_time'] = (warmup_end - warmup_start).total_seconds()
+        data['next_cycle_start'] = None
+        data['next_cycle_wait_time'] = None
+        cycles[n] = data
+    return cycles
+
+
+def Record_Cycles(lines: list) -> dict:
+    """
+    Cycles held as CycleRecords
+    """
+    cycles = {}
+    update_timestamp = datetime.now()
+    for n, line in enumerate(lines):
+        record, reject_reason = Parse_Log_Line(line)
+        record = CycleRecord(*record)
+        record.update_timestamp = update_timestamp
+        cycles[n] = record
+    return cycles
+
+
+def Deep_Size(obj) -> int:
+    """
+    Bytes held by obj and everything reachable from it through dicts, sequences and slots,
+    counting shared objects once
+    """
+    seen = set()
+    size = 0
+    pending = [obj]
+    while pending:
+        item = pending.pop()
+        if id(item) in seen:
+            continue
+        seen.add(id(item))
+        size += sys.getsizeof(item)
+        if isinstance(item, dict):
+            pending.extend(item.keys())
+            pending.extend(item.values())
+        elif isinstance(item, (list, tuple, set)):
+            pending.extend(item)
+        elif hasattr(item, '__slots__'):
+            pending.extend(getattr(item, slot) for slot in item.__slots__ if hasattr(item, slot))
+    return size
+
+
+
+def Benchmark_Size(fridges: int, cycles: int, work_dir: str, seed: int = 0, batches: int = 20) -> dict:
+    """
+    Time the pipeline on a generated log of fridges x cycles (with some out of order, comment,
+    invalid and correction rows)
+    :return:
+    dict of the size and the timings in seconds
+    """
+    lines = list(Generate_Log_Lines(fridges, cycles, seed, out_of_order=0.05, comments=0.01, invalid=0.01,
+                                    corrections=0.01))
+    results = {'fridges': fridges, 'cycles': cycles, 'lines': len(lines)}
+
+    # The whole log in one update (which includes writing it to the journal as a checkpoint)
+    fridge_data = FridgeData(history_file=os.path.join(work_dir, 'full.journal'))
+    start = time.perf_counter()
+    fridge_data.Update(lines)
+    results['update_s'] = time.perf_counter() - start
+    results['update_lines_per_s'] = len(lines) / results['update_s']
+
+    # The same log arriving in batches, as TopFridge sees a growing file
+    history_path = os.path.join(work_dir, 'incremental.journal')
+    incremental_data = FridgeData(history_file=history_path)
+    batch_size = max(1, len(lines) // batches)
+    start = time.perf_counter()
+    for n in range(0, len(lines), batch_size):
+        incremental_data.Update(lines[n:n + batch_size])
+    results['incremental_update_s'] = time.perf_counter() - start
+
+    # A full checkpoint of the state appended to a fresh journal
+    journal = FridgeJournal(os.path.join(work_dir, 'persist.journal'))
+    record = {'timestamp': str(datetime.now()),
+              'kind': HISTORY_CHECKPOINT,
+              'fridge_summary_data': {fridge_id: fridge_data.Get_Fridge_Summary_Data(fridge_id)
+                                      for fridge_id in fridge_data.List_Fridges()},
+              'fridge_and_cycle_data': fridge_data.Get_data_by_fridge_and_cycle()}
+    start = time.perf_counter()
+    offset, length = journal.Append(record)
+    results['persist_s'] = time.perf_counter() - start
+    results['persist_bytes'] = length
+
+    # Rendering: first time, unchanged, and after one cycle of one fridge changes
+    start = time.perf_counter()
+    FrigeOutput(fridge_data)
+    results['render_cold_s'] = time.perf_counter() - start
+    start = time.perf_counter()
+    FrigeOutput(fridge_data)
+    results['render_warm_s'] = time.perf_counter() - start
+    cycle = fridge_data.Get_Fridge_Cycle_Data(0)[0]
+    fridge_data.Update([f"0,0,{cycle['cooldown_start']},{cycle['cooldown_end']},{cycle['warmup_start']}," +
+                        f"{cycle['warmup_end'] + timedelta(minutes=1)}"])
+    start = time.perf_counter()
+    FrigeOutput(fridge_data)
+    results['render_after_change_s'] = time.perf_counter() - start
+
+    # The cycles as a binary archive, written, then opened and one fridge summarized in place
+    archive_path = os.path.join(work_dir, 'cycles.fca')
+    start = time.perf_counter()
+    fridge_data.Save_Archive(archive_path)
+    results['archive_write_s'] = time.perf_counter() - start
+    start = time.perf_counter()
+    archive = CycleArchive(archive_path)
+    archive.Get_Fridge_Summary_Data(archive.List_Fridges()[0])
+    archive.Close()
+    results['archive_query_s'] = time.perf_counter() - start
+
+    # Loading the latest record of the incremental history, as FridgeHistoryRead does
+    start = time.perf_counter()
+    history = FridgeJournal(history_path)
+    history_index = history.Index()
+    history.Read_State(history_index[-1][1])
+    results['history_load_s'] = time.perf_counter() - start
+    results['history_records'] = len(history_index)
+    return results
+
+
+def Run_Suite(sizes: str = SUITE_SIZES, seed: int = 0) -> dict:
+    """
+    :param sizes: comma separated fridges x cycles, e.g. '10x100,100x1000'
+    :return:
+    dict of when and where it ran, and the results of each size
+    """
+    results = {'created': datetime.now().isoformat(),
+               'python': platform.python_version(),
+               'platform': platform.platform(),
+               'sizes': []}
+    for size in sizes.split(','):
+        fridges, cycles = (int(n) for n in size.lower().split('x'))
+        work_dir = tempfile.mkdtemp(prefix='FridgeBench')
+        try:
+            results['sizes'].append(Benchmark_Size(fridges, cycles, work_dir, seed))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def Compare_Results(results: dict, baseline: dict, threshold: float = 1.2) -> list:
+    """
+    Timings that got slower than the baseline by more than threshold, for the sizes both have
+    (ignoring ones under COMPARE_MIN_SECONDS)
+    :return:
+    List of (size, timing, baseline seconds, seconds)
+    """
+    regressions = []
+    baseline_sizes = {(size['fridges'], size['cycles']): size for size in baseline['sizes']}
+    for size in results['sizes']:
+        before = baseline_sizes.get((size['fridges'], size['cycles']))
+        if before is None:
+            continue
+        for key, seconds in size.items():
+            if key.endswith('_s') and key in before and max(seconds, before[key]) >= COMPARE_MIN_SECONDS and \
+                    seconds > before[key] * threshold:
+                regressions.append((f"{size['fridges']}x{size['cycles']}", key, before[key], seconds))
+    return regressions
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description="""
+        Benchmarks for the ingestion path.
+           parse:  time the line parser against the original strptime based one.
+           memory: memory held by cycles stored as dicts of datetimes versus CycleRecords.
+           suite:  time update, persistence, rendering and history loading over generated logs.
+           """,
+        formatter_class=argparse.RawTextHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+    parse_parser = subparsers.add_parser('parse', help="Lines per second of the line parser")
+    parse_parser.add_argument('--lines', type=int, default=200000, help="Number of synthetic log lines.")
+    memory_parser = subparsers.add_parser('memory', help="Memory per cycle of the cycle store")
+    memory_parser.add_argument('--cycles', type=int, default=1000000, help="Number of cycles to hold.")
+    suite_parser = subparsers.add_parser('suite', help="Time the whole pipeline over several log sizes")
+    suite_parser.add_argument('--sizes', default=SUITE_SIZES, help="Comma separated fridges x cycles per fridge.")
+    suite_parser.add_argument('--seed', type=int, default=0, help="Random seed of the generated logs.")
+    suite_parser.add_argument('--output', default=None, help="Write the results to this JSON file.")
+    suite_parser.add_argument('--compare', default=None, help="JSON results of an earlier run to compare with.")
+    suite_parser.add_argument('--threshold', type=float, default=1.2,
+                              help="Slow down over the earlier run counted as a regression.")
+    args = parser.parse_args()
+
+    if args.command == 'parse':
+        lines = Synthetic_Lines(args.lines)
+        before = Time_Parser(Legacy_Parse_Log_Line, lines)
+        after = Time_Parser(Parse_Log_Line, lines)
+        print(f"  {'Parser':20}  {'Lines/sec':>14}")
+        print(f"  {'strptime (before)':20}  {before:14,.0f}")
+        print(f"  {'Parse_Log_Line':20}  {after:14,.0f}")
+        print(f"  Speed up: {after / before:.1f}x")
+    elif args.command == 'memory':
+        lines = Synthetic_Lines(args.cycles)
+        before = Deep_Size(Legacy_Cycles(lines))
+        after = Deep_Size(Record_Cycles(lines))
+        print(f"  {'Cycle store':20}  {'MB':>10}  {'Bytes/cycle':>12}")
+        print(f"  {'dict (before)':20}  {before / 1e6:10,.1f}  {before / args.cycles:12,.0f}")
+        print(f"  {'CycleRecord':20}  {after / 1e6:10,.1f}  {after / args.cycles:12,.0f}")
+        print(f"  Reduction: {before / after:.1f}x")
+    elif args.command == 'suite':
+        results = Run_Suite(args.sizes, args.seed)
+        timings = ['update_s', 'incremental_update_s', 'persist_s', 'render_cold_s', 'render_warm_s',
+                   'render_after_change_s', 'history_load_s', 'archive_write_s', 'archive_query_s']
+        print(f"  {'Size':>10}  {'Lines':>9}  " + "  ".join(f"{timing[:-2]:>14}" for timing in timings))
+        for size in results['sizes']:
+            print(f"  {size['fridges']:>4}x{size['cycles']:<5}  {size['lines']:9,}  " +
+                  "  ".join(f"{size[timing]:14.4f}" for timing in timings))
+        if args.output is not None:
+            with open(args.output, 'w') as output_file:
+                json.dump(results, output_file, indent=2)
+        if args.compare is not None:
+            with open(args.compare) as baseline_file:
+                regressions = Compare_Results(results, json.load(baseline_file), args.threshold)
+            for size, timing, before, after in regressions:
+                print(f"  Regression {size} {timing}: {before:.4f}s -> {after:.4f}s ({after / before:.2f}x)")
+            if regressions:
+                sys.exit(1)
+            print("  No regressions")
+    else:
+        parser.print_help()
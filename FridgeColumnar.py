@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/01/2020
+Project: Rigetti
+File: FridgeColumnar.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Optional columnar (NumPy) store of cycle timestamps, used by FridgeData to calculate
+    fridge summaries with vectorized array operations instead of walking the cycles in Python.
+    Each fridge keeps an int64 array of epoch seconds for each of the four timestamps, one row
+    per cycle in the order the cycles were first seen, with a map from cycle number to row, so
+    the arrays are only as big as the number of cycles however the cycles are numbered.  Rows
+    are put back into cycle order (once) the next time a summary is asked for after a cycle
+    arrived out of order.
+"""
+from FridgeRecords import Make_Summary
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+TIMESTAMP_COLUMNS = ['cooldown_start', 'cooldown_end', 'warmup_start', 'warmup_end']
+
+
+class _FridgeColumns(object):
+    """
+    Timestamp columns of one fridge, row rows[cycle] holding a cycle
+    """
+    def __init__(self):
+        # {cycle: row}, and the cycle of each row
+        self.rows = {}
+        self.cycle_ids = numpy.zeros(16, dtype=numpy.int64)
+        self.columns = numpy.zeros((len(TIMESTAMP_COLUMNS), 16), dtype=numpy.int64)
+        self.count = 0
+        # Rows are in cycle order
+        self.in_order = True
+
+    def Row(self, cycle: int) -> int:
+        """
+        Row for a cycle number, adding one (growing the arrays) for a new cycle
+        """
+        row = self.rows.get(cycle)
+        if row is not None:
+            return row
+        row = self.count
+        if row == len(self.cycle_ids):
+            self.cycle_ids = numpy.concatenate([self.cycle_ids, numpy.zeros(row, dtype=numpy.int64)])
+            self.columns = numpy.concatenate([self.columns,
+                                              numpy.zeros((len(TIMESTAMP_COLUMNS), row), dtype=numpy.int64)], axis=1)
+        if row and cycle < self.cycle_ids[row - 1]:
+            self.in_order = False
+        self.cycle_ids[row] = cycle
+        self.rows[cycle] = row
+        self.count += 1
+        return row
+
+    def Sort(self):
+        """
+        Put the rows back into cycle order
+        """
+        order = numpy.argsort(self.cycle_ids[:self.count], kind='stable')
+        self.cycle_ids[:self.count] = self.cycle_ids[order]
+        self.columns[:, :self.count] = self.columns[:, order]
+        self.rows = {int(cycle): row for row, cycle in enumerate(self.cycle_ids[:self.count])}
+        self.in_order = True
+
+
+class ColumnarCycleStore(object):
+    """
+    Per fridge timestamp arrays with vectorized summary calculation
+    """
+    def __init__(self):
+        if numpy is None:
+            raise ImportError("The columnar cycle store needs numpy (pip install numpy)")
+        self._fridges = {}
+
+    def Set_Cycle(self, fridge_id: int, cycle: int, cooldown_start: int, cooldown_end: int,
+                  warmup_start: int, warmup_end: int):
+        """
+        Insert or replace the timestamps (epoch seconds) of a cycle
+        """
+        if fridge_id not in self._fridges:
+            self._fridges[fridge_id] = _FridgeColumns()
+        fridge = self._fridges[fridge_id]
+        row = fridge.Row(cycle)
+        fridge.columns[:, row] = [cooldown_start, cooldown_end, warmup_start, warmup_end]
+
+    def Summary(self, fridge_id: int) -> dict:
+        """
+        Same result as FridgeData.Calculate_Fridge_Summary_Data, from the arrays
+        :param fridge_id:
+        :return:
+        Returns None if there is no data
+        """
+        if fridge_id not in self._fridges:
+            return None
+        fridge = self._fridges[fridge_id]
+        if fridge.count == 0:
+            return None
+        if not fridge.in_order:
+            fridge.Sort()
+        cooldown_start, cooldown_end, warmup_start, warmup_end = fridge.columns[:, :fridge.count]
+
+        num_of_cycles = fridge.count
+        total_time = float(warmup_end[-1] - cooldown_start[0])
+        # Sums are exact in int64, converted once so results match summing float seconds
+        totals = {'cooldown_time': float((cooldown_end - cooldown_start).sum()),
+                  'running_time': float((warmup_start - cooldown_end).sum()),
+                  'warmup_time': float((warmup_end - warmup_start).sum()),
+                  'next_cycle_wait_time': float((cooldown_start[1:] - warmup_end[:-1]).sum())}
+
+        return Make_Summary(fridge_id, num_of_cycles, total_time, totals)
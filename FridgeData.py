@@ -9,27 +9,276 @@ Description:
 
 
 from time import sleep
-from datetime import datetime, timedelta, time
+from datetime import datetime, timedelta, time, date
 from collections import defaultdict
-import pickle
+import bisect
+import glob
+import itertools
 import os
+import time as timer
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from FridgeJournal import FridgeJournal, JournalWriter, HISTORY_CHECKPOINT, HISTORY_DELTA
+from FridgeColumnar import ColumnarCycleStore
+from FridgeRawLog import RawLogStore, DEFAULT_SPILL_MAX_BYTES
+from FridgeWindow import CycleWindowIndex
+from FridgeViews import CycleView, CycleRankIndex, Top_Cycles
+from FridgeArchive import CycleArchive, Write_Archive, Cycle_Values
+from FridgeExport import Open_Writer, Export, DEFAULT_BLOCK_ROWS
+from FridgeLogTail import LogTail, Log_Checkpoint, Checkpoint_Matches
+from FridgeRecords import CycleRecord, FridgeSummary, FridgeTotals, Make_Summary, To_Epoch, PHASES
 
 TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
 LOG_FIELDS = ['fridge_id', 'cooldown_number', 'cooldown_start', 'cooldown_end', 'warmup_start', 'warmup_end']
 VALID_LINE_LEN = 6
+TIME_FORMAT_LEN = 19
+
+# Reasons Parse_Log_Line gives for rejecting a data line
+REJECT_FIELD_COUNT = 'field_count'
+REJECT_BAD_ID = 'bad_id'
+REJECT_BAD_TIMESTAMP = 'bad_timestamp'
+REJECT_COOLDOWN_ORDER = 'cooldown_order'
+REJECT_WARMUP_ORDER = 'warmup_order'
+
+# Updates whose stats Get_Stats keeps
+STATS_HISTORY = 100
+# Timed phases of an update, each recorded as '<phase>_s' seconds
+UPDATE_PHASES = ['parse', 'apply', 'derive', 'summarize', 'persist']
+
+# Load_Files splits each file into pieces of about this size for the parse workers
+LOAD_CHUNK_BYTES = 16 * 1024 * 1024
+# Ingest feeds Update this many lines at a time
+INGEST_CHUNK_LINES = 50000
+
+EPOCH_DATE = date(1970, 1, 1)
+# Days since the epoch of recently seen 'YYYY-MM-DD' strings; log lines share dates heavily
+_epoch_day_cache = {}
+EPOCH_DAY_CACHE_SIZE = 100000
+
+
+def Parse_Epoch_Seconds(text: str) -> int:
+    """
+    Parse a TIME_FORMAT timestamp straight to whole seconds since the epoch, without making a datetime
+    for the usual zero padded layout (the day number of each date is cached).
+    Raises ValueError if it is not a valid timestamp.
+    """
+    if len(text) == TIME_FORMAT_LEN and text[4] == '-' and text[7] == '-' and text[10] == ' ' \
+            and text[13] == ':' and text[16] == ':' and text[0:4].isdigit() and text[5:7].isdigit() \
+            and text[8:10].isdigit() and text[11:13].isdigit() and text[14:16].isdigit() and text[17:19].isdigit():
+        day_text = text[0:10]
+        days = _epoch_day_cache.get(day_text)
+        if days is None:
+            days = (date(int(text[0:4]), int(text[5:7]), int(text[8:10])) - EPOCH_DATE).days
+            if len(_epoch_day_cache) < EPOCH_DAY_CACHE_SIZE:
+                _epoch_day_cache[day_text] = days
+        hours = int(text[11:13])
+        minutes = int(text[14:16])
+        seconds = int(text[17:19])
+        if hours > 23 or minutes > 59 or seconds > 59:
+            raise ValueError(f"time data {text!r} is out of range")
+        return days * 86400 + hours * 3600 + minutes * 60 + seconds
+    return To_Epoch(datetime.strptime(text, TIME_FORMAT))
+
+
+def Parse_Log_Line(line: str) -> tuple:
+    """
+    Split, validate and convert a (stripped, non comment) data line in one pass.
+    :param line:
+    :return:
+    (record, None) where record is (fridge_id, cooldown_number, cooldown_start, cooldown_end,
+    warmup_start, warmup_end), all ints with the timestamps as epoch seconds, or (None, reason)
+    with one of the REJECT_ values.
+    """
+    data = line.split(',')
+    if len(data) != VALID_LINE_LEN:
+        return None, REJECT_FIELD_COUNT
+    try:
+        fridge_id = int(data[0])
+        cooldown_number = int(data[1])
+    except ValueError:
+        return None, REJECT_BAD_ID
+    try:
+        cooldown_start = Parse_Epoch_Seconds(data[2])
+        cooldown_end = Parse_Epoch_Seconds(data[3])
+        warmup_start = Parse_Epoch_Seconds(data[4])
+        warmup_end = Parse_Epoch_Seconds(data[5])
+    except ValueError:
+        return None, REJECT_BAD_TIMESTAMP
+    if cooldown_end < cooldown_start:
+        return None, REJECT_COOLDOWN_ORDER
+    if warmup_end < warmup_start:
+        return None, REJECT_WARMUP_ORDER
+    return (fridge_id, cooldown_number, cooldown_start, cooldown_end, warmup_start, warmup_end), None
+
+
+
+def Expand_Log_Paths(patterns: list) -> list:
+    """
+    Expand file names and glob patterns into absolute paths, in the order given (the matches of
+    each glob sorted), without duplicates. Names that are not globs are kept even if missing.
+    """
+    paths = []
+    for pattern in patterns:
+        if any(c in pattern for c in '*?['):
+            matches = sorted(glob.glob(pattern))
+        else:
+            matches = [pattern]
+        for path in matches:
+            path = os.path.abspath(path)
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def _Parse_Chunk(path: str, start: int, end: int, shards: int) -> tuple:
+    """
+    Parse the lines of a log file that start within bytes [start, end). Runs in a worker process.
+    A last line without its newline is left unread, as LogTail would.
+    :return:
+    ([{(fridge_id, cycle): record}, one per shard], offset after the last complete line read,
+    (lines, comments, {reject reason: count}))
+    """
+    shard_records = [dict() for _ in range(shards)]
+    lines = 0
+    comments = 0
+    rejected = defaultdict(int)
+    with open(path, 'rb') as log_file:
+        if start > 0:
+            # Skip the line begun in the previous chunk (nothing, if one ends just before start)
+            log_file.seek(start - 1)
+            log_file.readline()
+        position = log_file.tell()
+        while position < end:
+            raw = log_file.readline()
+            if not raw.endswith(b'\n'):
+                break
+            position += len(raw)
+            lines += 1
+            line = raw.decode('utf-8', errors='replace').strip()
+            # Same rule as FridgeData._is_comment, anything not starting with a digit
+            if not line or not line[0].isdigit():
+                comments += 1
+                continue
+            record, reject_reason = Parse_Log_Line(line)
+            if record is not None:
+                # Later lines replace earlier ones for the same cycle, as in Update
+                shard_records[record[0] % shards][(record[0], record[1])] = record
+            else:
+                rejected[reject_reason] += 1
+    return shard_records, position, (lines, comments, dict(rejected))
+
+
+def _Derive_Shard(chunk_records: list, update_timestamp: datetime) -> dict:
+    """
+    Build the cycles, links and running totals of the fridges in one shard from scratch. Runs in
+    a worker process.
+    :param chunk_records: {(fridge_id, cycle): record} of each chunk, in file and chunk order
+    :param update_timestamp:
+    :return:
+    {fridge_id: (sorted cycle ids, {cycle: CycleRecord}, FridgeTotals)}
+    """
+    records = {}
+    for chunk in chunk_records:
+        records.update(chunk)
+    fridges = defaultdict(dict)
+    for (fridge_id, cycle_id), record in records.items():
+        cycle = CycleRecord(*record)
+        cycle.update_timestamp = update_timestamp
+        fridges[fridge_id][cycle_id] = cycle
+
+    derived = {}
+    for fridge_id, cycles in fridges.items():
+        cycle_ids = sorted(cycles)
+        totals = FridgeTotals()
+        previous = None
+        for cycle_id in cycle_ids:
+            cycle = cycles[cycle_id]
+            totals.Add_Cycle(cycle)
+            if previous is not None:
+                previous.next_cycle_start = cycle.cooldown_start
+                totals.Add_Wait(previous)
+            previous = cycle
+        derived[fridge_id] = (cycle_ids, cycles, totals)
+    return derived
 
 class FridgeData(object):
     """
     Object for reading, updating and calculating data from a cryogenic fridge log steam
     """
-    def __init__(self, history_file="FridgeData.pickle"):
+    def __init__(self, history_file="FridgeData.journal", checkpoint_records=50, checkpoint_bytes=4 * 1024 * 1024,
+                 columnar=False, verify_summaries=False, raw_log_updates=100, raw_log_bytes=16 * 1024 * 1024,
+                 raw_log_spill_dir=None, raw_log_spill_bytes=DEFAULT_SPILL_MAX_BYTES, write_behind=False,
+                 sync_interval=1.0, sync_records=50, report=print):
+        """
+        :param history_file: journal the update history is appended to
+        :param checkpoint_records: write a full checkpoint after this many delta records
+        :param checkpoint_bytes: or after this many bytes of delta records
+        :param columnar: make the fridge summaries from a NumPy columnar copy of the cycle timestamps,
+            summed with array operations, instead of from the running totals
+        :param verify_summaries: debugging, check every summary made against a full recalculation in Python
+        :param raw_log_updates: most updates' raw lines to keep in memory
+        :param raw_log_bytes: most bytes of raw lines to keep in memory
+        :param raw_log_spill_dir: directory to spill older raw lines to, compressed; None drops them
+        :param raw_log_spill_bytes: most bytes spilled to keep there (the oldest are dropped past it);
+            they are deleted by Close
+        :param write_behind: queue history records to be written by a background thread instead of
+            writing them in Update; call Flush or Close to be sure they are on disk
+        :param sync_interval: with write_behind, most seconds a record waits to be written and fsynced
+        :param sync_records: with write_behind, write and fsync once this many records are waiting
+        :param report: function the messages (journal errors, summaries that did not verify, ...) are
+            passed to, print by default; see Set_Report
+        """
+        self._report = report
         self._history_file = os.path.abspath(history_file)
-        self._log_raw_read_data = defaultdict(None)
+        self._journal = FridgeJournal(self._history_file, report=self._Report)
+        # Refuse a journal another FridgeData is writing now, rather than at the first update
+        self._journal.Lock()
+        self._journal_writer = JournalWriter(self._journal, sync_interval, sync_records, report=self._Report) \
+            if write_behind else None
+        # {log path: Log_Checkpoint} of how far each log has been ingested, kept with every history record
+        self._log_checkpoints = {}
+        self._checkpoint_records = checkpoint_records
+        self._checkpoint_bytes = checkpoint_bytes
+        # The first record this object writes is always a checkpoint, the journal may hold some other state
+        self._checkpoint_offset = None
+        self._records_since_checkpoint = 0
+        self._bytes_since_checkpoint = 0
+        self._log_raw_read_data = RawLogStore(raw_log_updates, raw_log_bytes, raw_log_spill_dir,
+                                              raw_log_spill_bytes, report=self._Report)
+        # {fridge_id: {cycle: CycleRecord}}
         self._fridge_and_cycle_data = defaultdict(None)
+        # {fridge_id: FridgeSummary}
         self._fridge_summary_data = defaultdict(None)
-
-
-    def Update(self, lines):
+        # Cycle ids of each fridge kept in sorted order, so neighbours can be found without re-sorting
+        self._fridge_cycle_ids = defaultdict(list)
+        # {fridge_id: FridgeTotals}, running totals the summaries are made from
+        self._fridge_totals = defaultdict(FridgeTotals)
+        # The same over every cycle of every fridge, for the fleet summary, and that summary
+        # with the version it was made at
+        self._fleet_totals = FridgeTotals()
+        self._fleet_summary = None
+        # Bumped for every fridge an update changes, so readers (e.g. FridgeServer) can tell what is stale
+        self._version = 0
+        self._fridge_versions = defaultdict(int)
+        # {fridge_id: CycleWindowIndex} for time window summaries, built when first asked for, and
+        # {fridge_id: first position in its cycle ids changed since}, to bring them up to date
+        self._window_indexes = {}
+        self._window_dirty_from = {}
+        # {fridge_id: {phase: CycleRankIndex}} for the top cycles, built when first asked for, and
+        # {fridge_id: cycle ids recalculated since}, to bring them up to date
+        self._rank_indexes = {}
+        self._rank_dirty = {}
+        # Per update timings and counters, see Get_Stats
+        self._recent_stats = deque(maxlen=STATS_HISTORY)
+        self._total_stats = defaultdict(float)
+        self._number_of_updates = 0
+        # {(fridge_id, render options): (fridge version, text)}, see Fridge_Output_Blocks
+        self._render_cache = {}
+        self._columnar = ColumnarCycleStore() if columnar else None
+        self._verify_summaries = verify_summaries
+
+
+    def Update(self, lines, log_offsets: dict = None):
         """
         Take lines read from in CSV format of the form:
 
@@ -38,90 +287,660 @@ class FridgeData(object):
         And process
 
         NB we are NOT assuming data is comming in ordered either by Fridge ID or by cooldown cycle, so
-        we will process everthing
+        we will process everthing. Only the cycles that are new or whose timestamps changed (and the
+        cycle before each, whose wait time depends on it) are recalculated, and only the summaries of
+        the fridges they belong to.
+
+        lines can be any iterable of lines; for logs too big to hold as a list see Ingest.
+        log_offsets, {path: offset}, says how far into each log the lines went, and is kept with the
+        history so a restart can carry on from there (see Resume_Files).
         """
         # just do things simply with split
         update_timestamp = datetime.now()
-        read_time_string = datetime.now().strftime(TIME_FORMAT)
-        self._log_raw_read_data[update_timestamp] = []
+        stats = self._New_Stats(update_timestamp, 'update')
+        update_start = phase_start = timer.perf_counter()
+        raw_lines = []
+        records = []
+        rejected = defaultdict(int)
+        comments = 0
 
         for line in lines:
             line = line.strip()
-            self._log_raw_read_data[update_timestamp].append(line)
-
-            entry = defaultdict(None)
-            if line and not self._is_comment(line) and self._is_valid_data(line):
-                data = line.strip().split(',')
-                fridge_id = int(data[0])
-                cooldown_number = int(data[1])
-
-                if fridge_id not in self._fridge_and_cycle_data:
-                    self._fridge_and_cycle_data[fridge_id] = defaultdict(None)
-
-                if cooldown_number not in self._fridge_and_cycle_data[fridge_id]:
-                    self._fridge_and_cycle_data[fridge_id][cooldown_number] = defaultdict(None)
-
-                for i in range(2, 6):
-                    self._fridge_and_cycle_data[fridge_id][cooldown_number][LOG_FIELDS[i]] = \
-                        datetime.strptime(data[i], TIME_FORMAT)
-
-                self._fridge_and_cycle_data[fridge_id][cooldown_number]['update_timestamp'] = update_timestamp
+            raw_lines.append(line)
+
+            if not line or self._is_comment(line):
+                comments += 1
+                continue
+            record, reject_reason = Parse_Log_Line(line)
+            if record is not None:
+                records.append(record)
+            else:
+                rejected[reject_reason] += 1
+        self._log_raw_read_data.Add_Batch(update_timestamp, raw_lines)
+        stats['lines'] = len(raw_lines)
+        stats['comments'] = comments
+        stats['rejected'] = sum(rejected.values())
+        stats['rejected_reasons'] = dict(rejected)
+        phase_end = timer.perf_counter()
+        stats['parse_s'] = phase_end - phase_start
+        phase_start = phase_end
+
+        dirty_cycles = defaultdict(set)
+        for record in records:
+            self._Apply_Record(record, update_timestamp, dirty_cycles)
         #To Do: All is done in memory now, could retrieve from cache or db.
-
-        # Deal with 'time between cycles' e.g. cycle N needs its time for warmup_end and the next cooldown_start
-        # Brute force
-        for fridge_id, cycles in self._fridge_and_cycle_data.items():
-
-            cycle_ids = sorted(cycles.keys())
-            for i in range(0, len(cycle_ids)):
-                cycle_id = cycle_ids[i]
-
-                cooldown_time = (self._fridge_and_cycle_data[fridge_id][cycle_id]['cooldown_end'] - \
-                                self._fridge_and_cycle_data[fridge_id][cycle_id]['cooldown_start']).total_seconds()
-
-                warmup_time = (self._fridge_and_cycle_data[fridge_id][cycle_id]['warmup_end'] - \
-                                self._fridge_and_cycle_data[fridge_id][cycle_id]['warmup_start'] ).total_seconds()
-
-                running_time = (self._fridge_and_cycle_data[fridge_id][cycle_id]['warmup_start'] - \
-                                self._fridge_and_cycle_data[fridge_id][cycle_id]['cooldown_end'] ).total_seconds()
-                # Update global structure organized by fridge/cycle
-                self._fridge_and_cycle_data[fridge_id][cycle_id]['fridge_id'] = fridge_id
-                self._fridge_and_cycle_data[fridge_id][cycle_id]['cooldown_time'] = cooldown_time
-                self._fridge_and_cycle_data[fridge_id][cycle_id]['running_time'] = running_time
-                self._fridge_and_cycle_data[fridge_id][cycle_id]['warmup_time'] = warmup_time
-                self._fridge_and_cycle_data[fridge_id][cycle_id]['next_cycle_start'] = None
-                self._fridge_and_cycle_data[fridge_id][cycle_id]['next_cycle_wait_time'] = None
-
-                if cycle_id  < cycle_ids[-1]:
-                    next_cycle_id = cycle_ids[i + 1]
-                    self._fridge_and_cycle_data[fridge_id][cycle_id]['next_cycle_start'] = \
-                        self._fridge_and_cycle_data[fridge_id][next_cycle_id]['cooldown_start']
-                    wait_time = (self._fridge_and_cycle_data[fridge_id][next_cycle_id]['cooldown_start'] - \
-                                self._fridge_and_cycle_data[fridge_id][cycle_id]['warmup_end']).total_seconds()
-                    self._fridge_and_cycle_data[fridge_id][cycle_id]['next_cycle_wait_time'] = wait_time
-
-            # Now update summary
-            summary =self.Calculate_Fridge_Summary_Data(fridge_id)
-            summary['update_timestamp'] = update_timestamp
-            self._fridge_summary_data[fridge_id] = summary
+        phase_end = timer.perf_counter()
+        stats['apply_s'] = phase_end - phase_start
+        stats['cycles_changed'] = sum(len(cycle_ids) for cycle_ids in dirty_cycles.values())
+        stats['fridges_changed'] = len(dirty_cycles)
+        phase_start = phase_end
+
+        calculated_cycles = self._Recalculate(dirty_cycles, update_timestamp, stats)
+        stats['cycles_recalculated'] = sum(len(cycles) for cycles in calculated_cycles.values())
+        phase_end = timer.perf_counter()
+        # _Recalculate timed the summaries, the rest of it was relinking cycles
+        stats['derive_s'] = phase_end - phase_start - stats['summarize_s']
+        phase_start = phase_end
         #
         # Now Create/update a log
         #
-        new_entry = {str(update_timestamp): {'fridge_summary_data': self._fridge_summary_data,
-                     'fridge_and_cycle_data': self._fridge_and_cycle_data}}
+        if log_offsets:
+            self._Set_Log_Offsets(log_offsets)
+        stats['record_kind'], stats['bytes_persisted'] = self._Save_History(update_timestamp, calculated_cycles)
+        phase_end = timer.perf_counter()
+        stats['persist_s'] = phase_end - phase_start
+        stats['total_s'] = phase_end - update_start
+        self._Add_Stats(stats)
+
+    def Ingest(self, source, chunk_lines: int = INGEST_CHUNK_LINES):
+        """
+        Generator that feeds a log through Update chunk_lines lines at a time, so only one chunk is
+        ever held in memory whatever the size of the log. Each chunk is applied and written to the
+        history before the next is read; the log has only been taken in once the generator is done.
+        From a log file name, a last line without its newline is left unread, as LogTail does.
+        :param source: log file name, file object (text or binary) or any iterable of lines
+        :param chunk_lines: lines per Update
+        :return:
+        yields after each chunk a dict of 'chunks', 'lines' and 'bytes' (characters, for text
+        sources) so far, 'total_bytes' (size of the file, None if not known) and 'stats' (the
+        chunk's Update stats, see Get_Stats)
+        """
+        path = None
+        if isinstance(source, str):
+            path = os.path.abspath(source)
+            source = open(path, 'rb')
+        total_bytes = None
+        try:
+            total_bytes = os.fstat(source.fileno()).st_size
+        except (AttributeError, OSError, ValueError):
+            pass
+        progress = {'chunks': 0, 'lines': 0, 'bytes': 0, 'total_bytes': total_bytes, 'stats': None}
+        lines = iter(source)
+        try:
+            while True:
+                chunk = list(itertools.islice(lines, chunk_lines))
+                if not chunk:
+                    break
+                log_offsets = None
+                if path is not None:
+                    if not chunk[-1].endswith(b'\n'):
+                        # A last line still being written is left for the tail, as LogTail would,
+                        # so it is only applied once it is complete
+                        chunk.pop()
+                        if not chunk:
+                            break
+                    progress['bytes'] += sum(map(len, chunk))
+                    log_offsets = {path: progress['bytes']}
+                else:
+                    progress['bytes'] += sum(map(len, chunk))
+                if isinstance(chunk[0], bytes):
+                    chunk = [line.decode('utf-8', errors='replace') for line in chunk]
+                self.Update(chunk, log_offsets=log_offsets)
+                progress['chunks'] += 1
+                progress['lines'] += len(chunk)
+                progress['stats'] = self._recent_stats[-1]
+                yield dict(progress)
+        finally:
+            if path is not None:
+                source.close()
+
+    def _Apply_Record(self, record: tuple, update_timestamp: datetime, dirty_cycles: dict):
+        """
+        Insert or correct the cycle of one parsed log line, keeping the running totals up to date
+        :param record: as returned by Parse_Log_Line
+        :param update_timestamp:
+        :param dirty_cycles: {fridge_id: set of cycle ids}, the cycle is added if it changed
+        :return:
+        """
+        fridge_id = record[0]
+        cooldown_number = record[1]
+
+        if fridge_id not in self._fridge_and_cycle_data:
+            self._fridge_and_cycle_data[fridge_id] = defaultdict(None)
+
+        cycle = self._fridge_and_cycle_data[fridge_id].get(cooldown_number)
+        if cycle is None:
+            cycle = CycleRecord(fridge_id, cooldown_number)
+            self._fridge_and_cycle_data[fridge_id][cooldown_number] = cycle
+            bisect.insort(self._fridge_cycle_ids[fridge_id], cooldown_number)
+        elif not cycle.Matches(*record[2:]):
+            # Correction: take the old values out of the totals, and unlink it from the next
+            # cycle (it is relinked, with its new wait time, in _Recalculate)
+            self._fridge_totals[fridge_id].Remove_Cycle(cycle)
+            self._fridge_totals[fridge_id].Remove_Wait(cycle)
+            self._fleet_totals.Remove_Cycle(cycle)
+            self._fleet_totals.Remove_Wait(cycle)
+            cycle.next_cycle_start = None
+
+        if cycle.Set_Timestamps(*record[2:]):
+            self._fridge_totals[fridge_id].Add_Cycle(cycle)
+            self._fleet_totals.Add_Cycle(cycle)
+            cycle.update_timestamp = update_timestamp
+            dirty_cycles[fridge_id].add(cooldown_number)
+            if self._columnar is not None:
+                self._columnar.Set_Cycle(fridge_id, cooldown_number, *record[2:])
+
+    def _Recalculate(self, dirty_cycles: dict, update_timestamp: datetime, stats: dict = None) -> dict:
+        """
+        Relink the changed cycles (and the one before each) and redo the summaries of their fridges
+        :param dirty_cycles: {fridge_id: set of cycle ids} changed by this update
+        :param update_timestamp:
+        :param stats: if given, time spent on the summaries is added to its 'summarize_s'
+        :return:
+        {fridge_id: {cycle: CycleRecord}} of the cycles recalculated
+        """
+        # Deal with 'time between cycles' e.g. cycle N needs its time for warmup_end and the next cooldown_start
+        # so the cycle before each changed one has to be redone as well.
+        calculated_cycles = defaultdict(dict)
+        for fridge_id, changed_cycles in dirty_cycles.items():
+            cycle_ids = self._fridge_cycle_ids[fridge_id]
+            to_calculate = set()
+            for cycle_id in changed_cycles:
+                i = bisect.bisect_left(cycle_ids, cycle_id)
+                to_calculate.add(i)
+                if i > 0:
+                    to_calculate.add(i - 1)
+            for i in to_calculate:
+                self._Calculate_Cycle_Data(fridge_id, cycle_ids, i)
+                calculated_cycles[fridge_id][cycle_ids[i]] = self._fridge_and_cycle_data[fridge_id][cycle_ids[i]]
+            self._window_dirty_from[fridge_id] = min(self._window_dirty_from.get(fridge_id, len(cycle_ids)),
+                                                     min(to_calculate))
+            if fridge_id in self._rank_indexes:
+                self._rank_dirty.setdefault(fridge_id, set()).update(cycle_ids[i] for i in to_calculate)
+            summarize_start = timer.perf_counter()
+            self._Summarize_Fridge(fridge_id, update_timestamp)
+            if stats is not None:
+                stats['summarize_s'] += timer.perf_counter() - summarize_start
+        return calculated_cycles
+
+    def _Summarize_Fridge(self, fridge_id: int, update_timestamp: datetime):
+        if self._columnar is not None:
+            summary = self._columnar.Summary(fridge_id)
+            # The sketches are kept with the running totals either way
+            summary.percentiles = self._fridge_totals[fridge_id].Percentiles()
+        else:
+            summary = self._Summarize_Totals(fridge_id)
+        if self._verify_summaries:
+            self.Verify_Fridge_Summary_Data(fridge_id, summary)
+        summary.update_timestamp = update_timestamp
+        self._fridge_summary_data[fridge_id] = summary
+        self._version += 1
+        self._fridge_versions[fridge_id] = self._version
+
+    def Load_Files(self, patterns: list, processes: int = None) -> dict:
+        """
+        Bulk load whole log files (names or glob patterns), parsing and deriving in a process pool.
+        Files are split into chunks that are parsed in parallel, the records are sharded by fridge_id,
+        and each shard's cycles, links and totals are derived in parallel, then merged in here as one
+        update. As with Update, later files (in the order given) and later lines win for a cycle.
+        Fridges that already hold data are merged through the usual incremental path instead.
+        Raw lines of a bulk load are not kept (see Get_raw_log_data).
+        :param patterns: log file names or glob patterns
+        :param processes: worker processes, default one per CPU; 1 does everything in this process
+        :return:
+        {path: offset after the last complete line loaded}, e.g. for LogTail.Mark_Read
+        """
+        update_timestamp = datetime.now()
+        stats = self._New_Stats(update_timestamp, 'load')
+        load_start = timer.perf_counter()
+        processes = processes or os.cpu_count() or 1
+        shards = processes
+        chunks = []
+        for path in Expand_Log_Paths(patterns):
+            try:
+                size = os.path.getsize(path)
+            except OSError as e:
+                self._Report(f"Cannot read log file {path}: {e}")
+                continue
+            for start in range(0, max(size, 1), LOAD_CHUNK_BYTES):
+                chunks.append((path, start, min(start + LOAD_CHUNK_BYTES, size)))
+
+        offsets = {}
+        if processes == 1:
+            parsed = [_Parse_Chunk(path, start, end, shards) for path, start, end in chunks]
+            parse_end = timer.perf_counter()
+            derived = [_Derive_Shard([shard_records[0] for shard_records, position, counts in parsed],
+                                     update_timestamp)]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                parsed = list(executor.map(_Parse_Chunk, *zip(*[(path, start, end, shards)
+                                                                 for path, start, end in chunks]))) if chunks else []
+                parse_end = timer.perf_counter()
+                futures = [executor.submit(_Derive_Shard, [shard_records[shard]
+                                                           for shard_records, position, counts in parsed],
+                                           update_timestamp)
+                           for shard in range(shards)]
+                derived = [future.result() for future in futures]
+        phase_start = timer.perf_counter()
+        stats['parse_s'] = parse_end - load_start
+        stats['derive_s'] = phase_start - parse_end
+        rejected = defaultdict(int)
+        for (path, start, end), (shard_records, position, (lines, comments, reasons)) in zip(chunks, parsed):
+            offsets[path] = max(offsets.get(path, 0), position)
+            stats['lines'] += lines
+            stats['comments'] += comments
+            for reason, count in reasons.items():
+                rejected[reason] += count
+        stats['rejected'] = sum(rejected.values())
+        stats['rejected_reasons'] = dict(rejected)
+
+        calculated_cycles = self._Merge_Derived(derived, update_timestamp, stats)
+        phase_end = timer.perf_counter()
+        # Merging into this object's state, less the summaries timed above
+        stats['apply_s'] = phase_end - phase_start - stats['summarize_s']
+
+        self._Set_Log_Offsets(offsets)
+        stats['record_kind'], stats['bytes_persisted'] = self._Save_History(update_timestamp, calculated_cycles)
+        stats['persist_s'] = timer.perf_counter() - phase_end
+        stats['total_s'] = timer.perf_counter() - load_start
+        self._Add_Stats(stats)
+        return offsets
+
+    def Resume_Files(self, patterns: list, processes: int = None) -> dict:
+        """
+        Warm start: restore the state last written to the history journal, then ingest only what was
+        appended to the logs since, going by the log checkpoints kept with it (logs not seen before
+        are read in full). If there is no such state, or a log it was made from is missing or no
+        longer starts the same (rotated, truncated, rewritten), the logs are loaded in full with
+        Load_Files instead. Only for a FridgeData that has no data yet.
+        :param patterns: log file names or glob patterns
+        :param processes: worker processes for Load_Files
+        :return:
+        {path: offset after the last complete line ingested}, as Load_Files
+        """
+        paths = Expand_Log_Paths(patterns)
+        record, reason = self._Resume_Record(paths)
+        if record is None:
+            self._Report(f"Loading the logs in full: {reason}")
+            return self.Load_Files(paths, processes)
+
+        self._Restore_State(*record)
+        offsets = {}
+        lines = []
+        for path in paths:
+            log_tail = LogTail(path)
+            if path in self._log_checkpoints:
+                log_tail.Mark_Read(self._log_checkpoints[path]['offset'])
+            lines.extend(log_tail.Read_New_Lines())
+            offsets[path] = log_tail.Get_Offset()
+        self._Report(f"Resumed from the history of {record[1]['timestamp']}, {len(lines)} new lines in the logs")
+        if lines:
+            self.Update(lines, log_offsets=offsets)
+        return offsets
+
+    def _Resume_Record(self, paths: list) -> tuple:
+        """
+        The latest history record, if its log checkpoints show the logs have only grown since
+        :return:
+        ((offset, record), None), or (None, why not)
+        """
+        index = self._journal.Index()
+        if not index:
+            return None, f"no history in {self._history_file}"
+        offset = index[-1][1]
+        record = self._journal.Read_At(offset)
+        checkpoints = record.get('log_checkpoints')
+        if not checkpoints:
+            return None, f"the history in {self._history_file} has no log checkpoints"
+        for path, checkpoint in checkpoints.items():
+            if path not in paths:
+                return None, f"the history includes {path}, which is not being read"
+            if not Checkpoint_Matches(path, checkpoint):
+                return None, f"{path} has changed since {record['timestamp']}"
+        return (offset, record), None
+
+    def _Restore_State(self, offset: int, record: dict):
+        """
+        Take over the state as of a history record, and carry on its journal's checkpoint chain
+        rather than writing the same state out again
+        """
+        update_timestamp = datetime.now()
+        stats = self._New_Stats(update_timestamp, 'resume')
+        restore_start = timer.perf_counter()
+        state = self._journal.Read_State(offset)
+        restored_timestamp = datetime.fromisoformat(state['timestamp'])
+        records = {}
+        for fridge_id, cycles in state['fridge_and_cycle_data'].items():
+            for cycle_id, cycle in cycles.items():
+                records[(fridge_id, cycle_id)] = (fridge_id, cycle_id) + Cycle_Values(cycle)
+        phase_start = timer.perf_counter()
+        stats['parse_s'] = phase_start - restore_start
+        derived = [_Derive_Shard([records], restored_timestamp)]
+        phase_end = timer.perf_counter()
+        stats['derive_s'] = phase_end - phase_start
+        self._Merge_Derived(derived, restored_timestamp, stats)
+        stats['apply_s'] = timer.perf_counter() - phase_end - stats['summarize_s']
+        self._log_checkpoints = dict(record.get('log_checkpoints', {}))
+
+        if record.get('kind', HISTORY_CHECKPOINT) == HISTORY_CHECKPOINT:
+            self._checkpoint_offset = offset
+        else:
+            self._checkpoint_offset = record['checkpoint_offset']
+        since_checkpoint = [length for key, record_offset, length in self._journal.Index()
+                            if record_offset > self._checkpoint_offset]
+        self._records_since_checkpoint = len(since_checkpoint)
+        self._bytes_since_checkpoint = sum(since_checkpoint)
+        stats['total_s'] = timer.perf_counter() - restore_start
+        self._Add_Stats(stats)
+
+    def _Set_Log_Offsets(self, log_offsets: dict):
+        for path, offset in log_offsets.items():
+            checkpoint = Log_Checkpoint(path, offset)
+            if checkpoint is not None:
+                self._log_checkpoints[path] = checkpoint
+
+    def _Merge_Derived(self, derived: list, update_timestamp: datetime, stats: dict) -> dict:
+        """
+        Install fridges derived in bulk (see _Derive_Shard). New fridges are taken over as they are,
+        fridges that already hold data are merged through the usual incremental path.
+        :param derived: list of {fridge_id: (sorted cycle ids, {cycle: CycleRecord}, FridgeTotals)}
+        :param update_timestamp:
+        :param stats: counters and the 'summarize_s' timing are added to it
+        :return:
+        {fridge_id: {cycle: CycleRecord}} of the cycles recalculated
+        """
+        dirty_cycles = defaultdict(set)
+        calculated_cycles = defaultdict(dict)
+        for shard in derived:
+            for fridge_id, (cycle_ids, cycles, totals) in shard.items():
+                if fridge_id in self._fridge_and_cycle_data:
+                    for cycle_id in cycle_ids:
+                        cycle = cycles[cycle_id]
+                        self._Apply_Record((fridge_id, cycle_id, cycle.cooldown_start, cycle.cooldown_end,
+                                            cycle.warmup_start, cycle.warmup_end), update_timestamp, dirty_cycles)
+                    continue
+                self._fridge_and_cycle_data[fridge_id] = defaultdict(None, cycles)
+                self._fridge_cycle_ids[fridge_id] = cycle_ids
+                self._fridge_totals[fridge_id] = totals
+                self._fleet_totals.Merge(totals)
+                self._window_dirty_from[fridge_id] = 0
+                if self._columnar is not None:
+                    for cycle_id in cycle_ids:
+                        cycle = cycles[cycle_id]
+                        self._columnar.Set_Cycle(fridge_id, cycle_id, cycle.cooldown_start, cycle.cooldown_end,
+                                                 cycle.warmup_start, cycle.warmup_end)
+                summarize_start = timer.perf_counter()
+                self._Summarize_Fridge(fridge_id, update_timestamp)
+                stats['summarize_s'] += timer.perf_counter() - summarize_start
+                calculated_cycles[fridge_id] = cycles
+                stats['cycles_changed'] += len(cycle_ids)
+        stats['cycles_changed'] += sum(len(cycle_ids) for cycle_ids in dirty_cycles.values())
+        calculated_cycles.update(self._Recalculate(dirty_cycles, update_timestamp, stats))
+        stats['fridges_changed'] = len(calculated_cycles)
+        stats['cycles_recalculated'] = sum(len(cycles) for cycles in calculated_cycles.values())
+        return calculated_cycles
+
+    def Save_Archive(self, path: str) -> int:
+        """
+        Write the cycles as a binary cycle archive (see FridgeArchive.py)
+        :return:
+        Number of cycles written
+        """
+        return Write_Archive(path, self._fridge_and_cycle_data)
 
+    def Export(self, path: str, export_format: str = 'columnar', fridge_ids: list = None, start: datetime = None,
+               end: datetime = None, block_rows: int = DEFAULT_BLOCK_ROWS) -> dict:
+        """
+        Write the summaries and cycles out for offline analytics (see FridgeExport.py), a fridge at a time
+        :param path: columnar file to write, or for 'csv' the base of the CSV file names
+        :param export_format: 'columnar' or 'csv'
+        :param fridge_ids: only these fridges, default all
+        :param start, end: if given, only this time window, as Get_Fridge_Summary_Data/Get_Fridge_Cycle_Data
+        :param block_rows: rows per block (or per CSV file)
+        :return:
+        {table: rows written}
+        """
+        writer = Open_Writer(path, export_format, block_rows,
+                             {'source': self._history_file, 'timestamp': str(datetime.now()), 'fridges': fridge_ids,
+                              'since': None if start is None else str(start),
+                              'until': None if end is None else str(end)})
         try:
-            if os.path.isfile(self._history_file):
-                with open(self._history_file, 'rb') as pickle_file:
-                    history_data = pickle.load(pickle_file)
-                history_data.update(new_entry)
+            rows = Export(writer, sorted(self.List_Fridges() or []),
+                          lambda fridge_id: self.Get_Fridge_Summary_Data(fridge_id, start, end),
+                          lambda fridge_id: self.Get_Fridge_Cycle_Data(fridge_id, start, end), fridge_ids)
+            writer.Close()
+        except BaseException:
+            # Leave no half written export (or .tmp file) behind
+            writer.Abort()
+            raise
+        return rows
+
+    def Load_Archive(self, path: str) -> int:
+        """
+        Merge the cycles of a binary cycle archive in, as one update, as Load_Files does for logs.
+        (To only look at an archive, open it with FridgeArchive.CycleArchive, which reads it in place.)
+        :return:
+        Number of cycles read
+        """
+        update_timestamp = datetime.now()
+        stats = self._New_Stats(update_timestamp, 'load')
+        load_start = timer.perf_counter()
+        archive = CycleArchive(path)
+        try:
+            records = {(record[0], record[1]): record for record in archive.Records()}
+        finally:
+            archive.Close()
+        phase_start = timer.perf_counter()
+        stats['parse_s'] = phase_start - load_start
+        stats['lines'] = len(records)
+        derived = [_Derive_Shard([records], update_timestamp)]
+        phase_end = timer.perf_counter()
+        stats['derive_s'] = phase_end - phase_start
+
+        calculated_cycles = self._Merge_Derived(derived, update_timestamp, stats)
+        phase_start = timer.perf_counter()
+        stats['apply_s'] = phase_start - phase_end - stats['summarize_s']
+        stats['record_kind'], stats['bytes_persisted'] = self._Save_History(update_timestamp, calculated_cycles)
+        stats['persist_s'] = timer.perf_counter() - phase_start
+        stats['total_s'] = timer.perf_counter() - load_start
+        self._Add_Stats(stats)
+        return len(records)
+
+    def _Save_History(self, update_timestamp: datetime, calculated_cycles: dict) -> tuple:
+        """
+        Append this update to the history journal, as a delta of the cycles and summaries that
+        changed, or as a full checkpoint every so many records/bytes.
+        :param update_timestamp:
+        :param calculated_cycles: {fridge_id: {cycle: data}} recalculated by this update
+        :return:
+        (kind of record, bytes written (or queued, with write_behind)), 0 bytes if it could not be written
+        """
+        def Checkpoint_Entry() -> dict:
+            checkpoint_entry = {'timestamp': str(update_timestamp),
+                                'kind': HISTORY_CHECKPOINT,
+                                'fridge_summary_data': self._fridge_summary_data,
+                                'fridge_and_cycle_data': self._fridge_and_cycle_data}
+            if self._log_checkpoints:
+                checkpoint_entry['log_checkpoints'] = dict(self._log_checkpoints)
+            return checkpoint_entry
+
+        if self._checkpoint_offset is None or \
+                self._records_since_checkpoint >= self._checkpoint_records or \
+                self._bytes_since_checkpoint >= self._checkpoint_bytes:
+            new_entry = Checkpoint_Entry()
+        else:
+            new_entry = {'timestamp': str(update_timestamp),
+                         'kind': HISTORY_DELTA,
+                         'checkpoint_offset': self._checkpoint_offset,
+                         'fridge_summary_data': {fridge_id: self._fridge_summary_data[fridge_id]
+                                                 for fridge_id in calculated_cycles},
+                         'fridge_and_cycle_data': calculated_cycles}
+            if self._log_checkpoints:
+                new_entry['log_checkpoints'] = dict(self._log_checkpoints)
+
+        kind = new_entry['kind']
+        try:
+            if self._journal_writer is not None:
+                # If queued records were lost, this delta may build on one of them, so the writer
+                # writes a checkpoint instead
+                offset, length, replaced = self._journal_writer.Append(new_entry, Checkpoint_Entry)
+                if replaced:
+                    kind = HISTORY_CHECKPOINT
             else:
-                history_data = new_entry
-            with open(self._history_file, 'wb+') as pickle_file:
-                pickle.dump(history_data, pickle_file)
+                offset, length = self._journal.Append(new_entry)
         except Exception as e:
-            print(f"Failed to update history file {self._history_file}: {str(e)}")
+            self._Report(f"Failed to update history file {self._history_file}: {str(e)}")
+            return kind, 0
+
+        if kind == HISTORY_CHECKPOINT:
+            self._checkpoint_offset = offset
+            self._records_since_checkpoint = 0
+            self._bytes_since_checkpoint = 0
+        else:
+            self._records_since_checkpoint += 1
+            self._bytes_since_checkpoint += length
+        return kind, length
+
+    def Set_Report(self, report):
+        """
+        Pass messages to report from now on (e.g. a full screen display's status line instead of print,
+        which would write over it), from this object and its journal and raw log store
+        """
+        self._report = report
+
+    def _Report(self, message: str):
+        self._report(message)
+
+    def Flush(self):
+        """
+        Wait until every history record so far is written and fsynced (already so without write_behind)
+        """
+        if self._journal_writer is not None:
+            self._journal_writer.Flush()
+
+    def Close(self):
+        """
+        Flush the history, stop the write-behind thread, let another writer have the journal and
+        delete the raw lines spilled to disk; no updates should follow
+        """
+        if self._journal_writer is not None:
+            self._journal_writer.Close()
+        self._journal.Unlock()
+        self._log_raw_read_data.Close()
+
+    def _New_Stats(self, update_timestamp: datetime, kind: str) -> dict:
+        stats = {'timestamp': update_timestamp, 'kind': kind,
+                 'lines': 0, 'comments': 0, 'rejected': 0, 'rejected_reasons': {},
+                 'cycles_changed': 0, 'cycles_recalculated': 0, 'fridges_changed': 0,
+                 'record_kind': None, 'bytes_persisted': 0, 'total_s': 0.0}
+        for phase in UPDATE_PHASES:
+            stats[phase + '_s'] = 0.0
+        return stats
+
+    def _Add_Stats(self, stats: dict):
+        self._recent_stats.append(stats)
+        self._number_of_updates += 1
+        for key, value in stats.items():
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                self._total_stats[key] += value
+
+    def Record_Phase(self, phase: str, seconds: float):
+        """
+        Add time spent on the latest update outside FridgeData (e.g. rendering it) to its stats, as '<phase>_s'
+        """
+        if self._recent_stats:
+            key = phase + '_s'
+            self._recent_stats[-1][key] = self._recent_stats[-1].get(key, 0.0) + seconds
+            self._total_stats[key] += seconds
+
+    def Get_Stats(self) -> dict:
+        """
+        Timings and counters of the updates so far
+        :return:
+        dict of 'updates' (number of updates so far), 'totals' (each counter and '<phase>_s' timing
+        summed over them) and 'recent' (list of the stats of the last STATS_HISTORY updates, oldest
+        first: 'timestamp', 'kind' ('update', 'load' or 'resume'), 'lines', 'comments', 'rejected',
+        'rejected_reasons', 'cycles_changed', 'cycles_recalculated', 'fridges_changed', 'record_kind',
+        'bytes_persisted', the UPDATE_PHASES timings and 'total_s')
+        """
+        return {'updates': self._number_of_updates,
+                'totals': dict(self._total_stats),
+                'recent': [dict(stats) for stats in self._recent_stats]}
+
+    def _Calculate_Cycle_Data(self, fridge_id: int, cycle_ids: list, i: int):
+        """
+        Link a single cycle to the one after it, for its wait time. (The cooldown, running and
+        warmup times are worked out from the CycleRecord timestamps when asked for.)
+        :param fridge_id:
+        :param cycle_ids: sorted cycle ids of the fridge
+        :param i: position of the cycle in cycle_ids
+        :return:
+        """
+        cycle = self._fridge_and_cycle_data[fridge_id][cycle_ids[i]]
+        self._fridge_totals[fridge_id].Remove_Wait(cycle)
+        self._fleet_totals.Remove_Wait(cycle)
+        cycle.next_cycle_start = None
+
+        if i + 1 < len(cycle_ids):
+            cycle.next_cycle_start = self._fridge_and_cycle_data[fridge_id][cycle_ids[i + 1]].cooldown_start
+        self._fridge_totals[fridge_id].Add_Wait(cycle)
+        self._fleet_totals.Add_Wait(cycle)
+
+    def _Summarize_Totals(self, fridge_id: int) -> FridgeSummary:
+        """
+        Make the summary of a fridge from its running totals, without going through its cycles
+        :param fridge_id:
+        :return:
+        """
+        fridge_totals = self._fridge_totals[fridge_id]
+        cycle_ids = self._fridge_cycle_ids[fridge_id]
+        cycles = self._fridge_and_cycle_data[fridge_id]
+        total_time = float(cycles[cycle_ids[-1]].warmup_end - cycles[cycle_ids[0]].cooldown_start)
+        return Make_Summary(fridge_id, fridge_totals.num_of_cycles, total_time, fridge_totals.Totals(),
+                            percentiles=fridge_totals.Percentiles())
+
+    def Verify_Fridge_Summary_Data(self, fridge_id: int, summary: FridgeSummary = None) -> bool:
+        """
+        Check the summary made from the running totals (or the columnar store) against a full recalculation.
+        On a mismatch the totals are rebuilt from the cycles.
+        :param fridge_id:
+        :param summary: summary to check, by default the current one
+        :return:
+        True if they agreed
+        """
+        if summary is None:
+            summary = self._fridge_summary_data[fridge_id]
+        recalculated = self.Calculate_Fridge_Summary_Data(fridge_id)
+        if (summary.num_of_cycles, summary.total_time, summary.totals) == \
+                (recalculated.num_of_cycles, recalculated.total_time, recalculated.totals):
+            return True
 
+        self._Report(f"Fridge {fridge_id}: running totals do not match recalculation, rebuilding them")
+        fridge_totals = FridgeTotals()
+        cycles = self._fridge_and_cycle_data[fridge_id]
+        for cycle in self._fridge_cycle_ids[fridge_id]:
+            fridge_totals.Add_Cycle(cycles[cycle])
+            fridge_totals.Add_Wait(cycles[cycle])
+        self._fleet_totals.Subtract(self._fridge_totals[fridge_id])
+        self._fleet_totals.Merge(fridge_totals)
+        self._fridge_totals[fridge_id] = fridge_totals
+        summary.num_of_cycles = recalculated.num_of_cycles
+        summary.total_time = recalculated.total_time
+        summary.totals = recalculated.totals
+        summary.averages = recalculated.averages
+        summary.percents = recalculated.percents
+        summary.percentiles = fridge_totals.Percentiles()
+        return False
 
     def List_Fridges(self):
         """
@@ -152,10 +971,10 @@ class FridgeData(object):
          :return:
         Returns None if there is no data
         """
-        if not self._fridge_and_cycle_data:
+        if not self._fridge_and_cycle_data or fridge_id not in self._fridge_and_cycle_data:
             return None
 
-        return(self._fridge_and_cycle_data['fridge_id'].keys())
+        return(self._fridge_cycle_ids[fridge_id])
 
     def Get_Number_of_Cycles_of_Fridge(self, fridge_id):
         """
@@ -164,35 +983,92 @@ class FridgeData(object):
          :return:
         Returns None if there is no data
         """
-        if not self._fridge_and_cycle_data or not self._fridge_and_cycle_data[fridge_id]:
+        if not self._fridge_and_cycle_data or fridge_id not in self._fridge_and_cycle_data:
             return 0
 
-        return(len(self._fridge_and_cycle_data['fridge_id'].keys()))
+        return(len(self._fridge_cycle_ids[fridge_id]))
 
-    def Get_Fridge_Cycle_Data(self, fridge_id: int)-> dict:
+    def Get_Fridge_Cycle_Data(self, fridge_id: int, start: datetime = None, end: datetime = None)-> dict:
         """
         Returns of durations for cooling, warming, and waiting for cycles of a fridge
         :param fridge_id:
+        :param start, end: if given, only the cycles overlapping this time window
         :return:
+        {cycle: CycleRecord} in cycle order. The records also answer the old dict keys
+        ('start', 'end', 'cooldown_time', ...).
         Returns None if there is no data
         """
         if not self._fridge_and_cycle_data or not self._fridge_and_cycle_data[fridge_id]:
             return None
 
-        ret = defaultdict(None)
-        cycle_list = sorted(self._fridge_and_cycle_data[fridge_id].keys())
-        for cycle in cycle_list:
-            cycle_data = defaultdict(None)
-            cycle_data['fridge_id'] =fridge_id
-            cycle_data['cycle'] = cycle
-            cycle_data['start'] = self._fridge_and_cycle_data[fridge_id][cycle]['cooldown_start']
-            cycle_data['end'] = self._fridge_and_cycle_data[fridge_id][cycle]['warmup_end']
-            cycle_data['cooldown_time'] = self._fridge_and_cycle_data[fridge_id][cycle]['cooldown_time']
-            cycle_data['running_time'] = self._fridge_and_cycle_data[fridge_id][cycle]['running_time']
-            cycle_data['warmup_time'] = self._fridge_and_cycle_data[fridge_id][cycle]['warmup_time']
-            cycle_data['next_cycle_wait_time'] = self._fridge_and_cycle_data[fridge_id][cycle]['next_cycle_wait_time']
-            ret[cycle] = cycle_data
-        return ret
+        cycles = self._fridge_and_cycle_data[fridge_id]
+        if start is not None or end is not None:
+            return {cycle: cycles[cycle]
+                    for cycle in self._Window_Index(fridge_id).Window_Cycle_Ids(*self._Window_Bounds(start, end))}
+        return {cycle: cycles[cycle] for cycle in self._fridge_cycle_ids[fridge_id]}
+
+    def Get_Fridge_Cycle_View(self, fridge_id: int, offset: int = 0, limit: int = None, start: datetime = None,
+                              end: datetime = None) -> CycleView:
+        """
+        Lazy {cycle: CycleRecord} over a range of a fridge's cycles, in cycle order. Unlike
+        Get_Fridge_Cycle_Data nothing is copied, records are only looked up as they are used;
+        use it before the next update.
+        :param fridge_id:
+        :param offset: position of the first cycle, negative counts from the end (-10 for the last 10)
+        :param limit: most cycles, default all from offset on
+        :param start, end: if given, only the cycles overlapping this time window (offset and limit
+            count within it)
+        :return:
+        CycleView, None if there is no data
+        """
+        cycles = self._fridge_and_cycle_data.get(fridge_id) if self._fridge_and_cycle_data else None
+        if not cycles:
+            return None
+        cycle_ids = self._fridge_cycle_ids[fridge_id]
+        if start is not None or end is not None:
+            cycle_ids = self._Window_Index(fridge_id).Window_Cycle_Ids(*self._Window_Bounds(start, end))
+        if offset < 0:
+            offset = max(0, len(cycle_ids) + offset)
+        positions = range(len(cycle_ids))
+        positions = positions[offset:] if limit is None else positions[offset:offset + limit]
+        return CycleView(cycles, cycle_ids, positions)
+
+    def Get_Top_Cycles(self, phase: str, n: int = 10, fridge_id: int = None, smallest: bool = False) -> list:
+        """
+        The cycles that spent longest (or shortest) in a phase, fleet-wide or of one fridge, e.g. the 10
+        slowest cooldowns. Answered from per fridge rankings, built when first asked for and kept up to
+        date as cycles change.
+        :param phase: 'cooldown_time', 'running_time', 'warmup_time' or 'next_cycle_wait_time'
+        :param n: how many
+        :param fridge_id: only this fridge, default every fridge
+        :param smallest: shortest first instead of longest
+        :return:
+        List of (seconds, CycleRecord)
+        """
+        if phase not in PHASES:
+            raise ValueError(f"Unknown phase {phase}, expected one of {', '.join(PHASES)}")
+        if fridge_id is None:
+            fridge_ids = list(self.List_Fridges() or [])
+        else:
+            fridge_ids = [fridge_id] if self._fridge_and_cycle_data.get(fridge_id) else []
+        ranked = {fridge_id: self._Rank_Index(fridge_id, phase).Ranked(smallest) for fridge_id in fridge_ids}
+        return [(seconds, self._fridge_and_cycle_data[fridge_id][cycle_id])
+                for seconds, fridge_id, cycle_id in Top_Cycles(ranked, n, smallest)]
+
+    def _Rank_Index(self, fridge_id: int, phase: str) -> CycleRankIndex:
+        """
+        The ranking of a fridge's cycles in a phase, brought up to date with its cycles
+        """
+        cycles = self._fridge_and_cycle_data[fridge_id]
+        indexes = self._rank_indexes.setdefault(fridge_id, {})
+        if phase not in indexes:
+            indexes[phase] = CycleRankIndex(phase, cycles)
+        dirty = self._rank_dirty.pop(fridge_id, None)
+        if dirty:
+            for index in indexes.values():
+                for cycle_id in dirty:
+                    index.Set(cycle_id, getattr(cycles[cycle_id], index.phase))
+        return indexes[phase]
 
     def Calculate_Fridge_Summary_Data(self, fridge_id:int) -> dict:
        """
@@ -217,57 +1093,129 @@ class FridgeData(object):
        if not self._fridge_and_cycle_data or not self._fridge_and_cycle_data[fridge_id]:
            return None
 
-       cycle_list = sorted(self._fridge_and_cycle_data[fridge_id].keys())
-       totals = {'cooldown_time': 0,
-                 'running_time': 0,
-                 'warmup_time': 0,
-                 'next_cycle_wait_time': 0}
+       cycle_list = self._fridge_cycle_ids[fridge_id]
+       cycles = self._fridge_and_cycle_data[fridge_id]
+       totals = {'cooldown_time': 0.0,
+                 'running_time': 0.0,
+                 'warmup_time': 0.0,
+                 'next_cycle_wait_time': 0.0}
 
-       total_time = (self._fridge_and_cycle_data[fridge_id][cycle_list[-1]]['warmup_end'] - \
-                    self._fridge_and_cycle_data[fridge_id][cycle_list[0]]['cooldown_start']).total_seconds()
+       total_time = float(cycles[cycle_list[-1]].warmup_end - cycles[cycle_list[0]].cooldown_start)
        for cycle in cycle_list:
-           totals['cooldown_time'] += self._fridge_and_cycle_data[fridge_id][cycle]['cooldown_time']
-           totals['running_time'] += self._fridge_and_cycle_data[fridge_id][cycle]['running_time']
-           totals['warmup_time'] += self._fridge_and_cycle_data[fridge_id][cycle]['warmup_time']
+           totals['cooldown_time'] += cycles[cycle].cooldown_time
+           totals['running_time'] += cycles[cycle].running_time
+           totals['warmup_time'] += cycles[cycle].warmup_time
            if cycle == cycle_list[-1]:
                continue
-           totals['next_cycle_wait_time'] += self._fridge_and_cycle_data[fridge_id][cycle]['next_cycle_wait_time']
-
-       averages = {'cooldown_time': totals['cooldown_time'] / len(cycle_list),
-                   'running_time': totals['running_time'] / len(cycle_list),
-                   'warmup_time': totals['warmup_time'] / len(cycle_list),
-                   'next_cycle_wait_time': totals['next_cycle_wait_time'] / (len(cycle_list) - 1)
-                   }
-       percents = {'cooldown_time': totals['cooldown_time'] / total_time,
-                   'running_time': totals['running_time'] / total_time,
-                   'warmup_time': totals['warmup_time'] / total_time,
-                   'next_cycle_wait_time': totals['next_cycle_wait_time'] / total_time
-                   }
-       return ({'fridge_id': fridge_id,
-                'num_of_cycles':len(cycle_list),
-                'total_time': total_time,
-                'totals': totals,
-                'averages': averages,
-                'percents': percents})
-
-    def Get_Fridge_Summary_Data(self, fridge_id):
+           totals['next_cycle_wait_time'] += cycles[cycle].next_cycle_wait_time
+
+       return Make_Summary(fridge_id, len(cycle_list), total_time, totals)
+
+    def Get_Fridge_Summary_Data(self, fridge_id, start: datetime = None, end: datetime = None):
         """
         Returns the Summary data for a given fridge
         :param fridge_id:
+        :param start: if given, only the time from here on counts
+        :param end: if given, only the time before this counts
+        Cycles straddling start or end only count for the part within the window; the window
+        is answered from prefix sums, in O(log n) for a log whose cycles follow one another.
         :return:
-        Return None if no such fridge and/or data not loading
+        Return None if no such fridge and/or data not loading (or no cycle in the window)
         """
         if not self._fridge_and_cycle_data or not self._fridge_and_cycle_data[fridge_id]:
             return None
+        if start is None and end is None:
+            return self._fridge_summary_data[fridge_id]
 
-        return self._fridge_summary_data[fridge_id]
+        window = self._Window_Index(fridge_id).Summary(*self._Window_Bounds(start, end))
+        if window is None:
+            return None
+        num_of_cycles, total_time, totals = window
+        summary = Make_Summary(fridge_id, num_of_cycles, float(total_time),
+                               {phase: float(seconds) for phase, seconds in totals.items()})
+        summary.update_timestamp = self._fridge_summary_data[fridge_id].update_timestamp
+        return summary
 
-    def Get_raw_log_data(self) -> dict:
+    def Get_Fleet_Summary_Data(self):
         """
-        Return raw text of log, organized as a dict indexed by date time stampt
+        Summary over every cycle of every fridge, from the fleet's running totals. total_time is the
+        sum of the fridges' total times, so the percents are of all the fridge time logged, and the
+        percentiles are of the durations of every cycle (and wait) in the fleet.
         :return:
+        FridgeSummary with fridge_id None, or None if there is no data
+        """
+        if not self._fridge_summary_data:
+            return None
+        if self._fleet_summary is not None and self._fleet_summary[0] == self._version:
+            return self._fleet_summary[1]
+        fleet_totals = self._fleet_totals
+        total_time = sum(summary.total_time for summary in self._fridge_summary_data.values())
+        summary = Make_Summary(None, fleet_totals.num_of_cycles, total_time, fleet_totals.Totals(),
+                               num_of_waits=fleet_totals.num_of_waits, percentiles=fleet_totals.Percentiles())
+        summary.update_timestamp = max(fridge_summary.update_timestamp
+                                       for fridge_summary in self._fridge_summary_data.values())
+        self._fleet_summary = (self._version, summary)
+        return summary
+
+    def _Window_Index(self, fridge_id: int) -> CycleWindowIndex:
+        """
+        The time window index of a fridge, brought up to date with its cycles
+        """
+        cycle_ids = self._fridge_cycle_ids[fridge_id]
+        if fridge_id not in self._window_indexes:
+            self._window_indexes[fridge_id] = CycleWindowIndex()
+            self._window_dirty_from[fridge_id] = 0
+        if fridge_id in self._window_dirty_from:
+            self._window_indexes[fridge_id].Rebuild_From(self._window_dirty_from.pop(fridge_id), cycle_ids,
+                                                         self._fridge_and_cycle_data[fridge_id])
+        return self._window_indexes[fridge_id]
+
+    @staticmethod
+    def _Window_Bounds(start: datetime, end: datetime) -> tuple:
+        return (float('-inf') if start is None else To_Epoch(start),
+                float('inf') if end is None else To_Epoch(end))
+
+    def Get_Version(self) -> int:
+        """
+        Version of the whole data set, changes whenever any fridge does
+        """
+        return self._version
+
+    def Get_Fridge_Version(self, fridge_id: int) -> int:
+        """
+        Version of one fridge's cycles and summary, changes only when they do (0 if unknown)
+        """
+        return self._fridge_versions.get(fridge_id, 0)
+
+    def Get_Rendered_Block(self, fridge_id: int, options: tuple, render) -> str:
+        """
+        Text for a fridge made by render(), cached and only made again once the fridge has changed
+        :param fridge_id: None for text about the whole fleet, made again once any fridge has changed
+        :param options: whatever else the text depends on, part of the cache key
+        :param render: function making the text
+        :return:
+        """
+        version = self._version if fridge_id is None else self._fridge_versions.get(fridge_id, 0)
+        cached = self._render_cache.get((fridge_id, options))
+        if cached is not None and cached[0] == version:
+            return cached[1]
+        text = render()
+        self._render_cache[(fridge_id, options)] = (version, text)
+        return text
+
+    def Get_Journal(self) -> FridgeJournal:
+        """
+        The history journal updates are written to
         """
-        return self._log_raw_read_data
+        return self._journal
+
+    def Get_raw_log_data(self):
+        """
+        Return raw text of log, as a generator of (update timestamp, lines), oldest first.
+        Only batches within the retention limits are kept; spilled ones are read back from disk as reached.
+        :return:
+        """
+        return self._log_raw_read_data.Batches()
 
     def Get_data_by_fridge_and_cycle(self) -> dict:
         """
@@ -287,36 +1235,6 @@ class FridgeData(object):
         else:
             return True
 
-    def _is_valid_data(self, line: str) -> bool:
-        # To Do Add validation and logging
-        # To Do, handle missing time stamps and cases when time before if later than time after.
-        
-        if len(line.strip().split(',')) != VALID_LINE_LEN:
-            # To Do some sort of logging
-            return False
-        else:
-            fridge_id, cooldown_number, cooldown_start, cooldown_end, warmup_start, warmup_end = line.split(',')
-            #First check for valid ints in first two fields.
-            try:
-                int(fridge_id)
-                int(cooldown_number)
-            except Exception as e:
-                # To Do Logging
-                return False
-            #Next check if remaining field are valid timestamps and the first is earlier than the second.
-            try:
-                if datetime.strptime(cooldown_end, TIME_FORMAT) < datetime.strptime(cooldown_start, TIME_FORMAT):
-                    # To Do Logging
-                    return False
-                if datetime.strptime(cooldown_end, TIME_FORMAT) < datetime.strptime(cooldown_start, TIME_FORMAT):
-                    # To Do Logging
-                    return False
-            except Exception as e:
-                #To Do Logging
-                return False
-
-        return True
-
     def FormatElapsedTime(time:int) -> str:
        """
 
@@ -337,98 +1255,229 @@ def format_time_period(period_in_seconds:str) ->str:
     :param period_in_seconds:str:
     :return:
     """
-    minutes, seconds = divmod(period_in_seconds, 60)
+    # Whole seconds (floored, as divmod on the float would) so the rest is integer arithmetic
+    minutes, seconds = divmod(int(period_in_seconds // 1), 60)
     hours, minutes = divmod(minutes, 60)
-    days, hours = divmod(hours,24)
-
-    return(f"Days {int(days):02d}, {int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}")
+    days, hours = divmod(hours, 24)
 
+    return(f"Days {days:02d}, {hours:02d}:{minutes:02d}:{seconds:02d}")
 
-def FormatSummaryData(summary: dict) -> str:
 
-    Summary_String= ""
+SUMMARY_ROWS = [('Cool Down Time:', 'cooldown_time'),
+                ('Running Time:', 'running_time'),
+                ('Warm Up Time:', 'warmup_time'),
+                ('Wait Time:', 'next_cycle_wait_time')]
 
-    Summary_String += f"  {'Times':20}  {'Total':^20}  {'Average':^20}  {'Percent':^20}\n"
 
-    Summary_String += f"  {'Cool Down Time:':20} "
-    Summary_String += f"  {format_time_period(summary['totals']['cooldown_time']):^20}"
-    Summary_String += f"  {format_time_period(summary['averages']['cooldown_time']):^20}"
-    Summary_String += f"  {summary['percents']['cooldown_time'] * 100:11.2f}% \n"
+def Summary_Lines(summary: dict):
+    """
+    Generator of the lines (each ending in a newline) of a fridge summary table, followed by the
+    table of percentiles when the summary has them
+    """
+    yield f"  {'Times':20}  {'Total':^20}  {'Average':^20}  {'Percent':^20}\n"
+    for label, key in SUMMARY_ROWS:
+        yield f"  {label:20} " + \
+              f"  {format_time_period(summary['totals'][key]):^20}" + \
+              f"  {format_time_period(summary['averages'][key]):^20}" + \
+              f"  {summary['percents'][key] * 100:11.2f}% \n"
+    percentiles = summary.get('percentiles')
+    if percentiles:
+        yield f"  {'Percentiles':20}  {'p50':^20}  {'p95':^20}  {'p99':^20}\n"
+        for label, key in SUMMARY_ROWS:
+            if percentiles.get(key) is None:
+                continue
+            yield f"  {label:20} " + \
+                  "".join(f"  {format_time_period(percentiles[key][p]):^20}" for p in ('p50', 'p95', 'p99')) + "\n"
 
-    Summary_String += f"  {'Running Time:':20} "
-    Summary_String += f"  {format_time_period(summary['totals']['running_time']):^20}"
-    Summary_String += f"  {format_time_period(summary['averages']['running_time']):^20}"
-    Summary_String += f"  {summary['percents']['running_time'] * 100:11.2f}% \n"
 
-    Summary_String += f"  {'Warm Up Time:':20} "
-    Summary_String += f"  {format_time_period(summary['totals']['warmup_time']):^20}"
-    Summary_String += f"  {format_time_period(summary['averages']['warmup_time']):^20}"
-    Summary_String += f"  {summary['percents']['warmup_time'] * 100:11.2f}% \n"
+def FormatSummaryData(summary: dict) -> str:
+    return "".join(Summary_Lines(summary))
 
-    Summary_String += f"  {'Wait Time:':20} "
-    Summary_String += f"  {format_time_period(summary['totals']['next_cycle_wait_time']):^20}"
-    Summary_String += f"  {format_time_period(summary['averages']['next_cycle_wait_time']):^20}"
-    Summary_String += f"  {summary['percents']['next_cycle_wait_time'] * 100:11.2f}% \n"
 
-    return Summary_String
+def Cycle_Lines(cycle_data: dict, selected_cycle: int = -1):
+    """
+    Generator of the lines (each ending in a newline) of a fridge's cycle table
+    :param cycle_data: {cycle: cycle record or dict}
+    :param selected_cycle: only show this cycle, if >= 0
+    """
+    yield f"  Cycles {'Start':^20}  {'End':^20}  {'Cooldown':^20}   {'Running':^20}  {'Warmup':^20}  {'Wait':^20}\n"
+    if selected_cycle >= 0:
+        cycle_ids = [selected_cycle] if selected_cycle in cycle_data else []
+    else:
+        cycle_ids = sorted(cycle_data.keys())
+    for i in cycle_ids:
+        cycle = cycle_data[i]
+        cycle_string = f"  {i:4}  " + \
+                       f" {str(cycle['cooldown_start']):20}  " + \
+                       f" {str(cycle['warmup_end']):20}  " + \
+                       f" {format_time_period(cycle['cooldown_time']):20}  " + \
+                       f" {format_time_period(cycle['running_time']):20}  " + \
+                       f" {format_time_period(cycle['warmup_time']):20} "
+        if cycle['next_cycle_wait_time']:
+            yield cycle_string + f" {format_time_period(cycle['next_cycle_wait_time']):20}\n"
+        else:
+            yield cycle_string + f"       N/A\n"
 
 
-def FormatCycleData(cycle_data: dict, **kwargs) -> list:
-    formatted_cycle_data = f"  Cycles {'Start':^20}  {'End':^20}  {'Cooldown':^20}   {'Running':^20}  {'Warmup':^20}  {'Wait':^20}\n"
+def FormatCycleData(cycle_data: dict, **kwargs) -> str:
     selected_cycle = -1
     if 'cycle' in kwargs:
         selected_cycle = kwargs['cycle']
-    for i in sorted(cycle_data.keys()):
-        if selected_cycle >= 0 and i != selected_cycle:
-            continue
-        cycle_string = ""
-        cycle_string += f"  {i:4}  "
-        cycle_string += f" {str(cycle_data[i]['cooldown_start']):20}  "
-        cycle_string += f" {str(cycle_data[i]['warmup_end']):20}  "
-        cycle_string += f" { format_time_period(cycle_data[i]['cooldown_time']):20}  "
-        cycle_string += f" {format_time_period(cycle_data[i]['running_time']):20}  "
-        cycle_string += f" {format_time_period(cycle_data[i]['warmup_time']):20} "
-        if cycle_data[i]['next_cycle_wait_time']:
-           cycle_string += f" {format_time_period(cycle_data[i]['next_cycle_wait_time']):20}\n"
-        else:
-            cycle_string += f"       N/A\n"
-        formatted_cycle_data += cycle_string
-    return(formatted_cycle_data)
+    return "".join(Cycle_Lines(cycle_data, selected_cycle))
 
-def FrigeOutput(fridge_data:dict, **kwargs) -> str:
 
-    selected_fridge_id = -1
-    selected_cycle = -1
-    showSummary = True
-    showCycles = True
+def Render_Fridge(fridge_data, fridge_id: int, showSummary: bool = True, showCycles: bool = True,
+                  selected_cycle: int = -1, start: datetime = None, end: datetime = None, last: int = None) -> str:
+    """
+    Text block for one fridge: summary, cycles and the closing count line (ending in a newline).
+    With start and/or end, only that time window; empty if the fridge has no cycle in it.
+    With last, only the last so many cycles are listed, unless a cycle is selected: that one is listed
+    wherever it falls. Only the cycles listed are looked at.
+    """
+    summary_data = fridge_data.Get_Fridge_Summary_Data(fridge_id, start=start, end=end)
+    if summary_data is None:
+        return ""
+    block = []
+    if showSummary:
+        block.append(f"Fridge {fridge_id} Summary:\n")
+        block.extend(Summary_Lines(summary_data))
+
+    if showCycles:
+        block.append(f"Fridge {fridge_id} Cycle Data:\n")
+        cycle_view = fridge_data.Get_Fridge_Cycle_View(fridge_id,
+                                                       offset=0 if last is None or selected_cycle >= 0 else -last,
+                                                       start=start, end=end)
+        block.extend(Cycle_Lines(cycle_view, selected_cycle))
+
+    block.append(f"Fridge {fridge_id}: Cycle Count: {summary_data['num_of_cycles']}  " +
+                 f"Total Time: {format_time_period(summary_data['total_time'])}  " +
+                 f"Updated: {summary_data['update_timestamp']}\n")
+    return "".join(block)
+
+
+def Render_Fleet(fridge_data) -> str:
+    """
+    Text block for the whole fleet: summary of every fridge's cycles together, and the count line
+    """
+    summary_data = fridge_data.Get_Fleet_Summary_Data()
+    if summary_data is None:
+        return ""
+    block = ["Fleet Summary:\n"]
+    block.extend(Summary_Lines(summary_data))
+    block.append(f"Fleet: Fridges: {fridge_data.Get_Number_of_Fridges()}  " +
+                 f"Cycle Count: {summary_data['num_of_cycles']}  " +
+                 f"Total Time: {format_time_period(summary_data['total_time'])}  " +
+                 f"Updated: {summary_data['update_timestamp']}\n")
+    return "".join(block)
+
+
+def Top_Lines(top_cycles: list, phase: str, fridge_id: int = -1):
+    """
+    Generator of the lines (each ending in a newline) of a table of the cycles longest in a phase
+    :param top_cycles: list of (seconds, fridge_id, cycle, cycle record or dict)
+    :param phase: 'cooldown_time', 'running_time', 'warmup_time' or 'next_cycle_wait_time'
+    :param fridge_id: the fridge they are of, if >= 0, else the fleet
+    """
+    label = dict((name, label) for label, name in SUMMARY_ROWS)[phase].rstrip(':')
+    yield f"Longest {label}, {'fleet' if fridge_id < 0 else f'fridge {fridge_id}'}:\n"
+    yield f"  {'Fridge':>6}  {'Cycle':>6}   {'Start':^20}   {label:^20}\n"
+    for seconds, cycle_fridge_id, cycle_id, cycle in top_cycles:
+        yield f"  {cycle_fridge_id:6}  {cycle_id:6}   {str(cycle['cooldown_start']):20}   " + \
+              f"{format_time_period(seconds):20}\n"
 
-    if 'cycle' in kwargs:
-        selected_cycle = kwargs['cycle']
-    if 'fridge_id' in kwargs:
-        selected_fridge_id = kwargs['fridge_id']
-    if 'showCycles' in kwargs:
-        showCycles = kwargs['showCycles']
-    if 'showSummary' in kwargs:
-        showSummary = kwargs['showSummary']
-
-    output = ""
-    for fridge_id in fridge_data.List_Fridges():
+
+def Render_Top(fridge_data, phase: str, n: int, fridge_id: int = -1) -> str:
+    """
+    Text block of the n cycles that spent longest in a phase, fleet-wide or of one fridge (fridge_id >= 0)
+    """
+    top_cycles = fridge_data.Get_Top_Cycles(phase, n, None if fridge_id < 0 else fridge_id)
+    if not top_cycles:
+        return ""
+    return "".join(Top_Lines([(seconds, cycle.fridge_id, cycle.cycle, cycle) for seconds, cycle in top_cycles],
+                             phase, fridge_id))
+
+
+def Fridge_Output_Blocks(fridge_data, **kwargs):
+    """
+    Generator of the text block of each fridge shown, as FrigeOutput would show them, then of the
+    fleet summary when every fridge is shown with summaries and no time window. With top, a block
+    of the top_n (default 10) cycles longest in that phase comes first.
+    Blocks are cached in fridge_data and only rendered again once their fridge has changed.
+    Takes the same keyword arguments as FrigeOutput.
+    """
+    selected_fridge_id = kwargs.get('fridge_id', -1)
+    selected_cycle = kwargs.get('cycle', -1)
+    showSummary = kwargs.get('showSummary', True)
+    showCycles = kwargs.get('showCycles', True)
+    start = kwargs.get('start')
+    end = kwargs.get('end')
+    last = kwargs.get('last')
+    top = kwargs.get('top')
+    top_n = kwargs.get('top_n', 10)
+
+    if top is not None:
+        block = fridge_data.Get_Rendered_Block(None, ('top', top, top_n, selected_fridge_id),
+                                               lambda: Render_Top(fridge_data, top, top_n, selected_fridge_id))
+        if block:
+            yield block
+
+    for fridge_id in fridge_data.List_Fridges() or []:
         if selected_fridge_id >= 0 and fridge_id != selected_fridge_id:
             continue
-        summary_data = fridge_data.Get_Fridge_Summary_Data(fridge_id)
-        cycle_data = fridge_data.Get_Fridge_Cycle_Data(fridge_id)
-        if showSummary:
-            output += f"Fridge {fridge_id} Summary:\n"
-            output += FormatSummaryData(summary_data)
+        block = fridge_data.Get_Rendered_Block(fridge_id, (showSummary, showCycles, selected_cycle, start, end, last),
+                                               lambda: Render_Fridge(fridge_data, fridge_id, showSummary, showCycles,
+                                                                     selected_cycle, start, end, last))
+        if block:
+            yield block
+
+    if selected_fridge_id < 0 and showSummary and start is None and end is None:
+        block = fridge_data.Get_Rendered_Block(None, ('fleet',), lambda: Render_Fleet(fridge_data))
+        if block:
+            yield block
 
-        if showCycles:
-            output += f"Fridge {fridge_id} Cycle Data:\n"
-            output += FormatCycleData(cycle_data, cycle=selected_cycle)
 
-        output += f"Fridge {fridge_id}: Cycle Count: {summary_data['num_of_cycles']}  " + \
-                  f"Total Time: {format_time_period(summary_data['total_time'])}  " + \
-                  f"Updated: {summary_data['update_timestamp']}\n\n"
-    return output.strip()
+def Write_Fridge_Output(fridge_data, writer, **kwargs):
+    """
+    Stream FrigeOutput to writer (anything with a write method, e.g. sys.stdout or an open file)
+    a fridge at a time, rather than building it up as one string.
+    Takes the same keyword arguments as FrigeOutput.
+    """
+    separator = ""
+    for block in Fridge_Output_Blocks(fridge_data, **kwargs):
+        writer.write(separator)
+        writer.write(block)
+        separator = "\n"
+
+
+def FormatUpdateStats(recent_stats: list) -> str:
+    """
+    Table of the timings (ms) and counters of updates, one row each
+    :param recent_stats: as in FridgeData.Get_Stats()['recent']
+    :return:
+    """
+    phases = UPDATE_PHASES + ['render']
+    table = f"  {'Time':8}  {'Kind':6}  {'Lines':>8}  {'Comments':>8}  {'Rejected':>8}  {'Cycles':>8}  " + \
+            f"{'Fridges':>7}  {'Bytes':>10}  " + "  ".join(f"{phase:>9}" for phase in phases) + \
+            f"  {'total':>9}\n"
+    for stats in recent_stats:
+        table += f"  {stats['timestamp'].strftime('%H:%M:%S'):8}  {stats['kind']:6}  {stats['lines']:8,}  " + \
+                 f"{stats['comments']:8,}  {stats['rejected']:8,}  {stats['cycles_changed']:8,}  " + \
+                 f"{stats['fridges_changed']:7,}  {stats['bytes_persisted']:10,}  " + \
+                 "  ".join(f"{stats.get(phase + '_s', 0.0) * 1000:9.1f}" for phase in phases) + \
+                 f"  {(stats['total_s'] + stats.get('render_s', 0.0)) * 1000:9.1f}\n"
+    return table
+
+
+def FrigeOutput(fridge_data:dict, **kwargs) -> str:
+    """
+    Text of the summaries and cycles of the fridges
+    :param fridge_data: FridgeData
+    :param kwargs: fridge_id, cycle: only show this fridge/cycle; showSummary, showCycles;
+        start, end: only show this time window; last: only list the last so many cycles of each fridge;
+        top, top_n: first show the top_n cycles longest in phase top (e.g. 'cooldown_time')
+    :return:
+    """
+    return "\n".join(Fridge_Output_Blocks(fridge_data, **kwargs)).strip()
 
 if __name__ == "__main__":
     fridge_data = FridgeData()
@@ -447,6 +1496,5 @@ if __name__ == "__main__":
     os.system("cls") if "nt" in os.name else os.system("clear")
     print(FrigeOutput(fridge_data))
     sleep(0.5)
-    with open('FridgeData.pickle', 'rb') as pickle_file:
-        history_data = pickle.load(pickle_file)
+    history_data = [record for offset, record in FridgeJournal('FridgeData.journal').Records()]
     i = 0
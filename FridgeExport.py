@@ -0,0 +1,433 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/14/2020
+Project: Rigetti
+File: FridgeExport.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Export of fridge summaries and cycles for offline analytics, as a columnar file or as CSV.
+
+    The columnar file is a schema header followed by blocks of rows stored column by column:
+
+        header: 'FRIDGEX1' | schema length (uint32) | schema (UTF-8 JSON)
+        block:  table number (uint32) | number of rows (uint32) |
+                each column of the table in turn, rows x 8 bytes
+
+    All little-endian.  The schema gives the tables ('summaries' and 'cycles'), each with its
+    columns as [name, type], type 'int64' or 'float64'; missing values are NULL_INT64 in
+    int64 columns and NaN in float64 ones.  Timestamps are int64 seconds since the epoch and
+    durations float64 seconds.  A column of a block can be read straight into an array (e.g.
+    numpy.frombuffer(data, '<i8')) by any language, without parsing.  CSV is written as files
+    of at most so many rows each, <output>_<table>_<NNNN>.csv with a header line.
+
+    Fridges are exported one at a time and rows go out a block at a time, so memory is bounded
+    by a fridge's cycles and a block, whether the data comes from a live FridgeData, a history
+    record or a cycle archive (read in place).
+"""
+import argparse
+import csv
+import json
+import math
+import os
+import struct
+import sys
+from array import array
+from datetime import datetime
+from FridgeRecords import CycleRecord, Make_Summary, PHASES, To_Epoch
+from FridgeWindow import CycleWindowIndex
+from FridgeArchive import CycleArchive, Is_Archive, Cycle_Values
+from FridgeJournal import FridgeJournal, Is_Journal, Timestamp_From_Key
+
+EXPORT_MAGIC = b'FRIDGEX1'
+EXPORT_SCHEMA_LENGTH = struct.Struct('<I')
+EXPORT_BLOCK = struct.Struct('<II')
+EXPORT_VERSION = 1
+NULL_INT64 = -2 ** 63
+# Rows of a table held before they are written out as a block (or CSV rows per file)
+DEFAULT_BLOCK_ROWS = 65536
+QUANTILE_NAMES = ['p50', 'p95', 'p99']
+
+TABLES = {
+    'summaries': [('fridge_id', 'int64'), ('num_of_cycles', 'int64'), ('total_time', 'float64')] +
+                 [(f"{phase}_{value}", 'float64') for phase in PHASES
+                  for value in ['total', 'average', 'percent'] + QUANTILE_NAMES],
+    'cycles': [('fridge_id', 'int64'), ('cycle', 'int64'), ('cooldown_start', 'int64'), ('cooldown_end', 'int64'),
+               ('warmup_start', 'int64'), ('warmup_end', 'int64'), ('next_cycle_start', 'int64')] +
+              [(phase, 'float64') for phase in PHASES],
+}
+EXPORT_FORMATS = ['columnar', 'csv']
+_TYPE_CODES = {'int64': 'q', 'float64': 'd'}
+
+
+class ColumnarWriter(object):
+    """
+    Writes rows as a columnar export file, replacing any file there only once it is complete
+    """
+    def __init__(self, path: str, block_rows: int = DEFAULT_BLOCK_ROWS, metadata: dict = None):
+        """
+        :param path: file to write
+        :param block_rows: rows of a table per block
+        :param metadata: kept in the schema, e.g. where the data came from and the filters used
+        """
+        if sys.byteorder != 'little':
+            raise ValueError("Columnar exports can only be written on little-endian machines")
+        self._path = os.path.abspath(path)
+        self._block_rows = block_rows
+        self._table_numbers = {table: number for number, table in enumerate(TABLES)}
+        self._columns = {table: self._New_Columns(table) for table in TABLES}
+        self._rows = {table: 0 for table in TABLES}
+        schema = {'version': EXPORT_VERSION, 'null_int64': NULL_INT64,
+                  'tables': [{'name': table, 'columns': [list(column) for column in columns]}
+                             for table, columns in TABLES.items()],
+                  'metadata': metadata or {}}
+        schema_bytes = json.dumps(schema).encode('utf-8')
+        self._file = open(self._path + '.tmp', 'wb')
+        self._file.write(EXPORT_MAGIC + EXPORT_SCHEMA_LENGTH.pack(len(schema_bytes)) + schema_bytes)
+
+    @staticmethod
+    def _New_Columns(table: str) -> list:
+        return [array(_TYPE_CODES[column_type]) for name, column_type in TABLES[table]]
+
+    def Add_Row(self, table: str, row: tuple):
+        for column, value in zip(self._columns[table], row):
+            column.append(value)
+        self._rows[table] += 1
+        if self._rows[table] >= self._block_rows:
+            self._Write_Block(table)
+
+    def _Write_Block(self, table: str):
+        if not self._rows[table]:
+            return
+        self._file.write(EXPORT_BLOCK.pack(self._table_numbers[table], self._rows[table]))
+        for column in self._columns[table]:
+            column.tofile(self._file)
+        self._columns[table] = self._New_Columns(table)
+        self._rows[table] = 0
+
+    def Close(self):
+        for table in TABLES:
+            self._Write_Block(table)
+        self._file.close()
+        os.replace(self._path + '.tmp', self._path)
+
+    def Abort(self):
+        """
+        Give up on the export: close and delete the file being written, leaving any earlier export there
+        """
+        self._file.close()
+        try:
+            os.remove(self._path + '.tmp')
+        except FileNotFoundError:
+            pass
+
+
+class CsvWriter(object):
+    """
+    Writes rows as CSV files of at most block_rows rows each, <base>_<table>_<NNNN>.csv
+    """
+    def __init__(self, base: str, block_rows: int = DEFAULT_BLOCK_ROWS):
+        base = os.path.abspath(base)
+        self._base = base[:-len('.csv')] if base.endswith('.csv') else base
+        self._block_rows = block_rows
+        self._files = {}
+        self._writers = {}
+        self._rows = {table: 0 for table in TABLES}
+        self._chunks = {table: 0 for table in TABLES}
+        self._paths = []
+
+    def Add_Row(self, table: str, row: tuple):
+        if table not in self._writers or self._rows[table] >= self._block_rows:
+            self._Next_File(table)
+        self._writers[table].writerow(['' if _Is_Null(value) else value for value in row])
+        self._rows[table] += 1
+
+    def _Next_File(self, table: str):
+        if table in self._files:
+            self._files[table].close()
+        path = f"{self._base}_{table}_{self._chunks[table]:04d}.csv"
+        self._files[table] = open(path, 'w', newline='')
+        self._writers[table] = csv.writer(self._files[table])
+        self._writers[table].writerow([name for name, column_type in TABLES[table]])
+        self._paths.append(path)
+        self._chunks[table] += 1
+        self._rows[table] = 0
+
+    def Get_Paths(self) -> list:
+        return list(self._paths)
+
+    def Close(self):
+        for table_file in self._files.values():
+            table_file.close()
+
+    def Abort(self):
+        """
+        Give up on the export: close and delete the CSV files written so far
+        """
+        self.Close()
+        for path in self._paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self._paths = []
+
+
+def _Is_Null(value) -> bool:
+    return value == NULL_INT64 or (isinstance(value, float) and math.isnan(value))
+
+
+def Summary_Row(fridge_id: int, summary) -> tuple:
+    """
+    Row of the summaries table for a FridgeSummary (or the dict of an older history record)
+    """
+    percentiles = summary.get('percentiles') or {}
+    row = [fridge_id, summary['num_of_cycles'], float(summary['total_time'])]
+    for phase in PHASES:
+        row.extend([float(summary['totals'][phase]), float(summary['averages'][phase]),
+                    float(summary['percents'][phase])])
+        quantiles = percentiles.get(phase) or {}
+        row.extend(float('nan') if quantiles.get(name) is None else float(quantiles[name])
+                   for name in QUANTILE_NAMES)
+    return tuple(row)
+
+
+def Cycle_Row(cycle: CycleRecord) -> tuple:
+    wait = cycle.next_cycle_wait_time
+    return (cycle.fridge_id, cycle.cycle, cycle.cooldown_start, cycle.cooldown_end, cycle.warmup_start,
+            cycle.warmup_end, NULL_INT64 if cycle.next_cycle_start is None else cycle.next_cycle_start,
+            cycle.cooldown_time, cycle.running_time, cycle.warmup_time, float('nan') if wait is None else wait)
+
+
+def Cycle_Records(fridge_id: int, cycles: dict) -> dict:
+    """
+    {cycle: CycleRecord} in cycle order, from a history record's cycles (CycleRecords, or the
+    dicts of an older record)
+    """
+    records = {}
+    for cycle_id in sorted(cycles):
+        cycle = cycles[cycle_id]
+        if not isinstance(cycle, CycleRecord):
+            next_cycle_start = cycle.get('next_cycle_start')
+            cycle = CycleRecord(fridge_id, cycle_id, *Cycle_Values(cycle))
+            cycle.next_cycle_start = None if next_cycle_start is None else To_Epoch(next_cycle_start)
+        records[cycle_id] = cycle
+    return records
+
+
+def Window_Views(cycles_of, start: datetime = None, end: datetime = None) -> tuple:
+    """
+    Summary and cycles of each fridge within [start, end), worked out as FridgeData does for a
+    window, for cycles that do not come from a FridgeData (a history record, an archive)
+    :param cycles_of: function giving {cycle: CycleRecord or dict} of a fridge
+    :return:
+    (summary_of, cycles_of) functions for the window; a fridge with no cycle in it has no summary
+    and no cycles
+    """
+    bounds = (float('-inf') if start is None else To_Epoch(start), float('inf') if end is None else To_Epoch(end))
+    # The summary and then the cycles of the same fridge are asked for, index it once
+    last = {}
+
+    def Indexed(fridge_id: int) -> tuple:
+        if last.get('fridge_id') != fridge_id:
+            cycles = Cycle_Records(fridge_id, cycles_of(fridge_id) or {})
+            index = CycleWindowIndex()
+            index.Rebuild_From(0, list(cycles), cycles)
+            last.update(fridge_id=fridge_id, cycles=cycles, index=index)
+        return last['cycles'], last['index']
+
+    def Window_Summary(fridge_id: int):
+        cycles, index = Indexed(fridge_id)
+        window = index.Summary(*bounds)
+        if window is None:
+            return None
+        num_of_cycles, total_time, totals = window
+        return Make_Summary(fridge_id, num_of_cycles, float(total_time),
+                            {phase: float(seconds) for phase, seconds in totals.items()})
+
+    def Window_Cycles(fridge_id: int) -> dict:
+        cycles, index = Indexed(fridge_id)
+        return {cycle_id: cycles[cycle_id] for cycle_id in index.Window_Cycle_Ids(*bounds)}
+
+    return Window_Summary, Window_Cycles
+
+
+def Export(writer, fridge_ids, summary_of, cycles_of, selected_fridge_ids: list = None,
+           summaries: bool = True, cycles: bool = True) -> dict:
+    """
+    Stream the summary and cycles of each fridge to a ColumnarWriter or CsvWriter, one fridge at a time
+    :param writer:
+    :param fridge_ids: fridges to go through
+    :param summary_of: function giving the summary of a fridge (None to leave it out)
+    :param cycles_of: function giving {cycle: CycleRecord or dict} of a fridge
+    :param selected_fridge_ids: only these fridges, default all
+    :param summaries, cycles: which tables to fill
+    :return:
+    {table: rows written}
+    """
+    rows = {table: 0 for table in TABLES}
+    selected = None if selected_fridge_ids is None else set(selected_fridge_ids)
+    for fridge_id in fridge_ids:
+        if selected is not None and fridge_id not in selected:
+            continue
+        if summaries:
+            summary = summary_of(fridge_id)
+            if summary is not None:
+                writer.Add_Row('summaries', Summary_Row(fridge_id, summary))
+                rows['summaries'] += 1
+        if cycles:
+            for cycle in Cycle_Records(fridge_id, cycles_of(fridge_id) or {}).values():
+                writer.Add_Row('cycles', Cycle_Row(cycle))
+                rows['cycles'] += 1
+    return rows
+
+
+def Open_Writer(path: str, export_format: str = 'columnar', block_rows: int = DEFAULT_BLOCK_ROWS,
+                metadata: dict = None):
+    """
+    A ColumnarWriter, or for 'csv' a CsvWriter (which takes path as the base of its file names)
+    """
+    if export_format == 'columnar':
+        return ColumnarWriter(path, block_rows, metadata)
+    if export_format == 'csv':
+        return CsvWriter(path, block_rows)
+    raise ValueError(f"Unknown export format {export_format}, expected one of {', '.join(EXPORT_FORMATS)}")
+
+
+def Read_Schema(path: str) -> dict:
+    """
+    Schema of a columnar export file
+    """
+    with open(path, 'rb') as export_file:
+        return _Read_Header(export_file, path)
+
+
+def _Read_Header(export_file, path: str) -> dict:
+    if export_file.read(len(EXPORT_MAGIC)) != EXPORT_MAGIC:
+        raise ValueError(f"{path} is not a columnar export")
+    length, = EXPORT_SCHEMA_LENGTH.unpack(export_file.read(EXPORT_SCHEMA_LENGTH.size))
+    return json.loads(export_file.read(length).decode('utf-8'))
+
+
+def Read_Columnar(path: str):
+    """
+    Generator over the blocks of a columnar export file, one at a time
+    :return:
+    yields (table name, {column name: array of the block's values})
+    """
+    with open(path, 'rb') as export_file:
+        schema = _Read_Header(export_file, path)
+        while True:
+            header = export_file.read(EXPORT_BLOCK.size)
+            if len(header) < EXPORT_BLOCK.size:
+                return
+            table_number, rows = EXPORT_BLOCK.unpack(header)
+            table = schema['tables'][table_number]
+            block = {}
+            for name, column_type in table['columns']:
+                column = array(_TYPE_CODES[column_type])
+                column.fromfile(export_file, rows)
+                if sys.byteorder != 'little':
+                    column.byteswap()
+                block[name] = column
+            yield table['name'], block
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description="""
+        Exports the summaries and cycles of a history record (of the journal written by TopFridge)
+        or of a binary cycle archive, for offline analytics.
+           """,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument("input_file",
+                        help="Name of the journal file containing history, or of a cycle archive.")
+    parser.add_argument("output_file",
+                        help="File to write; for csv the base of the file names, <output>_<table>_<NNNN>.csv.")
+    parser.add_argument('--format', choices=EXPORT_FORMATS, default='columnar', help= \
+        """columnar: typed column blocks behind a schema header; csv: CSV files of --block_rows rows each.""")
+    parser.add_argument('--fridges', default=None, help= \
+        """Only export these fridges, comma separated.""")
+    parser.add_argument('--since', default=None, help= \
+        """Only export from this date/time on (YYYY-MM-DD[ HH:MM:SS]), the summaries clip cycles straddling it.""")
+    parser.add_argument('--until', default=None, help= \
+        """Only export before this date/time (YYYY-MM-DD[ HH:MM:SS]).""")
+    parser.add_argument('--record', type=int, default=None, help= \
+        """Export this record number of the journal, default the latest.""")
+    parser.add_argument('--at', default=None, help= \
+        """Export the record nearest to this time (e.g. "2020-11-23 16:14:00").""")
+    parser.add_argument('--block_rows', type=int, default=DEFAULT_BLOCK_ROWS, help= \
+        """Rows per block (or per CSV file).""")
+    parser.add_argument('--no_summary_data', action='store_true',
+                        default=False, help="""Leave out the summaries""")
+    parser.add_argument('--no_cycle_data', action='store_true',
+                        default=False, help="""Leave out the cycles""")
+    args = parser.parse_args()
+
+    input_file = os.path.abspath(args.input_file)
+    try:
+        selected_fridge_ids = None if args.fridges is None else \
+            [int(fridge_id) for fridge_id in args.fridges.split(',')]
+        window_start = None if args.since is None else datetime.fromisoformat(args.since)
+        window_end = None if args.until is None else datetime.fromisoformat(args.until)
+        at = None if args.at is None else datetime.fromisoformat(args.at)
+    except ValueError as e:
+        print(f"Invalid --fridges/--since/--until/--at: {e}")
+        sys.exit(1)
+    if not os.path.isfile(input_file):
+        print(f"Input file: {input_file} not found.")
+        sys.exit(1)
+
+    archive = None
+    if Is_Archive(input_file):
+        # Read in place, only the pages of the fridges exported are touched
+        archive = CycleArchive(input_file)
+        fridge_ids = archive.List_Fridges()
+        summary_of = archive.Get_Fridge_Summary_Data
+        cycles_of = archive.Get_Fridge_Cycle_Data
+        timestamp = archive.Get_Timestamp()
+    elif Is_Journal(input_file):
+        journal = FridgeJournal(input_file)
+        history_index = journal.Index()
+        if not history_index:
+            print(f"{input_file} has no records.")
+            sys.exit(1)
+        if at is not None:
+            record_position = journal.Find_Nearest(at)
+        elif args.record is not None:
+            if not 0 < args.record <= len(history_index):
+                print(f"Record {args.record} not found, there are {len(history_index)} records.")
+                sys.exit(1)
+            record_position = args.record - 1
+        else:
+            record_position = len(history_index) - 1
+        # Only the record's checkpoint and the deltas up to it are read
+        state = journal.Read_State(history_index[record_position][1])
+        fridge_ids = sorted(state['fridge_and_cycle_data'])
+        summary_of = state['fridge_summary_data'].get
+        cycles_of = state['fridge_and_cycle_data'].get
+        timestamp = Timestamp_From_Key(history_index[record_position][0])
+    else:
+        print(f"Input file: {input_file} is neither a history journal nor a cycle archive.")
+        sys.exit(1)
+
+    if window_start is not None or window_end is not None:
+        summary_of, cycles_of = Window_Views(cycles_of, window_start, window_end)
+    writer = Open_Writer(args.output_file, args.format, args.block_rows,
+                         {'source': input_file, 'timestamp': str(timestamp), 'fridges': selected_fridge_ids,
+                          'since': args.since, 'until': args.until})
+    try:
+        rows = Export(writer, fridge_ids, summary_of, cycles_of, selected_fridge_ids,
+                      summaries=not args.no_summary_data, cycles=not args.no_cycle_data)
+        writer.Close()
+    except BaseException:
+        writer.Abort()
+        raise
+    finally:
+        if archive is not None:
+            archive.Close()
+    written = ', '.join(writer.Get_Paths()) if args.format == 'csv' else os.path.abspath(args.output_file)
+    print(f"Exported {rows['summaries']:,} summaries and {rows['cycles']:,} cycles of {timestamp} to {written}")
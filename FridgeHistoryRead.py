@@ -10,32 +10,79 @@ Description:
 """
 import os
 import argparse
-from FridgeData import FridgeData, FrigeOutput, FormatSummaryData, FormatCycleData, format_time_period
+from datetime import datetime
+from FridgeData import FridgeData, FrigeOutput, Summary_Lines, Cycle_Lines, Top_Lines, format_time_period
+from FridgeJournal import FridgeJournal, Is_Journal, Timestamp_From_Key
+from FridgeArchive import CycleArchive, Is_Archive, Write_Archive
+from FridgeViews import PHASE_NAMES, Last_Cycles, Top_Cycles_Of
 import sys
-import pickle
+
+
+def Write_Fridges(writer, fridge_ids, summary_of, cycles_of, selected_fridge_id: int = -1, selected_cycle: int = -1,
+                  show_summary: bool = True, show_cycles: bool = True):
+    """
+    Write the summary and cycles of each fridge, as TopFridge shows them
+    :param writer: anything with a write method
+    :param fridge_ids: fridges to go through
+    :param summary_of: function giving the summary of a fridge
+    :param cycles_of: function giving {cycle: data} of a fridge (only the selected cycle is shown, if any)
+    """
+    separator = ""
+    for fridge_id in fridge_ids:
+        if selected_fridge_id >= 0 and fridge_id != selected_fridge_id:
+            continue
+        summary_data = summary_of(fridge_id)
+        writer.write(separator)
+        if show_summary:
+            writer.write(f"Fridge {fridge_id} Summary:\n")
+            writer.writelines(Summary_Lines(summary_data))
+
+        if show_cycles:
+            writer.write(f"Fridge {fridge_id} Cycle Data:\n")
+            writer.writelines(Cycle_Lines(cycles_of(fridge_id), selected_cycle))
+
+        writer.write(f"Fridge {fridge_id}: Cycle Count: {summary_data['num_of_cycles']}  " +
+                     f"Total Time: {format_time_period(summary_data['total_time'])}  " +
+                     f"Updated: {summary_data['update_timestamp']}\n")
+        separator = "\n"
 
 
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(
         description="""
-        Implements a read of data stored in pickle format from FridgeTop.
+        Implements a read of the history journal written by FridgeTop,
+        or of a binary cycle archive (see FridgeArchive.py).
            """,
         formatter_class=argparse.RawTextHelpFormatter)
 
     parser.add_argument("input_file",
-                        help="Name of the picke file containing history.")
+                        help="Name of the journal file containing history, or of a cycle archive.")
 
     parser.add_argument('--fridge', type=int, default=-1, help= \
         """Select data from specific type=int, Fridge for display.""")
     parser.add_argument('--cycle', type=int, default=-1, help= \
         """Select data from specific cycle for display.""")
 
+    parser.add_argument('--last', type=int, default=None, help= \
+        """Only list the last so many cycles of each fridge.""")
+    parser.add_argument('--top', choices=sorted(PHASE_NAMES), default=None, help= \
+        """First show the cycles that spent longest in this phase, over all fridges (or of --fridge).""")
+    parser.add_argument('--top_n', type=int, default=10, help= \
+        """Number of cycles --top shows.""")
+
     parser.add_argument('--no_summary_data', action='store_true',
                         default=False, help="""Suppresses the output for summary data""")
     parser.add_argument('--no_cycle_data', action='store_true',
                         default=False, help="""Suppresses the output for cycle data""")
 
+    parser.add_argument('--record', type=int, default=None, help= \
+        """Display this record number without prompting.""")
+    parser.add_argument('--at', default=None, help= \
+        """Display the record nearest to this time (e.g. "2020-11-23 16:14:00") without prompting.""")
+    parser.add_argument('--write_archive', default=None, help= \
+        """Write the cycles of the selected record to this binary cycle archive instead of displaying them.""")
+
     (args, unknown) = parser.parse_known_args()
     input_file = os.path.abspath(args.input_file)
     input_dir = os.path.dirname(input_file)
@@ -44,36 +91,79 @@ if __name__ == '__main__':
     selected_fridge_id = args.fridge
     show_summary = not (args.no_summary_data)
     show_cycles = not (args.no_cycle_data)
+    top = None if args.top is None else PHASE_NAMES[args.top]
+
+    def Write_Top(fridge_ids, cycles_of):
+        if top is None:
+            return
+        if selected_fridge_id >= 0:
+            fridge_ids = [fridge_id for fridge_id in fridge_ids if fridge_id == selected_fridge_id]
+        sys.stdout.writelines(Top_Lines(Top_Cycles_Of(fridge_ids, cycles_of, top, args.top_n), top,
+                                        selected_fridge_id))
+        sys.stdout.write("\n")
 
     if not os.path.isfile(input_file):
         print(f"Input file: {input_file} not found.")
+        sys.exit()
+    if Is_Archive(input_file):
+        # Read in place, only the pages of the fridges shown are touched
+        archive = CycleArchive(input_file)
+
+        def Archive_Cycles(fridge_id):
+            if selected_cycle >= 0:
+                cycle = archive.Get_Cycle(fridge_id, selected_cycle)
+                return {} if cycle is None else {selected_cycle: cycle}
+            if args.last is not None:
+                return archive.Get_Fridge_Cycle_Data(fridge_id, offset=-args.last)
+            return archive.Get_Fridge_Cycle_Data(fridge_id)
 
-    with open(input_file,"rb") as pickle_file:
-        history_data = pickle.load(pickle_file)
-    record_times = list(history_data.keys())
-    for number, time in enumerate(record_times):
-        print(f"  Record {number+1}: Date {str(time)}")
-    record_number = input("\nEnter valid record number to display information (or <CR> to end):")
-    if not record_number.isdigit() or int(record_number) > len(record_times):
+        Write_Top(archive.List_Fridges(), archive.Get_Fridge_Cycle_Data)
+        Write_Fridges(sys.stdout, archive.List_Fridges(), archive.Get_Fridge_Summary_Data, Archive_Cycles,
+                      selected_fridge_id, selected_cycle, show_summary, show_cycles)
+        archive.Close()
+        sys.exit()
+    if not Is_Journal(input_file):
+        print(f"Input file: {input_file} is not a history journal. " +
+              f"Convert an old pickle history with: FridgeJournal.py import {args.input_file} <journal_file>")
         sys.exit()
 
-    recovered_data = history_data[record_times[int(record_number)]]
-    output = ""
-    for fridge_id in recovered_data['fridge_summary_data'].keys():
-        if selected_fridge_id >= 0 and fridge_id != selected_fridge_id:
-            continue
-        summary_data = recovered_data['fridge_summary_data'][fridge_id]
-        cycle_data = recovered_data['fridge_and_cycle_data'][fridge_id]
-        if show_summary:
-            output += f"Fridge {fridge_id} Summary:\n"
-            output += FormatSummaryData(summary_data)
+    journal = FridgeJournal(input_file)
+    history_index = journal.Index()
+    if args.at is not None:
+        try:
+            record_position = journal.Find_Nearest(datetime.fromisoformat(args.at))
+        except ValueError:
+            print(f"Invalid time: {args.at}")
+            sys.exit()
+        if record_position is None:
+            sys.exit()
+    elif args.record is not None:
+        if not 0 < args.record <= len(history_index):
+            print(f"Record {args.record} not found, there are {len(history_index)} records.")
+            sys.exit()
+        record_position = args.record - 1
+    else:
+        for number, (timestamp_key, offset, length) in enumerate(history_index):
+            print(f"  Record {number+1}: Date {Timestamp_From_Key(timestamp_key)}")
+        record_number = input("\nEnter valid record number to display information (or <CR> to end):")
+        if not record_number.isdigit() or not 0 < int(record_number) <= len(history_index):
+            sys.exit()
+        record_position = int(record_number) - 1
 
-        if show_cycles:
-            output += f"Fridge {fridge_id} Cycle Data:\n"
-            output += FormatCycleData(cycle_data, cycle=selected_cycle)
+    recovered_data = journal.Read_State(history_index[record_position][1])
+    if args.write_archive is not None:
+        count = Write_Archive(args.write_archive, recovered_data['fridge_and_cycle_data'],
+                              Timestamp_From_Key(history_index[record_position][0]))
+        print(f"Wrote {count} cycles to {os.path.abspath(args.write_archive)}")
+        sys.exit()
+    fridge_and_cycle_data = recovered_data['fridge_and_cycle_data']
 
-        output += f"Fridge {fridge_id}: Cycle Count: {summary_data['num_of_cycles']}  " + \
-                  f"Total Time: {format_time_period(summary_data['total_time'])}  " + \
-                  f"Updated: {summary_data['update_timestamp']}\n\n"
-    print(output.strip())
+    def Record_Cycles(fridge_id):
+        if args.last is not None and selected_cycle < 0:
+            return Last_Cycles(fridge_and_cycle_data[fridge_id], args.last)
+        return fridge_and_cycle_data[fridge_id]
 
+    Write_Top(recovered_data['fridge_summary_data'].keys(), fridge_and_cycle_data.get)
+    Write_Fridges(sys.stdout, recovered_data['fridge_summary_data'].keys(),
+                  lambda fridge_id: recovered_data['fridge_summary_data'][fridge_id], Record_Cycles,
+                  selected_fridge_id, selected_cycle, show_summary, show_cycles)
@@ -0,0 +1,684 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 11/27/2020
+Project: Rigetti
+File: FridgeJournal.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Append-only journal of FridgeData update records.
+
+    The file starts with an 8 byte magic string, followed by framed records:
+
+        'FRec' | payload length (uint32) | crc32 of payload (uint32) | payload (pickle)
+
+    A record is only appended, never rewritten, so writing one costs the size of that
+    record.  If the process dies part way through a write, the recovery scan finds the
+    last complete record with a good checksum and ignores (and on the next append,
+    truncates) whatever follows it.
+
+    Records are either full checkpoints of the fridge data, or deltas holding only the
+    cycles and summaries an update changed, plus the offset of the checkpoint they build
+    on.  Any record can be rebuilt from its checkpoint and the deltas in between, so the
+    cost is bounded by how often checkpoints are written.  Records without a 'kind'
+    (imported from the old pickle history) are checkpoints.
+
+    Alongside the journal a sidecar index (<journal>.idx) holds one fixed size entry per
+    record: timestamp (microseconds since the epoch), offset and length.  Listing records
+    or finding one by time only needs the index; only the selected record (and its
+    checkpoint chain) is read from the journal.  The index is rebuildable, so it is
+    checked against the journal when opened and re-indexed from the last good entry.
+
+    Only one FridgeJournal may write a journal at a time: the first append (or Lock) takes an
+    exclusive lock on <journal>.lock, holding the writer's pid, until Unlock or the process
+    exits, and refuses the journal if another writer holds it.  Reading needs no lock.
+
+    Appending writes and fsyncs each record before returning.  A JournalWriter instead
+    queues records (already serialized, with their offsets reserved) and writes them from
+    a background thread in batches, fsyncing every so many records or seconds.
+"""
+import os
+import sys
+import struct
+import pickle
+import zlib
+import argparse
+import bisect
+import threading
+import time
+from datetime import datetime, timedelta
+
+try:
+    import fcntl
+except ImportError:
+    # No advisory locks (e.g. on Windows), nothing stops two writers
+    fcntl = None
+
+JOURNAL_MAGIC = b'FRIDGEJ1'
+RECORD_MARKER = b'FRec'
+RECORD_HEADER = struct.Struct('<4sII')
+
+INDEX_MAGIC = b'FRIDGEI1'
+INDEX_ENTRY = struct.Struct('<qQQ')
+EPOCH = datetime(1970, 1, 1)
+
+HISTORY_CHECKPOINT = 'checkpoint'
+HISTORY_DELTA = 'delta'
+
+
+class FridgeJournal(object):
+    """
+    Reads and appends framed, check-summed history records
+    """
+    def __init__(self, path, report=print):
+        """
+        :param path: journal file
+        :param report: function messages (e.g. about a torn tail dropped) are passed to
+        """
+        self._path = os.path.abspath(path)
+        self._report = report
+        self._index_path = self._path + '.idx'
+        self._lock_path = self._path + '.lock'
+        # Open lock file while this journal holds the write lock
+        self._lock_file = None
+        self._valid_end = None
+        # List of (timestamp key, offset, length), loaded on first use
+        self._index = None
+
+    def Get_Path(self) -> str:
+        return self._path
+
+    def Get_Index_Path(self) -> str:
+        return self._index_path
+
+    def Get_Lock_Path(self) -> str:
+        return self._lock_path
+
+    def Lock(self):
+        """
+        Claim the journal for writing, until Unlock or the process exits. Appending claims it
+        if not already held; FridgeData claims it when made, to refuse a journal in use up front.
+        Raises ValueError if another writer (in this or another process) holds it.
+        """
+        if self._lock_file is not None or fcntl is None:
+            return
+        lock_file = open(self._lock_path, 'a+')
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.seek(0)
+            holder = lock_file.read().strip()
+            lock_file.close()
+            raise ValueError(f"History journal {self._path} is already being written" +
+                             (f" by process {holder}" if holder else ""))
+        lock_file.truncate(0)
+        lock_file.write(str(os.getpid()))
+        lock_file.flush()
+        self._lock_file = lock_file
+
+    def Unlock(self):
+        """
+        Let another writer have the journal
+        """
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+    def Append(self, record: dict) -> int:
+        """
+        Append a record to the end of the journal
+        :param record: dict to store
+        :return:
+        (offset, length) of the record written
+        """
+        frame = Encode_Record(record)
+        offset = self._Reserve(len(frame))
+        try:
+            self._Write_Frames([(Timestamp_Key(record['timestamp']), offset, frame)])
+        except Exception:
+            # Find the end again (dropping anything half written) on the next append
+            self._valid_end = None
+            raise
+        return offset, len(frame)
+
+    def _Reserve(self, length: int) -> int:
+        """
+        Claim the next length bytes of the journal for a frame
+        :return:
+        Offset of the frame
+        """
+        if self._valid_end is None:
+            self.Lock()
+            self._Recover()
+        offset = self._valid_end
+        self._valid_end += length
+        return offset
+
+    def _Write_Frames(self, entries: list):
+        """
+        Write frames reserved one after the other, fsync them, then index them
+        :param entries: list of (timestamp key, offset, frame), in offset order
+        """
+        with open(self._path, 'r+b') as journal_file:
+            journal_file.seek(entries[0][1])
+            journal_file.write(b''.join(frame for key, offset, frame in entries))
+            journal_file.flush()
+            os.fsync(journal_file.fileno())
+
+        index_entries = [(key, offset, len(frame)) for key, offset, frame in entries]
+        with open(self._index_path, 'ab') as index_file:
+            index_file.write(b''.join(INDEX_ENTRY.pack(*entry) for entry in index_entries))
+        self._index.extend(index_entries)
+
+    def Index(self) -> list:
+        """
+        The record index, in journal order
+        :return:
+        List of (timestamp key, offset, length); see Timestamp_From_Key
+        """
+        if self._index is None:
+            self._Load_Index()
+        return self._index
+
+    def Find_Nearest(self, when: datetime) -> int:
+        """
+        Binary search the index for the record closest in time
+        :param when:
+        :return:
+        Position of the record in the index, None if the journal is empty
+        """
+        index = self.Index()
+        if not index:
+            return None
+        key = Timestamp_Key(when)
+        i = bisect.bisect_left(index, (key,))
+        if i == len(index):
+            return i - 1
+        if i > 0 and key - index[i - 1][0] <= index[i][0] - key:
+            return i - 1
+        return i
+
+    def Scan(self) -> list:
+        """
+        Walk the record headers, checking every payload.
+        :return:
+        List of (offset, length) of each good record, stopping at the first torn or corrupt one
+        """
+        return [(offset, length) for offset, length, payload in self._Frames()]
+
+    def Records(self):
+        """
+        Generator over (offset, record) for every good record in the journal, as stored
+        (i.e. deltas are not expanded)
+        """
+        for offset, length, payload in self._Frames():
+            yield offset, pickle.loads(payload)
+
+    def Read_At(self, offset: int) -> dict:
+        """
+        Read the record whose frame starts at offset
+        :param offset:
+        :return:
+        The record
+        """
+        with open(self._path, 'rb') as journal_file:
+            journal_file.seek(offset)
+            marker, length, crc = RECORD_HEADER.unpack(journal_file.read(RECORD_HEADER.size))
+            payload = journal_file.read(length)
+        if marker != RECORD_MARKER or len(payload) != length or zlib.crc32(payload) != crc:
+            raise ValueError(f"Corrupt journal record at offset {offset} in {self._path}")
+        return pickle.loads(payload)
+
+    def Read_State(self, offset: int) -> dict:
+        """
+        Rebuild the full fridge data as of the record at offset, from its checkpoint and the
+        deltas between the two.
+        :param offset:
+        :return:
+        dict with 'timestamp', 'fridge_summary_data' and 'fridge_and_cycle_data' (and 'log_checkpoints' if kept)
+        """
+        record = self.Read_At(offset)
+        if record.get('kind', HISTORY_CHECKPOINT) == HISTORY_CHECKPOINT:
+            return record
+
+        state = None
+        for frame_offset, length, payload in self._Frames(start=record['checkpoint_offset']):
+            if frame_offset > offset:
+                break
+            if state is None:
+                state = pickle.loads(payload)
+            else:
+                Apply_Delta(state, pickle.loads(payload))
+        return state
+
+    def _Frames(self, start=None):
+        """
+        Generator over (offset, length, payload) of good frames, from start (or the top of the file)
+        """
+        if not os.path.isfile(self._path):
+            return
+        with open(self._path, 'rb') as journal_file:
+            if journal_file.read(len(JOURNAL_MAGIC)) != JOURNAL_MAGIC:
+                raise ValueError(f"{self._path} is not a fridge history journal")
+            offset = len(JOURNAL_MAGIC)
+            if start is not None:
+                offset = start
+                journal_file.seek(offset)
+            while True:
+                header = journal_file.read(RECORD_HEADER.size)
+                if len(header) < RECORD_HEADER.size:
+                    break
+                marker, length, crc = RECORD_HEADER.unpack(header)
+                if marker != RECORD_MARKER:
+                    break
+                payload = journal_file.read(length)
+                if len(payload) != length or zlib.crc32(payload) != crc:
+                    break
+                yield offset, RECORD_HEADER.size + length, payload
+                offset += RECORD_HEADER.size + length
+
+    def _Recover(self):
+        """
+        Find the end of the last good record, creating the journal if needed and dropping any torn tail.
+        Only the records past the end of the index need checking.
+        """
+        if not os.path.isfile(self._path) or os.path.getsize(self._path) == 0:
+            with open(self._path, 'wb') as journal_file:
+                journal_file.write(JOURNAL_MAGIC)
+
+        index = self.Index()
+        valid_end = index[-1][1] + index[-1][2] if index else len(JOURNAL_MAGIC)
+        if valid_end < os.path.getsize(self._path):
+            self._report(f"Dropping torn record(s) after offset {valid_end} in {self._path}")
+            with open(self._path, 'r+b') as journal_file:
+                journal_file.truncate(valid_end)
+        self._valid_end = valid_end
+
+    def _Load_Index(self):
+        """
+        Read the sidecar index, check it still matches the journal, and index any records written
+        after it (or all of them, if it is missing or out of date)
+        """
+        index = []
+        torn = False
+        if os.path.isfile(self._index_path):
+            with open(self._index_path, 'rb') as index_file:
+                data = index_file.read()
+            if data[:len(INDEX_MAGIC)] == INDEX_MAGIC:
+                data = data[len(INDEX_MAGIC):]
+                # A part entry, from a crash while one was appended, would put every later entry out of step
+                torn = len(data) % INDEX_ENTRY.size != 0
+                index = list(INDEX_ENTRY.iter_unpack(data[:len(data) - len(data) % INDEX_ENTRY.size]))
+
+        if index and not self._Frame_Matches(index[-1][1], index[-1][2]):
+            # Journal was rewritten or truncated underneath the index
+            index = []
+        rebuild = not index or torn
+
+        start = index[-1][1] + index[-1][2] if index else None
+        new_entries = [(Timestamp_Key(pickle.loads(payload)['timestamp']), offset, length)
+                       for offset, length, payload in self._Frames(start=start)]
+        index.extend(new_entries)
+
+        if rebuild:
+            with open(self._index_path, 'wb') as index_file:
+                index_file.write(INDEX_MAGIC)
+                for entry in index:
+                    index_file.write(INDEX_ENTRY.pack(*entry))
+        elif new_entries:
+            with open(self._index_path, 'ab') as index_file:
+                for entry in new_entries:
+                    index_file.write(INDEX_ENTRY.pack(*entry))
+        self._index = index
+
+    def _Frame_Matches(self, offset: int, length: int) -> bool:
+        """
+        Check there is a frame header of the given length at offset
+        """
+        if not os.path.isfile(self._path) or os.path.getsize(self._path) < offset + length:
+            return False
+        with open(self._path, 'rb') as journal_file:
+            journal_file.seek(offset)
+            header = journal_file.read(RECORD_HEADER.size)
+        if len(header) < RECORD_HEADER.size:
+            return False
+        marker, payload_length, crc = RECORD_HEADER.unpack(header)
+        return marker == RECORD_MARKER and RECORD_HEADER.size + payload_length == length
+
+
+class JournalWriter(object):
+    """
+    Write-behind appender for a FridgeJournal.
+
+    Append serializes the record (so later changes to the objects in it do not matter) and
+    reserves its place at the end of the journal, so its offset is known at once, then
+    queues it.  A background thread writes what is queued in one go, and fsyncs it, once
+    sync_records records are waiting or the oldest has waited sync_interval seconds.
+    Records only appear in the journal's Index() once they are on disk.
+
+    If a write fails, that batch and anything queued behind it are dropped and Failures()
+    goes up.  The next Append then writes the full checkpoint its caller gives it, rather than
+    a delta that may build on a record lost with them.
+    Nothing else may append to the journal while a JournalWriter is open.
+    """
+    def __init__(self, journal: FridgeJournal, sync_interval: float = 1.0, sync_records: int = 50, report=print):
+        """
+        :param journal: journal to append to
+        :param sync_interval: most seconds a record waits to be written and fsynced
+        :param sync_records: write and fsync once this many records are waiting
+        :param report: function messages about failed writes are passed to (from the writer thread)
+        """
+        self._journal = journal
+        self._report = report
+        self._sync_interval = sync_interval
+        self._sync_records = sync_records
+        self._condition = threading.Condition()
+        # [(timestamp key, offset, frame)] queued, in offset order
+        self._pending = []
+        self._oldest_pending = None
+        self._writing = False
+        self._flushing = 0
+        self._closed = False
+        self._failures = 0
+        # Failures already seen by an Append
+        self._failures_seen = 0
+        self._thread = threading.Thread(target=self._Write_Behind, name='JournalWriter', daemon=True)
+        self._thread.start()
+
+    def Append(self, record: dict, checkpoint=None) -> tuple:
+        """
+        Queue a record to be appended
+        :param record: dict to store
+        :param checkpoint: function giving a full checkpoint record, queued instead of record if a write
+            failed since the last Append (checked under the same lock the writer thread drops records under)
+        :return:
+        (offset, length) the record will have once written, and True if it is the checkpoint instead
+        """
+        frame = Encode_Record(record)
+        key = Timestamp_Key(record['timestamp'])
+        replaced = False
+        with self._condition:
+            if self._closed:
+                raise ValueError(f"Journal writer for {self._journal.Get_Path()} is closed")
+            if self._failures != self._failures_seen:
+                self._failures_seen = self._failures
+                if checkpoint is not None:
+                    record = checkpoint()
+                    frame = Encode_Record(record)
+                    key = Timestamp_Key(record['timestamp'])
+                    replaced = True
+            offset = self._journal._Reserve(len(frame))
+            if not self._pending:
+                self._oldest_pending = time.monotonic()
+            self._pending.append((key, offset, frame))
+            if len(self._pending) >= self._sync_records:
+                self._condition.notify_all()
+        return offset, len(frame), replaced
+
+    def Flush(self):
+        """
+        Write out everything queued so far, waiting until it is on disk
+        """
+        with self._condition:
+            self._flushing += 1
+            self._condition.notify_all()
+            while self._pending or self._writing:
+                self._condition.wait()
+            self._flushing -= 1
+
+    def Close(self):
+        """
+        Write out everything queued and stop the background thread. Closing again does nothing.
+        """
+        with self._condition:
+            if self._closed:
+                return
+            self._closed = True
+            self._condition.notify_all()
+        self._thread.join()
+
+    def Failures(self) -> int:
+        """
+        Number of batches that could not be written
+        """
+        return self._failures
+
+    def Get_Pending(self) -> int:
+        """
+        Number of records queued and not yet written
+        """
+        return len(self._pending)
+
+    def _Due(self) -> bool:
+        return bool(self._pending) and (self._closed or self._flushing > 0 or
+                                        len(self._pending) >= self._sync_records or
+                                        time.monotonic() - self._oldest_pending >= self._sync_interval)
+
+    def _Write_Behind(self):
+        while True:
+            with self._condition:
+                while not self._Due():
+                    if self._closed and not self._pending:
+                        return
+                    timeout = None
+                    if self._pending:
+                        timeout = max(0.0, self._oldest_pending + self._sync_interval - time.monotonic())
+                    self._condition.wait(timeout)
+                batch = self._pending
+                self._pending = []
+                self._writing = True
+
+            failed = False
+            try:
+                self._journal._Write_Frames(batch)
+            except Exception as e:
+                self._report(f"Failed to update history file {self._journal.Get_Path()}: {str(e)}")
+                failed = True
+
+            with self._condition:
+                if failed:
+                    # Records queued since were laid out after the failed ones, drop them too
+                    # and find the end of the journal again on the next append
+                    if self._pending:
+                        self._report(f"Dropping {len(self._pending)} more queued history record(s)")
+                    self._pending = []
+                    self._journal._valid_end = None
+                    self._failures += 1
+                self._writing = False
+                self._condition.notify_all()
+
+
+def Encode_Record(record: dict) -> bytes:
+    """
+    Frame of a record: header, then the pickled record
+    """
+    payload = pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+    return RECORD_HEADER.pack(RECORD_MARKER, len(payload), zlib.crc32(payload)) + payload
+
+
+def Timestamp_Key(timestamp) -> int:
+    """
+    Index key for a record timestamp (datetime or its str()): microseconds since the epoch
+    """
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    return (timestamp - EPOCH) // timedelta(microseconds=1)
+
+
+def Timestamp_From_Key(key: int) -> datetime:
+    return EPOCH + timedelta(microseconds=key)
+
+
+def Apply_Delta(state: dict, delta: dict):
+    """
+    Fold a delta record into a full state, in place
+    """
+    state['timestamp'] = delta['timestamp']
+    for fridge_id, summary in delta['fridge_summary_data'].items():
+        state['fridge_summary_data'][fridge_id] = summary
+    for fridge_id, cycles in delta['fridge_and_cycle_data'].items():
+        if fridge_id not in state['fridge_and_cycle_data']:
+            state['fridge_and_cycle_data'][fridge_id] = {}
+        state['fridge_and_cycle_data'][fridge_id].update(cycles)
+    if 'log_checkpoints' in delta:
+        state['log_checkpoints'] = delta['log_checkpoints']
+
+
+def Compact(path: str, checkpoint_records: int = 50, keep_records: int = None, keep_days: float = None) -> tuple:
+    """
+    Rewrite a journal, dropping records outside the retention policy and folding the
+    deltas before the oldest kept record into a checkpoint. The kept records are written
+    back as deltas with a fresh checkpoint every checkpoint_records records.
+    The journal must not be written to while this runs; it is locked as a writer would.
+    :param path: journal to compact
+    :param checkpoint_records: records between checkpoints in the rewritten journal
+    :param keep_records: keep at most this many of the newest records
+    :param keep_days: keep only records newer than this many days
+    :return:
+    (records read, records written)
+    """
+    journal = FridgeJournal(path)
+    journal.Lock()
+    record_count = len(journal.Index())
+    first_kept = 0
+    if keep_records is not None:
+        first_kept = max(first_kept, record_count - keep_records)
+    cutoff = None
+    if keep_days is not None:
+        cutoff = datetime.now() - timedelta(days=keep_days)
+
+    compacted = FridgeJournal(path + '.compact')
+    for leftover in [compacted.Get_Path(), compacted.Get_Index_Path()]:
+        if os.path.isfile(leftover):
+            os.remove(leftover)
+
+    state = None
+    written = 0
+    since_checkpoint = 0
+    checkpoint_offset = None
+    for number, (offset, record) in enumerate(journal.Records()):
+        if record.get('kind', HISTORY_CHECKPOINT) == HISTORY_CHECKPOINT:
+            state = record
+            delta = None
+        else:
+            Apply_Delta(state, record)
+            delta = record
+        if number < first_kept or (cutoff is not None and datetime.fromisoformat(record['timestamp']) < cutoff):
+            continue
+
+        if delta is None or checkpoint_offset is None or since_checkpoint >= checkpoint_records:
+            checkpoint = {'timestamp': state['timestamp'],
+                          'kind': HISTORY_CHECKPOINT,
+                          'fridge_summary_data': state['fridge_summary_data'],
+                          'fridge_and_cycle_data': state['fridge_and_cycle_data']}
+            if 'log_checkpoints' in state:
+                checkpoint['log_checkpoints'] = state['log_checkpoints']
+            checkpoint_offset, length = compacted.Append(checkpoint)
+            since_checkpoint = 0
+        else:
+            delta['checkpoint_offset'] = checkpoint_offset
+            compacted.Append(delta)
+            since_checkpoint += 1
+        written += 1
+
+    if written == 0:
+        # Nothing retained, leave an empty journal
+        compacted._Recover()
+    os.replace(compacted.Get_Path(), journal.Get_Path())
+    os.replace(compacted.Get_Index_Path(), journal.Get_Index_Path())
+    compacted.Unlock()
+    if os.path.isfile(compacted.Get_Lock_Path()):
+        os.remove(compacted.Get_Lock_Path())
+    journal.Unlock()
+    return record_count, written
+
+
+def Is_Journal(path: str) -> bool:
+    """
+    Check whether a file is a history journal (as opposed to an old whole-file pickle)
+    """
+    with open(path, 'rb') as history_file:
+        return history_file.read(len(JOURNAL_MAGIC)) == JOURNAL_MAGIC
+
+
+def Import_Pickle_History(pickle_path: str, journal_path: str) -> int:
+    """
+    One shot conversion of an old FridgeData.pickle history into a journal.
+    :param pickle_path: whole-file pickle of {timestamp: {'fridge_summary_data':, 'fridge_and_cycle_data':}}
+    :param journal_path: journal to append the records to
+    :return:
+    Number of records imported
+    """
+    with open(pickle_path, 'rb') as pickle_file:
+        history_data = pickle.load(pickle_file)
+
+    journal = FridgeJournal(journal_path)
+    for timestamp, entry in history_data.items():
+        if not isinstance(entry, dict):
+            # Early histories pickled the whole FridgeData object
+            entry = {'fridge_summary_data': entry._fridge_summary_data,
+                     'fridge_and_cycle_data': entry._fridge_and_cycle_data}
+        journal.Append({'timestamp': str(timestamp),
+                        'fridge_summary_data': entry['fridge_summary_data'],
+                        'fridge_and_cycle_data': entry['fridge_and_cycle_data']})
+    return len(history_data)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description="""
+        Maintenance for the FridgeData history journal.
+           import: convert an old pickle history file into a journal.
+           check:  run the recovery scan and report the good records.
+           compact: drop records outside the retention policy and rebuild checkpoints.
+           """,
+        formatter_class=argparse.RawTextHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command')
+
+    import_parser = subparsers.add_parser('import', help="Convert a pickle history into a journal")
+    import_parser.add_argument("pickle_file", help="Name of the pickle file containing history.")
+    import_parser.add_argument("journal_file", help="Name of the journal to write.")
+
+    check_parser = subparsers.add_parser('check', help="Scan a journal for good records")
+    check_parser.add_argument("journal_file", help="Name of the journal to check.")
+
+    compact_parser = subparsers.add_parser('compact', help="Apply retention and rebuild checkpoints")
+    compact_parser.add_argument("journal_file", help="Name of the journal to compact (must not be in use).")
+    compact_parser.add_argument('--checkpoint_records', type=int, default=50,
+                                help="Records between full checkpoints in the compacted journal.")
+    compact_parser.add_argument('--keep_records', type=int, default=None,
+                                help="Keep only this many of the newest records.")
+    compact_parser.add_argument('--keep_days', type=float, default=None,
+                                help="Keep only records newer than this many days.")
+
+    args = parser.parse_args()
+
+    if args.command == 'import':
+        if not os.path.isfile(args.pickle_file):
+            print(f"Input file: {args.pickle_file} not found.")
+            sys.exit(1)
+        count = Import_Pickle_History(args.pickle_file, args.journal_file)
+        print(f"Imported {count} records into {os.path.abspath(args.journal_file)}")
+    elif args.command == 'check':
+        if not os.path.isfile(args.journal_file):
+            print(f"Input file: {args.journal_file} not found.")
+            sys.exit(1)
+        journal = FridgeJournal(args.journal_file)
+        records = journal.Scan()
+        end = records[-1][0] + records[-1][1] if records else len(JOURNAL_MAGIC)
+        print(f"{len(records)} good records, {end} of {os.path.getsize(journal.Get_Path())} bytes")
+    elif args.command == 'compact':
+        if not os.path.isfile(args.journal_file):
+            print(f"Input file: {args.journal_file} not found.")
+            sys.exit(1)
+        try:
+            records_read, records_written = Compact(args.journal_file, checkpoint_records=args.checkpoint_records,
+                                                    keep_records=args.keep_records, keep_days=args.keep_days)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+        print(f"Compacted {records_read} records into {records_written}")
+    else:
+        parser.print_help()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/07/2020
+Project: Rigetti
+File: FridgeLoadTest.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Load test client for FridgeServer.py. A number of keep-alive connections request the given
+    paths round robin for a while, sending back the ETag each path last returned as
+    If-None-Match the way a polling dashboard would, and the throughput, status counts and
+    latency percentiles are reported.
+"""
+import argparse
+import asyncio
+import json
+import time
+from collections import Counter
+
+
+async def Request(reader, writer, host: str, path: str, etag: str = None) -> tuple:
+    """
+    Send one GET on an open connection and read the response
+    :return:
+    (status, etag, body)
+    """
+    request = f"GET {path} HTTP/1.1\r\nHost: {host}\r\n"
+    if etag is not None:
+        request += f"If-None-Match: {etag}\r\n"
+    writer.write((request + "\r\n").encode('latin-1'))
+    await writer.drain()
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    status = int(head[0].split(' ')[1])
+    headers = {}
+    for line in head[1:]:
+        if ':' in line:
+            name, value = line.split(':', 1)
+            headers[name.strip().lower()] = value.strip()
+    body = await reader.readexactly(int(headers.get('content-length', 0)))
+    return status, headers.get('etag'), body
+
+
+async def _Client(host: str, port: int, paths: list, deadline: float, use_etags: bool, offset: int,
+                  statuses: Counter, latencies: list):
+    reader, writer = await asyncio.open_connection(host, port)
+    etags = {}
+    n = offset
+    try:
+        while time.perf_counter() < deadline:
+            path = paths[n % len(paths)]
+            n += 1
+            start = time.perf_counter()
+            status, etag, body = await Request(reader, writer, host, path, etags.get(path) if use_etags else None)
+            latencies.append(time.perf_counter() - start)
+            statuses[status] += 1
+            if etag is not None:
+                etags[path] = etag
+    finally:
+        writer.close()
+
+
+async def Load_Test(host: str, port: int, paths: list, clients: int = 10, duration: float = 10.0,
+                    use_etags: bool = True) -> dict:
+    """
+    Run the load test
+    :return:
+    dict of 'requests', 'requests_per_second', 'statuses' and latency percentiles in ms
+    """
+    statuses = Counter()
+    latencies = []
+    start = time.perf_counter()
+    deadline = start + duration
+    await asyncio.gather(*[_Client(host, port, paths, deadline, use_etags, n, statuses, latencies)
+                           for n in range(clients)])
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+
+    def percentile(p):
+        return 1000 * latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+    return {'requests': len(latencies),
+            'requests_per_second': len(latencies) / elapsed,
+            'statuses': dict(statuses),
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99)}
+
+
+async def Discover_Paths(host: str, port: int) -> list:
+    """
+    /fleet plus each fridge's summary and cycles
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        status, etag, body = await Request(reader, writer, host, '/fleet')
+    finally:
+        writer.close()
+    paths = ['/fleet']
+    if status == 200:
+        for summary in json.loads(body)['fridges']:
+            paths.append(f"/fridges/{summary['fridge_id']}")
+            paths.append(f"/fridges/{summary['fridge_id']}/cycles")
+    return paths
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description="""
+        Load test a running FridgeServer.py.
+           """,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument('--host', default='127.0.0.1', help="Server address.")
+    parser.add_argument('--port', type=int, default=8080, help="Server port.")
+    parser.add_argument('--clients', type=int, default=10, help="Concurrent connections.")
+    parser.add_argument('--duration', type=float, default=10.0, help="Seconds to run for.")
+    parser.add_argument('--paths', nargs='*', default=None, help= \
+        """Paths to request, default /fleet and every fridge's summary and cycles.""")
+    parser.add_argument('--no_etags', action='store_true',
+                        default=False, help="""Do not send If-None-Match, fetch every response in full""")
+    args = parser.parse_args()
+
+    paths = args.paths or asyncio.run(Discover_Paths(args.host, args.port))
+    results = asyncio.run(Load_Test(args.host, args.port, paths, args.clients, args.duration, not args.no_etags))
+    print(f"  Paths: {len(paths)}  Clients: {args.clients}  ETags: {'off' if args.no_etags else 'on'}")
+    print(f"  Requests: {results['requests']:,}  ({results['requests_per_second']:,.0f}/sec)")
+    print("  Statuses: " + ", ".join(f"{status}: {count:,}" for status, count in sorted(results['statuses'].items())))
+    print(f"  Latency ms  p50: {results['p50_ms']:.2f}  p95: {results['p95_ms']:.2f}  p99: {results['p99_ms']:.2f}")
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/08/2020
+Project: Rigetti
+File: FridgeLogGenerator.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Generator of realistic synthetic fridge logs, for benchmarks and for trying TopFridge on
+    something bigger than the sample inputs.
+
+    Each fridge runs back to back cycles (cooldown of a day or two, several days running, a
+    day of warmup, then a wait before the next cycle).  Rows of all the fridges are written
+    in roughly time order, with optionally some rows moved out of order, comment lines,
+    invalid rows of each kind FridgeData rejects, and corrections (an earlier cycle written
+    again later with different timestamps).
+"""
+import argparse
+import random
+import sys
+from datetime import datetime, timedelta
+from FridgeData import TIME_FORMAT, LOG_FIELDS
+
+# How far (in rows) an out of order row can be moved
+REORDER_WINDOW = 64
+
+
+def Generate_Log_Lines(fridges: int, cycles: int, seed: int = 0, out_of_order: float = 0.0, comments: float = 0.0,
+                       invalid: float = 0.0, corrections: float = 0.0, start: datetime = datetime(2019, 1, 1),
+                       header: bool = True):
+    """
+    Generator of log lines (without line endings)
+    :param fridges: number of fridges
+    :param cycles: cycles per fridge
+    :param seed: random seed, the same arguments always give the same log
+    :param out_of_order: fraction of rows moved up to REORDER_WINDOW rows away
+    :param comments: fraction of extra comment lines
+    :param invalid: fraction of extra invalid rows
+    :param corrections: fraction of extra rows correcting an earlier cycle
+    :param start: when the first cycles start
+    :param header: start with the usual '#fridge_id,...' header
+    """
+    rng = random.Random(seed)
+    if header:
+        yield "#" + ",".join(LOG_FIELDS)
+
+    next_start = [start + timedelta(minutes=rng.randint(0, 7 * 24 * 60)) for _ in range(fridges)]
+    written = []
+    reorder = []
+    for cycle in range(cycles):
+        for fridge_id in range(fridges):
+            cooldown_start = next_start[fridge_id]
+            timestamps = _Cycle_Timestamps(rng, cooldown_start)
+            next_start[fridge_id] = timestamps[3] + timedelta(minutes=rng.randint(6 * 60, 3 * 24 * 60))
+            line = _Format_Line(fridge_id, cycle, timestamps)
+
+            extra = []
+            if comments and rng.random() < comments:
+                extra.append(f"# {rng.choice(['service visit', 'sensor check', 'operator note'])} fridge {fridge_id}")
+            if invalid and rng.random() < invalid:
+                extra.append(_Invalid_Line(rng, fridge_id, cycle, timestamps))
+            if corrections and written and rng.random() < corrections:
+                extra.append(_Correction_Line(rng, written))
+            if corrections:
+                written.append((fridge_id, cycle, timestamps))
+                if len(written) > 1000:
+                    del written[:500]
+
+            for row in [line] + extra:
+                if out_of_order and rng.random() < out_of_order:
+                    reorder.insert(rng.randint(0, len(reorder)), row)
+                else:
+                    reorder.append(row)
+                if len(reorder) > REORDER_WINDOW:
+                    yield reorder.pop(0)
+    yield from reorder
+
+
+def _Cycle_Timestamps(rng: random.Random, cooldown_start: datetime) -> list:
+    cooldown_end = cooldown_start + timedelta(minutes=rng.randint(20 * 60, 40 * 60))
+    warmup_start = cooldown_end + timedelta(minutes=rng.randint(3 * 24 * 60, 7 * 24 * 60))
+    warmup_end = warmup_start + timedelta(minutes=rng.randint(18 * 60, 30 * 60))
+    return [cooldown_start, cooldown_end, warmup_start, warmup_end]
+
+
+def _Format_Line(fridge_id, cycle, timestamps: list) -> str:
+    return f"{fridge_id},{cycle}," + ",".join(timestamp.strftime(TIME_FORMAT) for timestamp in timestamps)
+
+
+def _Invalid_Line(rng: random.Random, fridge_id: int, cycle: int, timestamps: list) -> str:
+    """
+    A row FridgeData rejects, of a random kind
+    """
+    kind = rng.randrange(4)
+    if kind == 0:
+        return _Format_Line(fridge_id, cycle, timestamps)[:-20]
+    if kind == 1:
+        return _Format_Line(f"F{fridge_id}", cycle, timestamps)
+    if kind == 2:
+        return _Format_Line(fridge_id, cycle, timestamps).replace(':', '.', 1)
+    return _Format_Line(fridge_id, cycle, [timestamps[1], timestamps[0], timestamps[2], timestamps[3]])
+
+
+def _Correction_Line(rng: random.Random, written: list) -> str:
+    """
+    An earlier cycle again, with its warmup ending a little earlier or later
+    """
+    fridge_id, cycle, timestamps = rng.choice(written)
+    corrected = list(timestamps)
+    corrected[3] = corrected[3] + timedelta(minutes=rng.randint(-60, 60))
+    return _Format_Line(fridge_id, cycle, corrected)
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description="""
+        Writes a synthetic fridge log.
+           """,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument("output_file", nargs='?', default=None, help="Log file to write, default stdout.")
+    parser.add_argument('--fridges', type=int, default=10, help="Number of fridges.")
+    parser.add_argument('--cycles', type=int, default=100, help="Cycles per fridge.")
+    parser.add_argument('--seed', type=int, default=0, help="Random seed.")
+    parser.add_argument('--out_of_order', type=float, default=0.05, help="Fraction of rows moved out of order.")
+    parser.add_argument('--comments', type=float, default=0.01, help="Fraction of extra comment lines.")
+    parser.add_argument('--invalid', type=float, default=0.01, help="Fraction of extra invalid rows.")
+    parser.add_argument('--corrections', type=float, default=0.01, help="Fraction of extra correction rows.")
+    args = parser.parse_args()
+
+    lines = Generate_Log_Lines(args.fridges, args.cycles, args.seed, args.out_of_order, args.comments,
+                               args.invalid, args.corrections)
+    output = sys.stdout if args.output_file is None else open(args.output_file, 'w')
+    for line in lines:
+        output.write(line + "\n")
+    if output is not sys.stdout:
+        output.close()
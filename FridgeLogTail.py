@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 11/25/2020
+Project: Rigetti
+File: FridgeLogTail.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Tail-follow reader for fridge log files. Remembers how far into the file
+    it has read so that only newly appended, complete lines are handed on to
+    FridgeData.Update.
+
+    Log_Checkpoint records how far a log has been ingested in a way that can be checked
+    against the file after a restart (see FridgeData.Resume_Files).
+"""
+import hashlib
+import os
+
+# Log_Checkpoint hashes this much of the top of a log, and this much just before the offset
+PREFIX_HASH_BYTES = 64 * 1024
+OFFSET_HASH_BYTES = 4 * 1024
+
+
+class LogTail(object):
+    """
+    Follows a growing log file.
+
+    The byte offset only ever advances past complete (newline terminated) lines, so a
+    partially written trailing line is left in the file and picked up on a later read
+    once the writer has finished it.  The inode and size are checked on every read to
+    catch the file being truncated or rotated, in which case reading starts again from
+    the beginning.
+    """
+    def __init__(self, path):
+        self._path = os.path.abspath(path)
+        self._offset = 0
+        self._inode = None
+        self._size = 0
+
+    def Get_Path(self) -> str:
+        return self._path
+
+    def Get_Offset(self) -> int:
+        return self._offset
+
+    def Reset(self):
+        """
+        Forget everything read so far; the next read starts at the top of the file.
+        """
+        self._offset = 0
+        self._inode = None
+        self._size = 0
+
+    def Mark_Read(self, offset: int):
+        """
+        Take the file as already read up to offset (e.g. by FridgeData.Load_Files); the next read starts there.
+        """
+        self.Reset()
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return
+        self._offset = offset
+        self._inode = stat.st_ino
+        self._size = stat.st_size
+
+    def Read_New_Lines(self) -> list:
+        """
+        Read the complete lines appended since the last call.
+        :return:
+        List of lines (with line endings, as readlines() would give). Empty if there is
+        nothing new or the file does not exist.
+        """
+        try:
+            stat = os.stat(self._path)
+        except FileNotFoundError:
+            return []
+
+        if self._inode is not None and (stat.st_ino != self._inode or stat.st_size < self._offset):
+            # Rotated or truncated under us, start over
+            self.Reset()
+        self._inode = stat.st_ino
+        self._size = stat.st_size
+
+        if stat.st_size == self._offset:
+            return []
+
+        with open(self._path, 'rb') as log_file:
+            log_file.seek(self._offset)
+            data = log_file.read(stat.st_size - self._offset)
+
+        last_newline = data.rfind(b'\n')
+        if last_newline < 0:
+            # Only a partial line so far, hold it back
+            return []
+
+        complete = data[:last_newline + 1]
+        self._offset += len(complete)
+        return complete.decode('utf-8', errors='replace').splitlines(keepends=True)
+
+
+def _Prefix_Hash(log_file, offset: int) -> str:
+    digest = hashlib.sha1()
+    log_file.seek(0)
+    digest.update(log_file.read(min(offset, PREFIX_HASH_BYTES)))
+    tail_start = max(min(offset, PREFIX_HASH_BYTES), offset - OFFSET_HASH_BYTES)
+    log_file.seek(tail_start)
+    digest.update(log_file.read(offset - tail_start))
+    return digest.hexdigest()
+
+
+def Log_Checkpoint(path: str, offset: int) -> dict:
+    """
+    How far into a log ingestion has got, as {'offset', 'size', 'inode', 'prefix_hash'}.
+    The hash covers the top of the file and the bytes just before offset, which tells the same log
+    grown longer from one rotated, truncated or rewritten without reading all of it.
+    :return:
+    The checkpoint, None if the file cannot be read
+    """
+    try:
+        with open(path, 'rb') as log_file:
+            stat = os.fstat(log_file.fileno())
+            return {'offset': offset, 'size': stat.st_size, 'inode': stat.st_ino,
+                    'prefix_hash': _Prefix_Hash(log_file, offset)}
+    except OSError:
+        return None
+
+
+def Checkpoint_Matches(path: str, checkpoint: dict) -> bool:
+    """
+    Check a log still starts with what had been read when the checkpoint was made. The inode is
+    not compared, so the same log copied or restored from a backup still matches.
+    """
+    try:
+        with open(path, 'rb') as log_file:
+            if os.fstat(log_file.fileno()).st_size < checkpoint['offset']:
+                return False
+            return _Prefix_Hash(log_file, checkpoint['offset']) == checkpoint['prefix_hash']
+    except OSError:
+        return False
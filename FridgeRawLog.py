@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/04/2020
+Project: Rigetti
+File: FridgeRawLog.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Bounded store for the raw log lines FridgeData keeps from each Update.
+
+    The newest batches are held in memory, up to a number of updates and a number of bytes.
+    Older batches are either dropped or, if a spill directory is given, compressed and
+    appended to on-disk segment files, from which they are read back only when asked for.
+    The segments are the store's own: they only make sense with its index of them, held in
+    memory, so the oldest are deleted when they pass a number of bytes, and all of them on Close.
+"""
+import os
+import zlib
+from collections import OrderedDict
+
+SEGMENT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_SPILL_MAX_BYTES = 256 * 1024 * 1024
+
+
+class RawLogStore(object):
+    """
+    Raw lines of each update, keyed by update timestamp, oldest first
+    """
+    def __init__(self, max_updates: int = 100, max_bytes: int = 16 * 1024 * 1024, spill_dir: str = None,
+                 spill_max_bytes: int = DEFAULT_SPILL_MAX_BYTES, report=print):
+        """
+        :param max_updates: most batches to hold in memory
+        :param max_bytes: most bytes of lines to hold in memory
+        :param spill_dir: directory for compressed segments of older batches; None drops them instead
+        :param spill_max_bytes: most bytes of segments to keep in spill_dir, the oldest batches are dropped past it
+        :param report: function messages (e.g. a segment that could not be deleted) are passed to
+        """
+        self._max_updates = max_updates
+        self._report = report
+        self._max_bytes = max_bytes
+        self._spill_dir = None if spill_dir is None else os.path.abspath(spill_dir)
+        self._batches = OrderedDict()
+        self._bytes = 0
+        # (timestamp, segment path, offset, length) of each spilled batch, oldest first
+        self._spilled = []
+        self._segment_prefix = f"raw_{os.getpid()}_{id(self):x}"
+        self._segment_number = 0
+        self._segment_size = 0
+        # {segment path: bytes} of the segments written, oldest first; a quarter of the limit
+        # each at most, so passing it drops only the oldest part of what was spilled
+        self._segments = OrderedDict()
+        self._spill_max_bytes = spill_max_bytes
+        self._segment_max_bytes = min(SEGMENT_MAX_BYTES, max(1, spill_max_bytes // 4))
+
+    def Add_Batch(self, timestamp, lines: list):
+        """
+        Keep the lines read by one update, spilling or dropping older batches to stay within the limits
+        """
+        self._batches[timestamp] = lines
+        self._bytes += self._Batch_Bytes(lines)
+        while self._batches and (len(self._batches) > self._max_updates or self._bytes > self._max_bytes):
+            old_timestamp, old_lines = self._batches.popitem(last=False)
+            self._bytes -= self._Batch_Bytes(old_lines)
+            if self._spill_dir is not None:
+                self._Spill(old_timestamp, old_lines)
+
+    def Batches(self):
+        """
+        Generator over (timestamp, lines) for every batch kept, oldest first. Spilled batches are
+        read back one at a time as the generator reaches them.
+        """
+        for timestamp, segment_path, offset, length in list(self._spilled):
+            yield timestamp, self._Read_Spilled(segment_path, offset, length)
+        for timestamp, lines in list(self._batches.items()):
+            yield timestamp, lines
+
+    def Get_Batch(self, timestamp) -> list:
+        """
+        Lines of one update, None if it was dropped (or never seen)
+        """
+        if timestamp in self._batches:
+            return self._batches[timestamp]
+        for spilled_timestamp, segment_path, offset, length in self._spilled:
+            if spilled_timestamp == timestamp:
+                return self._Read_Spilled(segment_path, offset, length)
+        return None
+
+    def Get_Memory_Bytes(self) -> int:
+        return self._bytes
+
+    def Get_Number_of_Batches(self) -> int:
+        return len(self._spilled) + len(self._batches)
+
+    def Get_Spilled_Bytes(self) -> int:
+        return sum(self._segments.values())
+
+    def Close(self):
+        """
+        Delete the segments spilled to disk; the batches in them are gone, those in memory are kept
+        """
+        while self._segments:
+            self._Drop_Oldest_Segment()
+
+    def _Spill(self, timestamp, lines: list):
+        if self._segment_size >= self._segment_max_bytes:
+            self._segment_number += 1
+            self._segment_size = 0
+        os.makedirs(self._spill_dir, exist_ok=True)
+        segment_path = os.path.join(self._spill_dir, f"{self._segment_prefix}_{self._segment_number:04d}.z")
+        data = zlib.compress('\n'.join(lines).encode('utf-8'))
+        with open(segment_path, 'ab') as segment_file:
+            segment_file.write(data)
+        self._spilled.append((timestamp, segment_path, self._segment_size, len(data)))
+        self._segment_size += len(data)
+        self._segments[segment_path] = self._segment_size
+        while self._segments and self.Get_Spilled_Bytes() > self._spill_max_bytes:
+            self._Drop_Oldest_Segment()
+
+    def _Drop_Oldest_Segment(self):
+        segment_path, size = self._segments.popitem(last=False)
+        self._spilled = [spilled for spilled in self._spilled if spilled[1] != segment_path]
+        if segment_path == os.path.join(self._spill_dir, f"{self._segment_prefix}_{self._segment_number:04d}.z"):
+            # The one being written to, start a new one
+            self._segment_number += 1
+            self._segment_size = 0
+        try:
+            os.remove(segment_path)
+        except OSError as e:
+            self._report(f"Failed to remove raw log segment {segment_path}: {str(e)}")
+
+    @staticmethod
+    def _Read_Spilled(segment_path: str, offset: int, length: int) -> list:
+        with open(segment_path, 'rb') as segment_file:
+            segment_file.seek(offset)
+            text = zlib.decompress(segment_file.read(length)).decode('utf-8')
+        return text.split('\n') if text else []
+
+    @staticmethod
+    def _Batch_Bytes(lines: list) -> int:
+        return sum(len(line) + 1 for line in lines)
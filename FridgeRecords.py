@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/02/2020
+Project: Rigetti
+File: FridgeRecords.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Compact record types used by FridgeData for cycles and fridge summaries.
+
+    Timestamps are held as int seconds since the epoch, and durations are worked out from
+    them on access, so a cycle costs a handful of slots instead of a dict of a dozen keys
+    and datetime objects.  Both types also answer the old dict style lookups
+    (cycle['cooldown_start'], summary['totals'], ...), returning datetimes for timestamps,
+    so existing formatting code and history readers keep working.
+"""
+from datetime import datetime, timedelta
+from FridgeSketch import QuantileSketch
+
+EPOCH = datetime(1970, 1, 1)
+PHASES = ['cooldown_time', 'running_time', 'warmup_time', 'next_cycle_wait_time']
+
+
+def To_Epoch(timestamp: datetime) -> int:
+    """
+    Whole seconds since the epoch for a (naive) datetime
+    """
+    return (timestamp - EPOCH) // timedelta(seconds=1)
+
+
+def From_Epoch(seconds: int) -> datetime:
+    return EPOCH + timedelta(seconds=seconds)
+
+
+class CycleRecord(object):
+    """
+    One cooldown/warmup cycle of a fridge
+    """
+    __slots__ = ('fridge_id', 'cycle', 'cooldown_start', 'cooldown_end', 'warmup_start', 'warmup_end',
+                 'next_cycle_start', 'update_timestamp')
+
+    # Keys of the old dict representations, mapped to how to get them from a record
+    _TIMESTAMP_KEYS = {'cooldown_start': 'cooldown_start',
+                       'cooldown_end': 'cooldown_end',
+                       'warmup_start': 'warmup_start',
+                       'warmup_end': 'warmup_end',
+                       'start': 'cooldown_start',
+                       'end': 'warmup_end',
+                       'next_cycle_start': 'next_cycle_start'}
+    _KEYS = ['fridge_id', 'cycle', 'start', 'end', 'cooldown_start', 'cooldown_end', 'warmup_start', 'warmup_end',
+             'cooldown_time', 'running_time', 'warmup_time', 'next_cycle_start', 'next_cycle_wait_time',
+             'update_timestamp']
+
+    def __init__(self, fridge_id: int, cycle: int, cooldown_start: int = None, cooldown_end: int = None,
+                 warmup_start: int = None, warmup_end: int = None):
+        self.fridge_id = fridge_id
+        self.cycle = cycle
+        self.cooldown_start = cooldown_start
+        self.cooldown_end = cooldown_end
+        self.warmup_start = warmup_start
+        self.warmup_end = warmup_end
+        self.next_cycle_start = None
+        self.update_timestamp = None
+
+    def Matches(self, cooldown_start: int, cooldown_end: int, warmup_start: int, warmup_end: int) -> bool:
+        """
+        Check whether the record already holds these timestamps
+        """
+        return self.cooldown_start == cooldown_start and self.cooldown_end == cooldown_end and \
+            self.warmup_start == warmup_start and self.warmup_end == warmup_end
+
+    def Set_Timestamps(self, cooldown_start: int, cooldown_end: int, warmup_start: int, warmup_end: int) -> bool:
+        """
+        Set the four timestamps (epoch seconds)
+        :return:
+        True if any of them changed
+        """
+        if self.cooldown_start == cooldown_start and self.cooldown_end == cooldown_end and \
+                self.warmup_start == warmup_start and self.warmup_end == warmup_end:
+            return False
+        self.cooldown_start = cooldown_start
+        self.cooldown_end = cooldown_end
+        self.warmup_start = warmup_start
+        self.warmup_end = warmup_end
+        return True
+
+    @property
+    def cooldown_time(self) -> float:
+        return float(self.cooldown_end - self.cooldown_start)
+
+    @property
+    def running_time(self) -> float:
+        return float(self.warmup_start - self.cooldown_end)
+
+    @property
+    def warmup_time(self) -> float:
+        return float(self.warmup_end - self.warmup_start)
+
+    @property
+    def next_cycle_wait_time(self) -> float:
+        if self.next_cycle_start is None:
+            return None
+        return float(self.next_cycle_start - self.warmup_end)
+
+    # Dict style access, for compatibility
+    def __getitem__(self, key: str):
+        if key in self._TIMESTAMP_KEYS:
+            seconds = getattr(self, self._TIMESTAMP_KEYS[key])
+            return None if seconds is None else From_Epoch(seconds)
+        if key in self._KEYS:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._KEYS
+
+    def get(self, key: str, default=None):
+        return self[key] if key in self._KEYS else default
+
+    def keys(self) -> list:
+        return list(self._KEYS)
+
+    def items(self) -> list:
+        return [(key, self[key]) for key in self._KEYS]
+
+    def As_Dict(self) -> dict:
+        return {key: self[key] for key in self._KEYS}
+
+    def __getstate__(self):
+        return (self.fridge_id, self.cycle, self.cooldown_start, self.cooldown_end, self.warmup_start,
+                self.warmup_end, self.next_cycle_start, self.update_timestamp)
+
+    def __setstate__(self, state):
+        (self.fridge_id, self.cycle, self.cooldown_start, self.cooldown_end, self.warmup_start,
+         self.warmup_end, self.next_cycle_start, self.update_timestamp) = state
+
+    def __repr__(self):
+        return f"CycleRecord(fridge_id={self.fridge_id}, cycle={self.cycle}, " + \
+               f"cooldown_start={self.cooldown_start}, cooldown_end={self.cooldown_end}, " + \
+               f"warmup_start={self.warmup_start}, warmup_end={self.warmup_end}, " + \
+               f"next_cycle_start={self.next_cycle_start})"
+
+
+class FridgeTotals(object):
+    """
+    Running totals (in seconds) over the cycles of one fridge (or of the whole fleet), kept up to
+    date as cycles are added or corrected, so a summary does not have to re-add every cycle.
+    Wait times are tracked separately since they change when a cycle's neighbour does.
+    sketches holds a QuantileSketch of the durations of each phase, for their percentiles.
+    """
+    __slots__ = ('num_of_cycles', 'num_of_waits', 'cooldown_time', 'running_time', 'warmup_time',
+                 'next_cycle_wait_time', 'sketches')
+
+    def __init__(self):
+        self.num_of_cycles = 0
+        self.num_of_waits = 0
+        self.cooldown_time = 0
+        self.running_time = 0
+        self.warmup_time = 0
+        self.next_cycle_wait_time = 0
+        self.sketches = {phase: QuantileSketch() for phase in PHASES}
+
+    def Add_Cycle(self, cycle: CycleRecord):
+        cooldown_time = cycle.cooldown_end - cycle.cooldown_start
+        running_time = cycle.warmup_start - cycle.cooldown_end
+        warmup_time = cycle.warmup_end - cycle.warmup_start
+        self.num_of_cycles += 1
+        self.cooldown_time += cooldown_time
+        self.running_time += running_time
+        self.warmup_time += warmup_time
+        sketches = self.sketches
+        sketches['cooldown_time'].Add(cooldown_time)
+        sketches['running_time'].Add(running_time)
+        sketches['warmup_time'].Add(warmup_time)
+
+    def Remove_Cycle(self, cycle: CycleRecord):
+        cooldown_time = cycle.cooldown_end - cycle.cooldown_start
+        running_time = cycle.warmup_start - cycle.cooldown_end
+        warmup_time = cycle.warmup_end - cycle.warmup_start
+        self.num_of_cycles -= 1
+        self.cooldown_time -= cooldown_time
+        self.running_time -= running_time
+        self.warmup_time -= warmup_time
+        sketches = self.sketches
+        sketches['cooldown_time'].Remove(cooldown_time)
+        sketches['running_time'].Remove(running_time)
+        sketches['warmup_time'].Remove(warmup_time)
+
+    def Add_Wait(self, cycle: CycleRecord):
+        if cycle.next_cycle_start is not None:
+            wait_time = cycle.next_cycle_start - cycle.warmup_end
+            self.num_of_waits += 1
+            self.next_cycle_wait_time += wait_time
+            self.sketches['next_cycle_wait_time'].Add(wait_time)
+
+    def Remove_Wait(self, cycle: CycleRecord):
+        if cycle.next_cycle_start is not None:
+            wait_time = cycle.next_cycle_start - cycle.warmup_end
+            self.num_of_waits -= 1
+            self.next_cycle_wait_time -= wait_time
+            self.sketches['next_cycle_wait_time'].Remove(wait_time)
+
+    def Merge(self, other: 'FridgeTotals'):
+        """
+        Add another's totals (e.g. a fridge's into the fleet's) into these
+        """
+        self._Combine(other, 1)
+
+    def Subtract(self, other: 'FridgeTotals'):
+        """
+        Take totals merged in before back out
+        """
+        self._Combine(other, -1)
+
+    def _Combine(self, other: 'FridgeTotals', sign: int):
+        self.num_of_cycles += sign * other.num_of_cycles
+        self.num_of_waits += sign * other.num_of_waits
+        self.cooldown_time += sign * other.cooldown_time
+        self.running_time += sign * other.running_time
+        self.warmup_time += sign * other.warmup_time
+        self.next_cycle_wait_time += sign * other.next_cycle_wait_time
+        for phase in PHASES:
+            if sign > 0:
+                self.sketches[phase].Merge(other.sketches[phase])
+            else:
+                self.sketches[phase].Subtract(other.sketches[phase])
+
+    def Totals(self) -> dict:
+        """
+        {phase: seconds}, as in FridgeSummary.totals
+        """
+        return {phase: float(getattr(self, phase)) for phase in PHASES}
+
+    def Percentiles(self) -> dict:
+        """
+        {phase: {'p50': seconds, 'p95': seconds, 'p99': seconds}}, None for a phase with no durations
+        """
+        return {phase: self.sketches[phase].Quantiles() if self.sketches[phase].Count() > 0 else None
+                for phase in PHASES}
+
+
+class FridgeSummary(object):
+    """
+    Totals, averages and percents of time spent in each part of the cycle, for one fridge
+    (fridge_id None for the whole fleet).
+    totals, averages and percents are dicts keyed by 'cooldown_time', 'running_time',
+    'warmup_time' and 'next_cycle_wait_time'; percentiles, when known, the p50/p95/p99
+    durations of each (see FridgeTotals.Percentiles).
+    """
+    __slots__ = ('fridge_id', 'num_of_cycles', 'total_time', 'totals', 'averages', 'percents', 'update_timestamp',
+                 'percentiles')
+
+    def __init__(self, fridge_id: int, num_of_cycles: int, total_time: float, totals: dict, averages: dict,
+                 percents: dict, update_timestamp: datetime = None, percentiles: dict = None):
+        self.fridge_id = fridge_id
+        self.num_of_cycles = num_of_cycles
+        self.total_time = total_time
+        self.totals = totals
+        self.averages = averages
+        self.percents = percents
+        self.update_timestamp = update_timestamp
+        self.percentiles = percentiles
+
+    # Dict style access, for compatibility
+    def __getitem__(self, key: str):
+        if key not in self.__slots__:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.__slots__
+
+    def get(self, key: str, default=None):
+        return getattr(self, key) if key in self.__slots__ else default
+
+    def keys(self) -> list:
+        return list(self.__slots__)
+
+    def items(self) -> list:
+        return [(key, getattr(self, key)) for key in self.__slots__]
+
+    def As_Dict(self) -> dict:
+        return {key: getattr(self, key) for key in self.__slots__}
+
+    def __getstate__(self):
+        return tuple(getattr(self, key) for key in self.__slots__)
+
+    def __setstate__(self, state):
+        # Summaries journaled before a slot was added have none
+        for key in self.__slots__[len(state):]:
+            setattr(self, key, None)
+        for key, value in zip(self.__slots__, state):
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return f"FridgeSummary({self.As_Dict()})"
+
+
+def Make_Summary(fridge_id: int, num_of_cycles: int, total_time: float, totals: dict, num_of_waits: int = None,
+                 percentiles: dict = None) -> FridgeSummary:
+    """
+    Fill in the averages and percents from the totals. A fridge with a single cycle has no wait to
+    average, and one with no elapsed time no percents; those come out as 0.
+    num_of_waits defaults to one less than the cycles, as for a single fridge.
+    """
+    if num_of_waits is None:
+        num_of_waits = num_of_cycles - 1
+    averages = {'cooldown_time': totals['cooldown_time'] / num_of_cycles,
+                'running_time': totals['running_time'] / num_of_cycles,
+                'warmup_time': totals['warmup_time'] / num_of_cycles,
+                'next_cycle_wait_time': totals['next_cycle_wait_time'] / num_of_waits if num_of_waits else 0.0
+                }
+    percents = {key: value / total_time if total_time else 0.0 for key, value in totals.items()}
+    return FridgeSummary(fridge_id, num_of_cycles, total_time, totals, averages, percents, percentiles=percentiles)
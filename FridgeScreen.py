@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/15/2020
+Project: Rigetti
+File: FridgeScreen.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Full screen, top style view of the fridge output, for TopFridge --screen.
+
+    The screen keeps a model of what each row shows: the lines of the fridge blocks (split
+    once per block, and again only when a block's text changes) and the text last drawn on
+    every row.  A redraw only writes the rows whose text differs from what is already there,
+    so an update touching one fridge, or scrolling a line, costs a few rows rather than the
+    whole screen, and nothing flickers.  Updates from other threads only hand over new
+    blocks; drawing happens on the curses thread at most fps times a second, however often
+    the data changes.
+
+    Keys: Up/Down (or k/j) scroll a line, PgUp/PgDn (or b/space) a page, Home/End (or g/G) go
+    to the top/bottom, n/p to the next/previous fridge, q quits.
+"""
+import bisect
+import threading
+import time
+
+try:
+    import curses
+except ImportError:
+    curses = None
+
+DEFAULT_FPS = 10.0
+# Longest getch waits for a key before checking for something to draw
+KEY_POLL_SECONDS = 0.1
+
+
+class FridgeScreen(object):
+    """
+    Screen model of the fridge blocks, with a header row, a footer row and the lines between scrolled
+    """
+    def __init__(self, fps: float = DEFAULT_FPS):
+        """
+        :param fps: most redraws per second
+        """
+        if curses is None:
+            raise ValueError("The full screen mode needs the curses module (on Windows: pip install windows-curses)")
+        self._min_interval = 1.0 / fps if fps > 0 else 0.0
+        self._lock = threading.Lock()
+        # (block text, its lines) of each block shown, the lines of them all (a blank line between
+        # blocks) and where each block starts among them
+        self._blocks = []
+        self._lines = []
+        self._block_starts = []
+        self._header = ""
+        self._status = ""
+        self._top = 0
+        self._page_rows = 1
+        # Something to draw since the last redraw
+        self._dirty = True
+        self._last_draw = 0.0
+        # {row: text} on the screen now
+        self._shown = {}
+        self._frames = 0
+        self._rows_drawn = 0
+
+    def Set_Blocks(self, blocks, header: str = ""):
+        """
+        Take new text blocks to show (e.g. from Fridge_Output_Blocks), from any thread. A block that is
+        the same string as one shown now (as cached blocks of unchanged fridges are) is not split again.
+        """
+        with self._lock:
+            previous = {id(block): lines for block, lines in self._blocks}
+            new_blocks = []
+            for block in blocks:
+                lines = previous.get(id(block))
+                if lines is None:
+                    lines = block.rstrip('\n').split('\n')
+                new_blocks.append((block, lines))
+            all_lines = []
+            block_starts = []
+            for block, lines in new_blocks:
+                if all_lines:
+                    all_lines.append("")
+                block_starts.append(len(all_lines))
+                all_lines.extend(lines)
+            self._blocks = new_blocks
+            self._lines = all_lines
+            self._block_starts = block_starts
+            self._header = header
+            self._top = self._Clamp(self._top)
+            self._dirty = True
+
+    def Set_Status(self, message: str):
+        """
+        Message shown in the footer, from any thread
+        """
+        with self._lock:
+            self._status = message
+            self._dirty = True
+
+    def Get_Stats(self) -> dict:
+        """
+        'frames' drawn and 'rows_drawn' over them
+        """
+        return {'frames': self._frames, 'rows_drawn': self._rows_drawn}
+
+    def _Clamp(self, top: int) -> int:
+        return max(0, min(top, len(self._lines) - self._page_rows))
+
+    def Run(self, screen, should_stop=None):
+        """
+        Main loop, to run under curses.wrapper: handle keys and redraw until q is pressed
+        :param screen: the curses window
+        :param should_stop: function, returns True to leave the loop
+        """
+        try:
+            curses.curs_set(0)
+        except curses.error:
+            pass
+        screen.timeout(int(1000 * min(KEY_POLL_SECONDS, self._min_interval or KEY_POLL_SECONDS)))
+        self._shown = {}
+        self._dirty = True
+        while should_stop is None or not should_stop():
+            key = screen.getch()
+            if key == curses.KEY_RESIZE:
+                screen.clear()
+                self._shown = {}
+                self._dirty = True
+            elif key != -1 and not self._Key(key):
+                return
+            now = time.monotonic()
+            if self._dirty and now - self._last_draw >= self._min_interval:
+                self._Draw(screen)
+                self._last_draw = now
+
+    def _Key(self, key: int) -> bool:
+        """
+        Move the view for a key
+        :return:
+        False to quit
+        """
+        if key in (ord('q'), ord('Q')):
+            return False
+        with self._lock:
+            top = self._top
+            if key in (curses.KEY_UP, ord('k')):
+                top -= 1
+            elif key in (curses.KEY_DOWN, ord('j')):
+                top += 1
+            elif key in (curses.KEY_PPAGE, ord('b')):
+                top -= self._page_rows
+            elif key in (curses.KEY_NPAGE, ord(' ')):
+                top += self._page_rows
+            elif key in (curses.KEY_HOME, ord('g')):
+                top = 0
+            elif key in (curses.KEY_END, ord('G')):
+                top = len(self._lines)
+            elif key == ord('n'):
+                i = bisect.bisect_right(self._block_starts, top)
+                if i < len(self._block_starts):
+                    top = self._block_starts[i]
+            elif key == ord('p'):
+                i = bisect.bisect_left(self._block_starts, top)
+                if i > 0:
+                    top = self._block_starts[i - 1]
+            top = self._Clamp(top)
+            if top != self._top:
+                self._top = top
+                self._dirty = True
+        return True
+
+    def _Draw(self, screen):
+        """
+        Write the rows whose text changed since they were last drawn
+        """
+        height, width = screen.getmaxyx()
+        with self._lock:
+            self._page_rows = max(1, height - 2)
+            self._top = self._Clamp(self._top)
+            top = self._top
+            body = self._lines[top:top + self._page_rows]
+            fridge = bisect.bisect_right(self._block_starts, top)
+            footer = f" Lines {top + 1 if self._lines else 0}-{top + len(body)} of {len(self._lines)}" + \
+                     f"  Block {fridge} of {len(self._block_starts)}  {self._status}"
+            rows = [self._header] + body + [""] * (self._page_rows - len(body)) + \
+                   [footer + "   q:quit arrows/PgUp/PgDn/Home/End:scroll n/p:next/previous fridge"]
+            self._dirty = False
+        drawn = 0
+        for row, text in enumerate(rows[:height]):
+            # The last column of the last row can not be written without curses complaining
+            text = text[:width - 1]
+            bar = row == 0 or row == len(rows) - 1
+            if bar:
+                text = text.ljust(width - 1)
+            if self._shown.get(row) == text:
+                continue
+            attribute = curses.A_REVERSE if bar else curses.A_NORMAL
+            try:
+                screen.move(row, 0)
+                screen.clrtoeol()
+                screen.addstr(row, 0, text, attribute)
+            except curses.error:
+                pass
+            self._shown[row] = text
+            drawn += 1
+        screen.refresh()
+        self._frames += 1
+        self._rows_drawn += drawn
@@ -0,0 +1,381 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/07/2020
+Project: Rigetti
+File: FridgeServer.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Local asyncio HTTP server giving JSON views of a live FridgeData, for a web dashboard.
+
+    GET /fleet                          fleet summary and summaries of every fridge
+    GET /fridges/<id>                   summary and cycle ids of one fridge
+    GET /fridges/<id>/cycles            every cycle of one fridge
+    GET /fridges/<id>/cycles/<cycle>    one cycle
+    GET /history                        the records of the history journal
+    GET /history/<record>               summaries (and with ?cycles=1 the cycles) as of a record
+
+    The logs are followed by polling them from the event loop, with each Update (parsing, the
+    journal write and its fsync) run in a worker thread under a lock the requests also take, so
+    an Update never runs while a response is being built, yet connections are still accepted
+    and read meanwhile.  Every response carries an ETag made from the FridgeData version
+    of what it shows; a request whose If-None-Match still matches gets a 304 without anything
+    being serialized, and serialized bodies are cached until the version they were made from
+    changes.  History records are read back from the journal in a worker thread, outside the
+    lock, since journal records never change once written.  See FridgeLoadTest.py for a client
+    to load test it with.
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import sys
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+from FridgeData import FridgeData, Expand_Log_Paths
+from FridgeJournal import Timestamp_From_Key
+from FridgeLogTail import LogTail
+
+HISTORY_CACHE_SIZE = 64
+STATUS_TEXT = {200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found',
+               405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+def _Json_Default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if hasattr(value, 'items'):
+        return dict(value.items())
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def To_Json(value) -> bytes:
+    """
+    Serialize a response; datetimes become ISO strings, and summaries and cycle records (or the
+    dicts of older history records) become objects
+    """
+    return json.dumps(value, default=_Json_Default, separators=(',', ':')).encode('utf-8')
+
+
+class FridgeServer(object):
+    """
+    Serves JSON views of a FridgeData, following its logs
+    """
+    def __init__(self, fridge_data: FridgeData, patterns: list = None, log_tails: dict = None,
+                 poll_interval: float = 1.0):
+        """
+        :param fridge_data:
+        :param patterns: log file names or globs to follow; new files matching them are picked up
+        :param log_tails: {path: LogTail} of logs already loaded into fridge_data
+        :param poll_interval: seconds between checks of the logs for new lines
+        """
+        self._fridge_data = fridge_data
+        self._patterns = patterns or []
+        self._log_tails = log_tails if log_tails is not None else {}
+        self._poll_interval = poll_interval
+        # ETags from an earlier run of the server must not match, the versions start again from 0
+        self._instance = uuid.uuid4().hex[:8]
+        # {cache key: (version, body)}
+        self._cache = {}
+        self._history_cache = OrderedDict()
+        # Held while the logs are read into fridge_data and while a response is made from it,
+        # made in Serve so it belongs to the loop serving
+        self._lock = None
+
+    async def Serve(self, host: str = '127.0.0.1', port: int = 8080):
+        self._lock = asyncio.Lock()
+        server = await asyncio.start_server(self._Handle_Connection, host, port)
+        print(f"Serving fridge data on http://{host}:{port}/fleet")
+        follow = asyncio.ensure_future(self._Follow())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            follow.cancel()
+
+    async def _Follow(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                async with self._lock:
+                    await loop.run_in_executor(None, self._Read_Logs)
+            except Exception as e:
+                # Keep following, the next poll may well succeed (e.g. the disk had filled up)
+                print(f"Failed to update from the logs: {type(e).__name__}: {str(e)}")
+            await asyncio.sleep(self._poll_interval)
+
+    def _Read_Logs(self):
+        """
+        Read what was appended to the logs (and any new log matching the patterns) into fridge_data.
+        Runs in a worker thread. If an Update fails, its log is left as it was before the lines were read.
+        """
+        for path in Expand_Log_Paths(self._patterns):
+            if path not in self._log_tails:
+                self._log_tails[path] = LogTail(path)
+        for path, log_tail in list(self._log_tails.items()):
+            unread = copy.copy(log_tail)
+            lines = log_tail.Read_New_Lines()
+            if lines:
+                try:
+                    self._fridge_data.Update(lines, log_offsets={tail_path: tail.Get_Offset()
+                                                                 for tail_path, tail in self._log_tails.items()})
+                except Exception:
+                    # Read the lines again next time rather than lose them
+                    self._log_tails[path] = unread
+                    raise
+
+    async def _Handle_Connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b'\r\n\r\n')
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                    break
+                lines = head.decode('latin-1').split('\r\n')
+                try:
+                    method, target, protocol = lines[0].split(' ')
+                except ValueError:
+                    writer.write(self._Format_Response(400, None, To_Json({'error': 'bad request line'}), False))
+                    break
+                headers = {}
+                for line in lines[1:]:
+                    if ':' in line:
+                        name, value = line.split(':', 1)
+                        headers[name.strip().lower()] = value.strip()
+                connection = headers.get('connection', '').lower()
+                keep_alive = connection == 'keep-alive' if protocol == 'HTTP/1.0' else connection != 'close'
+                if 'content-length' in headers:
+                    await reader.readexactly(int(headers['content-length']))
+
+                async with self._lock:
+                    response, pending = self._Prepare(method, target, headers.get('if-none-match'))
+                    if pending is not None and not pending[4]:
+                        response = self._Finish(pending, *self._Serialize(target, pending[3]))
+                if response is None:
+                    # A record read back from the journal: records never change once written, so
+                    # the lock is not needed, and the read is kept off the event loop
+                    serialized = await loop.run_in_executor(None, self._Serialize, target, pending[3])
+                    response = self._Finish(pending, *serialized)
+                status, etag, body = response
+                writer.write(self._Format_Response(status, etag, body, keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    def _Format_Response(status: int, etag: str, body: bytes, keep_alive: bool) -> bytes:
+        head = f"HTTP/1.1 {status} {STATUS_TEXT[status]}\r\n" + \
+               "Content-Type: application/json\r\n" + \
+               "Cache-Control: no-cache\r\n" + \
+               f"Content-Length: {len(body) if status != 304 else 0}\r\n" + \
+               f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+        if etag is not None:
+            head += f"ETag: {etag}\r\n"
+        head += "\r\n"
+        return head.encode('latin-1') + (body if status != 304 else b'')
+
+    def Respond(self, method: str, target: str, if_none_match: str = None) -> tuple:
+        """
+        Work out the response to a request
+        :return:
+        (status, etag, body)
+        """
+        response, pending = self._Prepare(method, target, if_none_match)
+        if pending is None:
+            return response
+        return self._Finish(pending, *self._Serialize(target, pending[3]))
+
+    def _Prepare(self, method: str, target: str, if_none_match: str = None) -> tuple:
+        """
+        Answer a request from what is at hand (an error, a 304 or a cached body), or work out what is
+        left to build
+        :return:
+        ((status, etag, body), None) if answered, else (None, (cache, key, version, build, reads_journal))
+        for Respond or _Handle_Connection to serialize and _Finish
+        """
+        if method != 'GET':
+            return (405, None, To_Json({'error': f"{method} not allowed"})), None
+        path, _, query = target.partition('?')
+        parts = [part for part in path.split('/') if part]
+        try:
+            route = self._Route(parts, query)
+        except ValueError:
+            route = None
+        if route is None:
+            return (404, None, To_Json({'error': f"no such resource {path}"})), None
+
+        key, version, build, reads_journal = route
+        etag = self._Etag(version)
+        if if_none_match is not None and etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return (304, etag, b''), None
+
+        if key is None:
+            cache = None
+        elif key[0] == 'history':
+            cache = self._history_cache
+        else:
+            cache = self._cache
+        cached = cache.get(key) if cache is not None else None
+        if cached is not None and cached[0] == version:
+            return (200, etag, cached[1]), None
+        return None, (cache, key, version, build, reads_journal)
+
+    @staticmethod
+    def _Serialize(target: str, build) -> tuple:
+        """
+        Build a response and serialize it. Runs in a worker thread for those reading the journal.
+        :return:
+        (status, body)
+        """
+        try:
+            return 200, To_Json(build())
+        except Exception as e:
+            print(f"Error building {target}: {e}")
+            return 500, To_Json({'error': str(e)})
+
+    def _Finish(self, pending: tuple, status: int, body: bytes) -> tuple:
+        """
+        Cache a body _Serialize made for what _Prepare left pending
+        :return:
+        (status, etag, body)
+        """
+        cache, key, version, build, reads_journal = pending
+        if status != 200:
+            return status, None, body
+        if cache is not None:
+            cache[key] = (version, body)
+            if cache is self._history_cache:
+                while len(cache) > HISTORY_CACHE_SIZE:
+                    cache.popitem(last=False)
+        return 200, self._Etag(version), body
+
+    def _Etag(self, version) -> str:
+        return f'"{self._instance}-{version}"'
+
+    def _Route(self, parts: list, query: str) -> tuple:
+        """
+        :return:
+        (cache key or None not to cache, version of the data shown, function building the response,
+        whether that reads the journal), or None if no such resource
+        """
+        fridge_data = self._fridge_data
+        if parts == ['fleet']:
+            return ('fleet',), fridge_data.Get_Version(), self._Fleet, False
+
+        if parts and parts[0] == 'fridges' and len(parts) in (2, 3, 4):
+            fridge_id = int(parts[1])
+            if fridge_id not in (fridge_data.List_Fridges() or []):
+                return None
+            version = fridge_data.Get_Fridge_Version(fridge_id)
+            if len(parts) == 2:
+                return ('fridge', fridge_id), version, lambda: self._Fridge(fridge_id), False
+            if parts[2] != 'cycles':
+                return None
+            if len(parts) == 3:
+                return ('cycles', fridge_id), version, lambda: self._Cycles(fridge_id), False
+            cycle_id = int(parts[3])
+            cycle = fridge_data.Get_data_by_fridge_and_cycle()[fridge_id].get(cycle_id)
+            if cycle is None:
+                return None
+            # Single cycles are cheap to build, they are not worth a cache entry each
+            return None, version, lambda: cycle, False
+
+        if parts and parts[0] == 'history' and len(parts) in (1, 2):
+            index = fridge_data.Get_Journal().Index()
+            if len(parts) == 1:
+                return ('history',), len(index), lambda: self._History(index), False
+            record = int(parts[1])
+            if not 0 <= record < len(index):
+                return None
+            with_cycles = 'cycles=1' in query.split('&')
+            timestamp_key, offset, length = index[record]
+            # Journal records never change, so the offset identifies the response
+            return ('history', offset, with_cycles), f"h{offset}{'c' if with_cycles else ''}", \
+                lambda: self._History_Record(record, offset, with_cycles), True
+        return None
+
+    def _Fleet(self) -> dict:
+        fridge_data = self._fridge_data
+        fridges = sorted(fridge_data.List_Fridges() or [])
+        return {'version': fridge_data.Get_Version(),
+                'fleet': fridge_data.Get_Fleet_Summary_Data(),
+                'fridges': [fridge_data.Get_Fridge_Summary_Data(fridge_id) for fridge_id in fridges]}
+
+    def _Fridge(self, fridge_id: int) -> dict:
+        fridge_data = self._fridge_data
+        return {'version': fridge_data.Get_Fridge_Version(fridge_id),
+                'summary': fridge_data.Get_Fridge_Summary_Data(fridge_id),
+                'cycles': list(fridge_data.List_Cycles_of_Fridge(fridge_id))}
+
+    def _Cycles(self, fridge_id: int) -> dict:
+        fridge_data = self._fridge_data
+        return {'version': fridge_data.Get_Fridge_Version(fridge_id),
+                'cycles': list(fridge_data.Get_Fridge_Cycle_Data(fridge_id).values())}
+
+    @staticmethod
+    def _History(index: list) -> dict:
+        return {'records': [{'record': n, 'timestamp': Timestamp_From_Key(timestamp_key), 'offset': offset}
+                            for n, (timestamp_key, offset, length) in enumerate(index)]}
+
+    def _History_Record(self, record: int, offset: int, with_cycles: bool) -> dict:
+        state = self._fridge_data.Get_Journal().Read_State(offset)
+        response = {'record': record,
+                    'timestamp': state['timestamp'],
+                    'fridges': [state['fridge_summary_data'][fridge_id]
+                                for fridge_id in sorted(state['fridge_summary_data'])]}
+        if with_cycles:
+            response['cycles'] = {str(fridge_id): [cycles[cycle] for cycle in sorted(cycles)]
+                                  for fridge_id, cycles in sorted(state['fridge_and_cycle_data'].items())}
+        return response
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(
+        description="""
+        Serves JSON views of fridge data for a dashboard, following the log files as they grow.
+           """,
+        formatter_class=argparse.RawTextHelpFormatter)
+
+    parser.add_argument("input_files", nargs='+',
+                        help="Names (or glob patterns, quoted) of the log files to get data from and monitor.")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on.")
+    parser.add_argument('--port', type=int, default=8080, help="Port to listen on.")
+    parser.add_argument('--poll', type=float, default=1.0, help="Seconds between checks of the logs.")
+    parser.add_argument('--history_file', default="FridgeData.journal", help="History journal to write.")
+    parser.add_argument('--processes', type=int, default=None, help= \
+        """Worker processes for loading the logs at startup, default one per CPU.""")
+    parser.add_argument('--cold_start', action='store_true', default=False, help= \
+        """Load the logs in full, rather than resuming from the history and reading only what was appended since.""")
+    args = parser.parse_args()
+
+    patterns = [os.path.abspath(pattern) for pattern in args.input_files]
+    try:
+        fridge_data = FridgeData(history_file=args.history_file)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
+    if args.cold_start:
+        offsets = fridge_data.Load_Files(patterns, processes=args.processes)
+    else:
+        offsets = fridge_data.Resume_Files(patterns, processes=args.processes)
+    log_tails = {}
+    for input_file, offset in offsets.items():
+        log_tails[input_file] = LogTail(input_file)
+        log_tails[input_file].Mark_Read(offset)
+
+    fridge_server = FridgeServer(fridge_data, patterns=patterns, log_tails=log_tails, poll_interval=args.poll)
+    try:
+        asyncio.run(fridge_server.Serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        fridge_data.Close()
@@ -0,0 +1,202 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/10/2020
+Project: Rigetti
+File: FridgeSketch.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Streaming quantile sketch for cycle phase durations (p50/p95/p99 without keeping or sorting
+    every value), after DDSketch.
+
+    Values are counted in logarithmically sized buckets, so any quantile comes back within a
+    relative error of relative_accuracy of the true value.  Since a bucket is only a count,
+    values can be removed again (a corrected cycle takes its old durations out) and two
+    sketches merge by adding counts (per fridge sketches into the fleet's, or the sketches
+    of worker processes).  Memory is bounded by the number of buckets: durations from a
+    second to years need well under a thousand at 1% accuracy, and past max_buckets the
+    lowest buckets are folded together.
+"""
+import bisect
+import itertools
+import math
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MAX_BUCKETS = 2048
+QUANTILES = {'p50': 0.50, 'p95': 0.95, 'p99': 0.99}
+# Taken off quantile * count before rounding it up to a rank, for floating point error
+RANK_SLACK = 1e-9
+
+
+class QuantileSketch(object):
+    """
+    Mergeable quantile sketch with deletes, for numbers of either sign
+    """
+    __slots__ = ('relative_accuracy', 'max_buckets', '_log_gamma', '_positive', '_negative', '_zero_count',
+                 '_count', '_lowest_index', '_sorted_indexes')
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, max_buckets: int = DEFAULT_MAX_BUCKETS):
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(gamma)
+        # {bucket index: count}, bucket i holds magnitudes in (gamma^(i-1), gamma^i]
+        self._positive = {}
+        self._negative = {}
+        self._zero_count = 0
+        self._count = 0
+        # Once buckets have been folded together, magnitudes below this bucket are counted in it
+        self._lowest_index = None
+        # (negative indexes descending, positive ascending), until a bucket is added or emptied
+        self._sorted_indexes = None
+
+    def _Index(self, magnitude: float) -> int:
+        index = math.ceil(math.log(magnitude) / self._log_gamma)
+        if self._lowest_index is not None and index < self._lowest_index:
+            index = self._lowest_index
+        return index
+
+    def _Value(self, index: int) -> float:
+        gamma = math.exp(self._log_gamma)
+        return 2 * gamma ** index / (gamma + 1)
+
+    def Add(self, value: float, count: int = 1):
+        self._count += count
+        if value == 0:
+            self._zero_count += count
+            return
+        buckets = self._positive if value > 0 else self._negative
+        index = self._Index(abs(value))
+        if index in buckets:
+            buckets[index] += count
+            return
+        buckets[index] = count
+        self._sorted_indexes = None
+        if len(self._positive) + len(self._negative) > self.max_buckets:
+            self._Fold()
+
+    def Remove(self, value: float, count: int = 1):
+        """
+        Take out a value added before
+        """
+        if value > 0:
+            buckets = self._positive
+        elif value < 0:
+            buckets = self._negative
+        else:
+            self._zero_count -= count
+            self._count -= count
+            return
+        index = self._Index(abs(value))
+        remaining = buckets.get(index, 0) - count
+        if remaining > 0:
+            buckets[index] = remaining
+        else:
+            buckets.pop(index, None)
+            self._sorted_indexes = None
+        self._count -= count
+
+    def Merge(self, other: 'QuantileSketch'):
+        """
+        Add the counts of another sketch (of the same accuracy) into this one
+        """
+        self._Combine(other, 1)
+
+    def Subtract(self, other: 'QuantileSketch'):
+        """
+        Take the counts of another sketch, merged in before, back out of this one
+        """
+        self._Combine(other, -1)
+
+    def _Combine(self, other: 'QuantileSketch', sign: int):
+        if other._lowest_index is not None and (self._lowest_index is None or other._lowest_index > self._lowest_index):
+            self._lowest_index = other._lowest_index
+            self._Fold_Below(self._positive, self._lowest_index)
+            self._Fold_Below(self._negative, self._lowest_index)
+        for buckets, other_buckets in ((self._positive, other._positive), (self._negative, other._negative)):
+            for index, count in other_buckets.items():
+                index = self._lowest_index if self._lowest_index is not None and index < self._lowest_index else index
+                combined = buckets.get(index, 0) + sign * count
+                if combined > 0:
+                    buckets[index] = combined
+                else:
+                    buckets.pop(index, None)
+        self._zero_count += sign * other._zero_count
+        self._count += sign * other._count
+        self._sorted_indexes = None
+        if len(self._positive) + len(self._negative) > self.max_buckets:
+            self._Fold()
+
+    def _Fold(self):
+        """
+        Fold the lowest magnitude buckets together until there are max_buckets
+        """
+        indexes = sorted(set(self._positive) | set(self._negative))
+        self._lowest_index = indexes[len(indexes) - self.max_buckets]
+        self._Fold_Below(self._positive, self._lowest_index)
+        self._Fold_Below(self._negative, self._lowest_index)
+        self._sorted_indexes = None
+
+    @staticmethod
+    def _Fold_Below(buckets: dict, lowest_index: int):
+        folded = 0
+        for index in [index for index in buckets if index < lowest_index]:
+            folded += buckets.pop(index)
+        if folded:
+            buckets[lowest_index] = buckets.get(lowest_index, 0) + folded
+
+    def Count(self) -> int:
+        return self._count
+
+    def Quantile(self, quantile: float) -> float:
+        """
+        Value at a quantile (0 to 1), by the nearest rank convention: the ceil(quantile * count)-th
+        smallest value (the smallest for 0). None if the sketch is empty
+        """
+        return self._Values_At([quantile])[0]
+
+    def Quantiles(self) -> dict:
+        """
+        {'p50': ..., 'p95': ..., 'p99': ...}, in one pass over the buckets
+        """
+        return dict(zip(QUANTILES, self._Values_At(list(QUANTILES.values()))))
+
+    def _Values_At(self, quantiles: list) -> list:
+        """
+        Values at ascending quantiles
+        """
+        if self._count <= 0:
+            return [None] * len(quantiles)
+        # Buckets from the most negative value up, and the running count through them
+        if self._sorted_indexes is None:
+            self._sorted_indexes = (sorted(self._negative, reverse=True), sorted(self._positive))
+        negative, positive = self._sorted_indexes
+        counts = list(map(self._negative.__getitem__, negative))
+        counts.append(self._zero_count)
+        counts.extend(map(self._positive.__getitem__, positive))
+        running = list(itertools.accumulate(counts))
+        values = []
+        for quantile in quantiles:
+            # Nearest rank: the ceil(quantile * count)-th smallest value (at least the first), in the
+            # first bucket whose running count reaches it; past the end only when counts are out of
+            # step (more removed than added). The slack keeps e.g. 0.07 * 100 from rounding up past 7.
+            rank = max(1, math.ceil(quantile * self._count - RANK_SLACK))
+            i = min(bisect.bisect_left(running, rank), len(running) - 1)
+            if i < len(negative):
+                values.append(-self._Value(negative[i]))
+            elif i == len(negative):
+                values.append(0.0)
+            else:
+                values.append(self._Value(positive[i - len(negative) - 1]))
+        return values
+
+    def __getstate__(self):
+        return (self.relative_accuracy, self.max_buckets, self._positive, self._negative, self._zero_count,
+                self._count, self._lowest_index)
+
+    def __setstate__(self, state):
+        (self.relative_accuracy, self.max_buckets, self._positive, self._negative, self._zero_count,
+         self._count, self._lowest_index) = state
+        self._log_gamma = math.log((1 + self.relative_accuracy) / (1 - self.relative_accuracy))
+        self._sorted_indexes = None
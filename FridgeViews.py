@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/16/2020
+Project: Rigetti
+File: FridgeViews.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Lazy views over a fridge's cycles and rankings of cycles by phase duration, so that showing
+    a few cycles costs in proportion to the cycles shown rather than to the fridge's history.
+
+    A CycleView is a read-only mapping over a range of positions of a fridge's sorted cycle
+    ids; nothing is copied, and a record is only looked up when it is used.  A CycleRankIndex
+    keeps (duration, cycle) of one fridge's cycles for one phase in order, updated cycle by
+    cycle as they change, so the longest or shortest cycles come off its ends.  Top_Cycles
+    merges the rankings of several fridges lazily, for "the 10 slowest cooldowns fleet-wide"
+    in O(fridges + n log fridges).
+"""
+import bisect
+import heapq
+import itertools
+from collections.abc import Mapping
+
+# Phase names taken on the command line, and the cycle durations they stand for
+PHASE_NAMES = {'cooldown': 'cooldown_time', 'running': 'running_time', 'warmup': 'warmup_time',
+               'wait': 'next_cycle_wait_time'}
+
+
+class CycleView(Mapping):
+    """
+    Read-only {cycle: record} over positions of a fridge's sorted cycle ids, in cycle order.
+    It reads the store it was made from as it is, so use it before the store is next updated.
+    """
+    __slots__ = ('_cycles', '_cycle_ids', '_positions')
+
+    def __init__(self, cycles: dict, cycle_ids: list, positions: range):
+        """
+        :param cycles: {cycle: record} of the fridge
+        :param cycle_ids: its cycle ids (or those of a time window), sorted
+        :param positions: positions in cycle_ids the view covers
+        """
+        self._cycles = cycles
+        self._cycle_ids = cycle_ids
+        self._positions = positions
+
+    def _Position(self, cycle_id) -> int:
+        positions = self._positions
+        i = bisect.bisect_left(self._cycle_ids, cycle_id, positions.start, positions.stop)
+        if i < positions.stop and self._cycle_ids[i] == cycle_id:
+            return i
+        return None
+
+    def __getitem__(self, cycle_id):
+        if self._Position(cycle_id) is None:
+            raise KeyError(cycle_id)
+        return self._cycles[cycle_id]
+
+    def __contains__(self, cycle_id) -> bool:
+        return self._Position(cycle_id) is not None
+
+    def __iter__(self):
+        cycle_ids = self._cycle_ids
+        for i in self._positions:
+            yield cycle_ids[i]
+
+    def __len__(self) -> int:
+        return len(self._positions)
+
+    def __repr__(self):
+        return f"CycleView({len(self)} cycles)"
+
+
+class CycleRankIndex(object):
+    """
+    (duration, cycle) of one fridge's cycles in one phase, kept in order. Cycles with no duration
+    in the phase (the last cycle has no wait) are left out.
+    """
+    __slots__ = ('phase', 'entries', 'durations')
+
+    def __init__(self, phase: str, cycles: dict = None):
+        """
+        :param phase: 'cooldown_time', 'running_time', 'warmup_time' or 'next_cycle_wait_time'
+        :param cycles: {cycle: CycleRecord or dict} to start from
+        """
+        self.phase = phase
+        # {cycle: duration} of the cycles in entries
+        self.durations = {}
+        if cycles:
+            for cycle_id, cycle in cycles.items():
+                duration = cycle[phase]
+                if duration is not None:
+                    self.durations[cycle_id] = duration
+        self.entries = sorted((duration, cycle_id) for cycle_id, duration in self.durations.items())
+
+    def Set(self, cycle_id, duration):
+        """
+        Move a cycle to where its (new) duration ranks it; None takes it out
+        """
+        old_duration = self.durations.get(cycle_id)
+        if old_duration == duration:
+            return
+        if old_duration is not None:
+            del self.entries[bisect.bisect_left(self.entries, (old_duration, cycle_id))]
+            del self.durations[cycle_id]
+        if duration is not None:
+            bisect.insort(self.entries, (duration, cycle_id))
+            self.durations[cycle_id] = duration
+
+    def Ranked(self, smallest: bool = False):
+        """
+        Iterator over (duration, cycle), longest first (shortest first with smallest)
+        """
+        return iter(self.entries) if smallest else reversed(self.entries)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def _Tagged(fridge_id: int, ranked):
+    for duration, cycle_id in ranked:
+        yield duration, fridge_id, cycle_id
+
+
+def Top_Cycles(ranked_by_fridge: dict, n: int, smallest: bool = False) -> list:
+    """
+    The n longest (or shortest) of several fridges' rankings together
+    :param ranked_by_fridge: {fridge_id: iterator over (duration, cycle) as CycleRankIndex.Ranked gives}
+    :param n: how many
+    :param smallest: shortest instead of longest
+    :return:
+    List of (duration, fridge_id, cycle), longest first (shortest first with smallest)
+    """
+    streams = [_Tagged(fridge_id, ranked) for fridge_id, ranked in ranked_by_fridge.items()]
+    return list(itertools.islice(heapq.merge(*streams, reverse=not smallest), n))
+
+
+def Last_Cycles(cycles: dict, n: int) -> CycleView:
+    """
+    View of the last n cycles of a {cycle: record} dict (e.g. of a history record), found
+    without sorting all the cycle ids
+    """
+    cycle_ids = sorted(heapq.nlargest(n, cycles))
+    return CycleView(cycles, cycle_ids, range(len(cycle_ids)))
+
+
+def Top_Cycles_Of(fridge_ids, cycles_of, phase: str, n: int, smallest: bool = False) -> list:
+    """
+    The n longest (or shortest) cycles in a phase of fridges that have no rankings (a history
+    record, an archive), in one pass over their cycles, a fridge at a time
+    :param fridge_ids: fridges to go through
+    :param cycles_of: function giving {cycle: CycleRecord or dict} of a fridge
+    :return:
+    List of (duration, fridge_id, cycle, record), longest first (shortest first with smallest)
+    """
+    def Entries():
+        for fridge_id in fridge_ids:
+            for cycle_id, cycle in (cycles_of(fridge_id) or {}).items():
+                duration = cycle[phase]
+                if duration is not None:
+                    yield duration, fridge_id, cycle_id, cycle
+
+    select = heapq.nsmallest if smallest else heapq.nlargest
+    return select(n, Entries(), key=lambda entry: entry[:3])
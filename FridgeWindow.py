@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+
+"""
+Author:  Stephen Montsaroff
+Created: 12/09/2020
+Project: Rigetti
+File: FridgeWindow.py
+Copyright (c) Stephen Montsaroff 2020
+Description:
+    Per fridge index for summaries over a time window ("last 30 days", "Q3").
+
+    The cycles of a fridge are laid out in cycle order with their start and end times and
+    prefix sums of the time spent in each phase (cooldown, running, warmup and the wait
+    after the cycle).  When the cycles follow one another in time, as they do in a real
+    log, the cycles inside a window are found by bisection and their phases summed from
+    the prefix sums, with only the cycle (and wait) straddling each edge clipped by hand,
+    so any window costs O(log n).  Logs whose cycles overlap or run out of order are still
+    answered correctly, by going through every cycle.
+"""
+import bisect
+
+PHASES = ['cooldown_time', 'running_time', 'warmup_time', 'next_cycle_wait_time']
+
+
+def _Overlap(interval_start: int, interval_end: int, start: int, end: int) -> int:
+    return max(0, min(interval_end, end) - max(interval_start, start))
+
+
+class CycleWindowIndex(object):
+    """
+    Start/end times and phase prefix sums of one fridge's cycles, in cycle order. Times are epoch seconds.
+    """
+    def __init__(self):
+        self.cycle_ids = []
+        # Phase boundaries of each cycle: cooldown_start, cooldown_end, warmup_start, warmup_end
+        self.boundaries = []
+        self.starts = []
+        self.ends = []
+        # prefix[phase][i] is the time spent in that phase by cycles 0 .. i-1
+        self.prefix = {phase: [0] for phase in PHASES}
+        # Number of cycles 0 .. i-1 out of time order (overlapping the one before, or out of order inside)
+        self.unordered = [0]
+
+    def Rebuild_From(self, position: int, cycle_ids: list, cycles: dict):
+        """
+        Redo the entries from position on (and the one before, whose wait depends on it), for
+        cycles changed or inserted there
+        :param position: first position in cycle_ids that changed
+        :param cycle_ids: sorted cycle ids of the fridge
+        :param cycles: {cycle: CycleRecord}
+        """
+        position = max(0, min(position - 1, len(self.cycle_ids)))
+        del self.cycle_ids[position:]
+        del self.boundaries[position:]
+        del self.starts[position:]
+        del self.ends[position:]
+        for phase in PHASES:
+            del self.prefix[phase][position + 1:]
+        del self.unordered[position + 1:]
+
+        for i in range(position, len(cycle_ids)):
+            cycle = cycles[cycle_ids[i]]
+            cooldown_start, cooldown_end = cycle.cooldown_start, cycle.cooldown_end
+            warmup_start, warmup_end = cycle.warmup_start, cycle.warmup_end
+            if i + 1 < len(cycle_ids):
+                wait = cycles[cycle_ids[i + 1]].cooldown_start - warmup_end
+            else:
+                wait = 0
+            ordered = cooldown_start <= cooldown_end <= warmup_start <= warmup_end and wait >= 0 and \
+                (i == 0 or self.ends[i - 1] <= cooldown_start)
+            self.cycle_ids.append(cycle_ids[i])
+            self.boundaries.append((cooldown_start, cooldown_end, warmup_start, warmup_end))
+            self.starts.append(cooldown_start)
+            self.ends.append(warmup_end)
+            self.prefix['cooldown_time'].append(self.prefix['cooldown_time'][-1] + cooldown_end - cooldown_start)
+            self.prefix['running_time'].append(self.prefix['running_time'][-1] + warmup_start - cooldown_end)
+            self.prefix['warmup_time'].append(self.prefix['warmup_time'][-1] + warmup_end - warmup_start)
+            self.prefix['next_cycle_wait_time'].append(self.prefix['next_cycle_wait_time'][-1] + wait)
+            self.unordered.append(self.unordered[-1] + (0 if ordered else 1))
+
+    def _Clipped(self, i: int, start: int, end: int, totals: dict):
+        """
+        Add the parts of cycle i (and the wait after it) inside [start, end) to totals
+        """
+        cooldown_start, cooldown_end, warmup_start, warmup_end = self.boundaries[i]
+        totals['cooldown_time'] += _Overlap(cooldown_start, cooldown_end, start, end)
+        totals['running_time'] += _Overlap(cooldown_end, warmup_start, start, end)
+        totals['warmup_time'] += _Overlap(warmup_start, warmup_end, start, end)
+        if i + 1 < len(self.starts):
+            totals['next_cycle_wait_time'] += _Overlap(warmup_end, self.starts[i + 1], start, end)
+
+    def Positions(self, start: int, end: int) -> range:
+        """
+        Positions of the cycles overlapping [start, end), in cycle order. Only for ordered cycles.
+        """
+        return range(bisect.bisect_right(self.ends, start), bisect.bisect_left(self.starts, end))
+
+    def Is_Ordered(self) -> bool:
+        return self.unordered[-1] == 0
+
+    def Window_Cycle_Ids(self, start: int, end: int) -> list:
+        """
+        Ids of the cycles overlapping [start, end)
+        """
+        if self.Is_Ordered():
+            return [self.cycle_ids[i] for i in self.Positions(start, end)]
+        return [self.cycle_ids[i] for i in range(len(self.cycle_ids))
+                if self.starts[i] < end and self.ends[i] > start]
+
+    def Summary(self, start: int, end: int) -> tuple:
+        """
+        Time spent in each phase within [start, end)
+        :return:
+        (number of cycles overlapping the window, time the fridge's history covers within it,
+        {phase: seconds}), or None if no cycle overlaps the window
+        """
+        if not self.cycle_ids:
+            return None
+        totals = {phase: 0 for phase in PHASES}
+        if self.Is_Ordered():
+            positions = self.Positions(start, end)
+            lo, hi = positions.start, positions.stop
+            # Waits before the first cycle and after the last one in the window (or the one wait
+            # the whole window falls in) may be cut by the window edges
+            edges = set(i for i in (lo - 1, hi - 1) if 0 <= i < len(self.starts) - 1)
+            if hi - lo > 2:
+                # Cycles (and the waits after them) wholly inside the window
+                for phase in PHASES:
+                    totals[phase] += self.prefix[phase][hi - 1] - self.prefix[phase][lo + 1]
+                clipped = [lo, hi - 1]
+            else:
+                clipped = list(positions)
+            for i in clipped:
+                self._Clipped(i, start, end, totals)
+                edges.discard(i)
+            for i in edges:
+                totals['next_cycle_wait_time'] += _Overlap(self.ends[i], self.starts[i + 1], start, end)
+            number_of_cycles = len(positions)
+        else:
+            number_of_cycles = 0
+            for i in range(len(self.cycle_ids)):
+                if self.starts[i] < end and self.ends[i] > start:
+                    number_of_cycles += 1
+                self._Clipped(i, start, end, totals)
+        if number_of_cycles == 0:
+            return None
+        # Same span as the whole history summary (first cycle's start to last cycle's end), clipped
+        total_time = _Overlap(self.starts[0], self.ends[-1], start, end)
+        return number_of_cycles, total_time, totals
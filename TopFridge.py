@@ -11,12 +11,77 @@ Description:
 import os
 import time
 import argparse
+import cProfile
+import pstats
+import threading
 from watchdog.observers import Observer
 from watchdog.events import PatternMatchingEventHandler
-from FridgeData import FridgeData, FrigeOutput
+from FridgeData import FridgeData, Write_Fridge_Output, Fridge_Output_Blocks, Expand_Log_Paths, FormatUpdateStats
+from FridgeLogTail import LogTail
+from FridgeScreen import FridgeScreen, DEFAULT_FPS, curses
+from FridgeViews import PHASE_NAMES
 import sys
+from datetime import datetime
+
+# Updates shown in the --profile table
+PROFILE_ROWS = 10
+
+
+class UpdateProfiler(object):
+    """
+    Runs the first so many updates (and redraws) under cProfile, then writes the profile out
+    """
+    def __init__(self, updates: int, output_file: str):
+        self._remaining = updates
+        self._output_file = output_file
+        self._profile = cProfile.Profile() if updates > 0 else None
+
+    def Run(self, function, *args, **kwargs):
+        if self._remaining <= 0:
+            return function(*args, **kwargs)
+        self._profile.enable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            self._profile.disable()
+            self._remaining -= 1
+            if self._remaining == 0:
+                self._profile.dump_stats(self._output_file)
+                print(f"Profile of the first updates written to {self._output_file}")
+                pstats.Stats(self._profile).sort_stats('cumulative').print_stats(20)
+
+
+def Show_Update(fridge_data: FridgeData, profile: bool, screen: FridgeScreen = None, **kwargs):
+    """
+    Write out the fridge data, and with profile the timings of the last updates. With a screen,
+    hand the blocks to it to draw instead.
+    """
+    render_start = time.perf_counter()
+    if screen is not None:
+        blocks = list(Fridge_Output_Blocks(fridge_data, **kwargs))
+        if profile:
+            blocks.append(FormatUpdateStats(fridge_data.Get_Stats()['recent'][-PROFILE_ROWS:]))
+        stats = fridge_data.Get_Stats()['recent'][-1]
+        screen.Set_Blocks(blocks, f" TopFridge  {datetime.now():%Y-%m-%d %H:%M:%S}  "
+                                  f"{len(fridge_data.List_Fridges() or [])} fridges  last {stats['kind']}: "
+                                  f"{stats['lines']:,} lines, {stats['total_s'] * 1000:.1f} ms")
+        fridge_data.Record_Phase('render', time.perf_counter() - render_start)
+        return
+    Write_Fridge_Output(fridge_data, sys.stdout, **kwargs)
+    sys.stdout.flush()
+    fridge_data.Record_Phase('render', time.perf_counter() - render_start)
+    if profile:
+        print("\n" + FormatUpdateStats(fridge_data.Get_Stats()['recent'][-PROFILE_ROWS:]))
+
 
 class TopFridgeHandler(PatternMatchingEventHandler):
+    """
+    Watchdog handler that updates and redraws the fridge data as the logs change.
+
+    The observer thread only notes which files changed. A single worker thread waits out a
+    debounce window after the first change, so a burst of events (watchdog often sends several
+    for one write) is handled by one Update and one redraw, off the observer thread.
+    """
     def __init__(self, patterns, fridge_data, **kwargs):
         super().__init__(patterns)
         self._fridge_data = fridge_data
@@ -24,82 +89,286 @@ class TopFridgeHandler(PatternMatchingEventHandler):
         self._selected_cycle = -1
         self._show_summary = True
         self._show_cycles = True
-    
+        self._start = None
+        self._end = None
+        self._last = None
+        self._top = None
+        self._top_n = 10
+        # {path: LogTail} of the logs being followed; None re-reads whole files
+        self._log_tails = None
+        self._debounce = 0.25
+        self._profile = False
+        self._profiler = None
+        # FridgeScreen drawing the output, None to print it
+        self._screen = None
+
+        if 'screen' in kwargs:
+            self._screen = kwargs['screen']
+        if 'profile' in kwargs:
+            self._profile = kwargs['profile']
+        if 'profiler' in kwargs:
+            self._profiler = kwargs['profiler']
+        if 'start' in kwargs:
+            self._start = kwargs['start']
+        if 'end' in kwargs:
+            self._end = kwargs['end']
+        if 'last' in kwargs:
+            self._last = kwargs['last']
+        if 'top' in kwargs:
+            self._top = kwargs['top']
+        if 'top_n' in kwargs:
+            self._top_n = kwargs['top_n']
+        if 'debounce' in kwargs:
+            self._debounce = kwargs['debounce']
+        if 'log_tails' in kwargs:
+            self._log_tails = kwargs['log_tails']
         if 'cycle' in kwargs:
             self._selected_cycle = kwargs['cycle']
         if 'fridge_id' in kwargs:
             self._selected_fridge_id = kwargs['fridge_id']
-        if 'self._showCycles' in kwargs:
-            self._showCycles = kwargs['showCycles']
-        if 'self._showSummary' in kwargs:
-            self._showSummary = kwargs['showSummary']
+        if 'showCycles' in kwargs:
+            self._show_cycles = kwargs['showCycles']
+        if 'showSummary' in kwargs:
+            self._show_summary = kwargs['showSummary']
+
+        # Files changed (in the order first seen) and events received since the worker last ran
+        self._pending_lock = threading.Lock()
+        self._pending_paths = []
+        self._pending_events = 0
+        self._wake = threading.Event()
+        self._stopping = False
+        self._worker = threading.Thread(target=self._Work, name='TopFridgeWorker', daemon=True)
+        self._worker.start()
+
+    def Stop(self):
+        """
+        Stop the worker, once it has finished anything it is doing
+        """
+        self._stopping = True
+        self._wake.set()
+        self._worker.join()
+
+    def _Report(self, message: str):
+        """
+        Print a message, or with a screen show it in its footer
+        """
+        if self._screen is not None:
+            self._screen.Set_Status(message)
+        else:
+            print(message)
 
     def on_deleted(self, event):
         super(TopFridgeHandler, self).on_deleted(event)
-        print("Exiting: File %s was just deleted" % event.src_path)
+        self._Report("Exiting: File %s was just deleted" % event.src_path)
         sys.exit(0)
 
     def on_modified(self, event):
         super(TopFridgeHandler, self).on_modified(event)
-        print("File %s was just modified" % event.src_path)
+        with self._pending_lock:
+            if event.src_path not in self._pending_paths:
+                self._pending_paths.append(event.src_path)
+            self._pending_events += 1
+        self._wake.set()
 
-        lines = open(event.src_path, "r").readlines()
-        self._fridge_data.Update(lines)
-        print(FrigeOutput(self._fridge_data,
-                        showSummary=self._show_summary, showCycles=self._show_cycles,
-                        cycles=self._selected_cycle, fridge_id=self._selected_fridge_id))
+    def _Work(self):
+        while True:
+            self._wake.wait()
+            if self._stopping:
+                return
+            # Let the rest of a burst arrive, it all goes into one update
+            time.sleep(self._debounce)
+            with self._pending_lock:
+                self._wake.clear()
+                paths = self._pending_paths
+                events = self._pending_events
+                self._pending_paths = []
+                self._pending_events = 0
+            try:
+                if self._profiler is not None:
+                    self._profiler.Run(self._Process, paths, events)
+                else:
+                    self._Process(paths, events)
+            except Exception as e:
+                self._Report(f"Error updating from {', '.join(paths)}: {e}")
+
+    def _Process(self, paths: list, events: int):
+        lines = []
+        for path in paths:
+            self._Report("File %s was just modified" % path)
+            if self._log_tails is not None:
+                if path not in self._log_tails:
+                    # A new log matching one of the patterns
+                    self._log_tails[path] = LogTail(path)
+                lines.extend(self._log_tails[path].Read_New_Lines())
+            else:
+                lines.extend(open(path, "r").readlines())
+        if events > len(paths):
+            self._Report(f"  ({events} change events coalesced into one update)")
+        if not lines:
+            # Nothing but a partial line (or no change at all) was written
+            return
+        if self._log_tails is not None:
+            self._fridge_data.Update(lines, log_offsets={path: tail.Get_Offset()
+                                                         for path, tail in self._log_tails.items()})
+        else:
+            self._fridge_data.Update(lines)
+        Show_Update(self._fridge_data, self._profile, self._screen,
+                    showSummary=self._show_summary, showCycles=self._show_cycles,
+                    cycle=self._selected_cycle, fridge_id=self._selected_fridge_id,
+                    start=self._start, end=self._end, last=self._last, top=self._top, top_n=self._top_n)
 
 if __name__ == '__main__':
 
     parser = argparse.ArgumentParser(
         description="""
         Implements a 'topc' sort of program for fridge information.
-        Looks for a log file, and updates display as logfile is updated.
+        Looks for one or more log files, and updates display as they are updated.
            """,
         formatter_class=argparse.RawTextHelpFormatter)
 
-    parser.add_argument("input_file",
-                        help="Name of the log file to get data from and monitor.")
+    parser.add_argument("input_files", nargs='+',
+                        help="Names (or glob patterns, quoted) of the log files to get data from and monitor.")
 
     parser.add_argument('--fridge', type=int, default=-1, help= \
         """Select data from specific type=int, Fridge for display.""")
     parser.add_argument('--cycle', type=int, default=-1, help= \
         """Select data from specific cycle for display.""")
 
+    parser.add_argument('--since', default=None, help= \
+        """Only show time from this date/time on (YYYY-MM-DD[ HH:MM:SS]), cycles straddling it are clipped.""")
+    parser.add_argument('--until', default=None, help= \
+        """Only show time before this date/time (YYYY-MM-DD[ HH:MM:SS]).""")
+
+    parser.add_argument('--last', type=int, default=None, help= \
+        """Only list the last so many cycles of each fridge (a --cycle is listed wherever it falls).""")
+    parser.add_argument('--top', choices=sorted(PHASE_NAMES), default=None, help= \
+        """First show the cycles that spent longest in this phase, fleet-wide (or of --fridge).""")
+    parser.add_argument('--top_n', type=int, default=10, help= \
+        """Number of cycles --top shows.""")
+
     parser.add_argument('--no_summary_data', action='store_true',
                         default=False, help="""Suppresses the output for summary data""")
     parser.add_argument('--no_cycle_data', action='store_true',
                         default=False, help="""Suppresses the output for cycle data""")
+    parser.add_argument('--no_follow', action='store_true',
+                        default=False, help="""Re-read the whole log on every change instead of only the appended lines""")
+    parser.add_argument('--columnar', action='store_true',
+                        default=False, help="""Calculate summaries with the NumPy columnar backend (needs numpy)""")
+    parser.add_argument('--verify_summaries', action='store_true',
+                        default=False, help="""Debugging: check every summary against a full recalculation""")
+    parser.add_argument('--debounce', type=float, default=0.25, help= \
+        """Seconds to wait after a change for more before updating, so a burst makes one update.""")
+    parser.add_argument('--profile', action='store_true',
+                        default=False, help="""Show the timings and counters of the last updates after each one""")
+    parser.add_argument('--profile_updates', type=int, default=0, help= \
+        """Run this many updates (the initial load counts) under cProfile and write out the profile.""")
+    parser.add_argument('--profile_file', default="TopFridge.prof", help= \
+        """File the cProfile output is written to.""")
+    parser.add_argument('--processes', type=int, default=None, help= \
+        """Worker processes for loading the logs at startup, default one per CPU.""")
+    parser.add_argument('--screen', action='store_true',
+                        default=False, help="""Full screen display like top, scrolled with the arrow and page keys""")
+    parser.add_argument('--fps', type=float, default=DEFAULT_FPS, help= \
+        """With --screen, most redraws per second.""")
+    parser.add_argument('--cold_start', action='store_true',
+                        default=False, help="""Load the logs in full instead of resuming from the history""")
+    parser.add_argument('--write_behind', action='store_true',
+                        default=False, help="""Write the history journal from a background thread, in batches""")
+    parser.add_argument('--sync_interval', type=float, default=1.0, help= \
+        """With --write_behind, most seconds before a history record is written and fsynced.""")
+    parser.add_argument('--sync_records', type=int, default=50, help= \
+        """With --write_behind, write and fsync once this many history records are waiting.""")
 
     (args, unknown) = parser.parse_known_args()
-    input_file = os.path.abspath(args.input_file)
-    input_dir = os.path.dirname(input_file)
+    patterns = [os.path.abspath(pattern) for pattern in args.input_files]
+    input_files = Expand_Log_Paths(patterns)
+    # Watch the directories of the patterns, and of the files they matched
+    input_dirs = set(os.path.dirname(input_file) for input_file in input_files)
+    input_dirs.update(os.path.dirname(pattern) for pattern in patterns
+                      if not any(c in os.path.dirname(pattern) for c in '*?['))
 
     selected_cycle = args.cycle
     selected_fridge_id = args.fridge
+    top = None if args.top is None else PHASE_NAMES[args.top]
     show_summary = not (args.no_summary_data)
     show_cycle = not (args.no_cycle_data)
+    try:
+        window_start = None if args.since is None else datetime.fromisoformat(args.since)
+        window_end = None if args.until is None else datetime.fromisoformat(args.until)
+    except ValueError as e:
+        print(f"Invalid --since/--until: {e}")
+        sys.exit(1)
 
-    fridge_data = FridgeData()
+    try:
+        fridge_data = FridgeData(columnar=args.columnar, verify_summaries=args.verify_summaries,
+                                 write_behind=args.write_behind,
+                                 sync_interval=args.sync_interval, sync_records=args.sync_records)
+    except ValueError as e:
+        print(e)
+        sys.exit(1)
 
-    lines = open(input_file, "r").readlines()
-    fridge_data.Update(lines)
-    print(FrigeOutput(fridge_data,
-                      showSummary=show_summary, showCycles=show_cycle,
-                      cycles=selected_cycle, fridge_id=selected_fridge_id))
+    profiler = UpdateProfiler(args.profile_updates, args.profile_file)
+    screen = None
+    if args.screen:
+        try:
+            screen = FridgeScreen(args.fps)
+        except ValueError as e:
+            print(e)
+            sys.exit(1)
+
+    def Initial_Load():
+        if args.cold_start:
+            offsets = fridge_data.Load_Files(input_files, processes=args.processes)
+        else:
+            offsets = fridge_data.Resume_Files(input_files, processes=args.processes)
+        Show_Update(fridge_data, args.profile, screen,
+                    showSummary=show_summary, showCycles=show_cycle,
+                    cycle=selected_cycle, fridge_id=selected_fridge_id,
+                    start=window_start, end=window_end, last=args.last, top=top, top_n=args.top_n)
+        return offsets
+
+    try:
+        offsets = profiler.Run(Initial_Load)
+    except KeyboardInterrupt:
+        print("Interrupted, writing out history")
+        fridge_data.Close()
+        sys.exit(1)
+    log_tails = None
+    if not args.no_follow:
+        log_tails = {}
+        for input_file in input_files:
+            log_tails[input_file] = LogTail(input_file)
+            log_tails[input_file].Mark_Read(offsets.get(input_file, 0))
 
     # now set up handlers
-    event_handler = TopFridgeHandler( patterns=[input_file], fridge_data=fridge_data,
+    event_handler = TopFridgeHandler( patterns=patterns, fridge_data=fridge_data, log_tails=log_tails,
+                                      debounce=args.debounce, profile=args.profile, profiler=profiler, screen=screen,
                                       showSummary=show_summary, showCycles=show_cycle,
-                                      cycles=selected_cycle, fridge_id=selected_fridge_id)
+                                      cycle=selected_cycle, fridge_id=selected_fridge_id,
+                                      start=window_start, end=window_end, last=args.last, top=top,
+                                      top_n=args.top_n)
     observer = Observer()
-    observer.schedule(event_handler, path=input_dir, recursive=False)
+    for input_dir in input_dirs:
+        observer.schedule(event_handler, path=input_dir, recursive=False)
     observer.start()
 
     #Now wait for changes
     try:
-        while True:
-            time.sleep(1)
+        if screen is not None:
+            # Anything printed now would be written over the screen
+            fridge_data.Set_Report(screen.Set_Status)
+            try:
+                curses.wrapper(screen.Run)
+            finally:
+                fridge_data.Set_Report(print)
+        else:
+            while True:
+                time.sleep(1)
     except KeyboardInterrupt:
+        print("Stopping, writing out history")
+    finally:
+        # No more events, let any update under way finish, then get the history onto disk
         observer.stop()
-    observer.join()
\ No newline at end of file
+        observer.join()
+        event_handler.Stop()
+        fridge_data.Close()
\ No newline at end of file
@@ -0,0 +1,136 @@
+"""
+CycleArchive reads against the cycle data it was written from
+"""
+import random
+from datetime import datetime
+import pytest
+from FridgeArchive import CycleArchive, Write_Archive, Is_Archive
+from FridgeRecords import CycleRecord
+
+
+def Make_Fridges(rng):
+    fridges = {}
+    for fridge_id in rng.sample(range(-3, 40), 6):
+        cycles = {}
+        t = rng.randint(10 ** 9, 2 * 10 ** 9)
+        # Cycle numbers with gaps, and some fridges with no or one cycle
+        for cycle_id in sorted(rng.sample(range(-5, 200), rng.choice([0, 1, 2, 30]))):
+            times = [t + rng.randint(0, 100)]
+            for _ in range(3):
+                times.append(times[-1] + rng.randint(0, 10 ** 5))
+            t = times[-1] + rng.randint(0, 10 ** 5)
+            cycles[cycle_id] = CycleRecord(fridge_id, cycle_id, *times)
+        fridges[fridge_id] = cycles
+    return fridges
+
+
+def Expected_Cycles(cycles, offset=0, limit=None):
+    """
+    (cycle, timestamps, next_cycle_start) of the cycles from offset on, by slicing the sorted cycle
+    ids and linking each cycle to the one after it among all the fridge's cycles
+    """
+    cycle_ids = sorted(cycles)
+    if offset < 0:
+        offset = max(0, len(cycle_ids) + offset)
+    end = len(cycle_ids) if limit is None else min(len(cycle_ids), offset + limit)
+    expected = []
+    for i in range(offset, end):
+        cycle = cycles[cycle_ids[i]]
+        next_cycle_start = cycles[cycle_ids[i + 1]].cooldown_start if i + 1 < len(cycle_ids) else None
+        expected.append((cycle.cycle, cycle.cooldown_start, cycle.cooldown_end, cycle.warmup_start,
+                         cycle.warmup_end, next_cycle_start))
+    return expected
+
+
+def As_Tuples(cycles):
+    return [(cycle.cycle, cycle.cooldown_start, cycle.cooldown_end, cycle.warmup_start, cycle.warmup_end,
+             cycle.next_cycle_start) for cycle in cycles.values()]
+
+
+@pytest.fixture(params=range(4))
+def archive_and_fridges(tmp_path, request):
+    rng = random.Random(request.param)
+    fridges = Make_Fridges(rng)
+    path = str(tmp_path / 'cycles.archive')
+    timestamp = datetime(2020, 12, 12, 10, 30, 15, 123456)
+    assert Write_Archive(path, fridges, timestamp) == sum(len(cycles) for cycles in fridges.values())
+    archive = CycleArchive(path)
+    yield archive, fridges, timestamp
+    archive.Close()
+
+
+def test_header_and_fridges(archive_and_fridges):
+    archive, fridges, timestamp = archive_and_fridges
+    assert Is_Archive(archive.Get_Path())
+    assert archive.Get_Timestamp() == timestamp
+    assert archive.List_Fridges() == sorted(fridge_id for fridge_id, cycles in fridges.items() if cycles)
+    records = [(cycle.fridge_id, cycle.cycle, cycle.cooldown_start, cycle.cooldown_end, cycle.warmup_start,
+                cycle.warmup_end)
+               for fridge_id in sorted(fridges) for cycle_id, cycle in sorted(fridges[fridge_id].items())]
+    assert list(archive.Records()) == records
+    assert len(archive.Array()) == len(records)
+    for fridge_id, cycles in fridges.items():
+        assert archive.List_Cycles_of_Fridge(fridge_id) == sorted(cycles)
+
+
+def test_cycle_pages_link_across_offset_and_limit(archive_and_fridges):
+    archive, fridges, timestamp = archive_and_fridges
+    for fridge_id in list(fridges) + [999]:
+        cycles = fridges.get(fridge_id, {})
+        number = len(cycles)
+        assert As_Tuples(archive.Get_Fridge_Cycle_Data(fridge_id)) == Expected_Cycles(cycles)
+        for offset in sorted({0, 1, number - 1, number, number + 3, -1, -2, -number, -number - 4}):
+            for limit in [None, 0, 1, 2, 7, number]:
+                got = archive.Get_Fridge_Cycle_Data(fridge_id, offset, limit)
+                assert As_Tuples(got) == Expected_Cycles(cycles, offset, limit), (fridge_id, offset, limit)
+                assert all(cycle.update_timestamp == timestamp for cycle in got.values())
+
+        # Pages one after the other put together are the whole fridge
+        pages = {}
+        for offset in range(0, number, 7):
+            pages.update(archive.Get_Fridge_Cycle_Data(fridge_id, offset, 7))
+        assert As_Tuples(pages) == Expected_Cycles(cycles)
+
+
+def test_get_cycle(archive_and_fridges):
+    archive, fridges, timestamp = archive_and_fridges
+    for fridge_id, cycles in fridges.items():
+        expected = {entry[0]: entry for entry in Expected_Cycles(cycles)}
+        for cycle_id in range(-6, 201):
+            cycle = archive.Get_Cycle(fridge_id, cycle_id)
+            if cycle_id in expected:
+                assert As_Tuples({cycle_id: cycle}) == [expected[cycle_id]]
+            else:
+                assert cycle is None
+    assert archive.Get_Cycle(999, 0) is None
+
+
+def test_summary_matches_summing_the_cycles(archive_and_fridges):
+    archive, fridges, timestamp = archive_and_fridges
+    for fridge_id, cycles in fridges.items():
+        summary = archive.Get_Fridge_Summary_Data(fridge_id)
+        if not cycles:
+            assert summary is None
+            continue
+        expected = Expected_Cycles(cycles)
+        totals = {'cooldown_time': sum(cooldown_end - cooldown_start
+                                       for _, cooldown_start, cooldown_end, _, _, _ in expected),
+                  'running_time': sum(warmup_start - cooldown_end
+                                      for _, _, cooldown_end, warmup_start, _, _ in expected),
+                  'warmup_time': sum(warmup_end - warmup_start
+                                     for _, _, _, warmup_start, warmup_end, _ in expected),
+                  'next_cycle_wait_time': sum(next_start - warmup_end
+                                              for _, _, _, _, warmup_end, next_start in expected
+                                              if next_start is not None)}
+        assert summary.num_of_cycles == len(expected)
+        assert summary.total_time == expected[-1][4] - expected[0][1]
+        assert summary.totals == pytest.approx(totals)
+
+
+def test_truncated_archive_is_refused(tmp_path):
+    path = str(tmp_path / 'cycles.archive')
+    Write_Archive(path, Make_Fridges(random.Random(9)))
+    with open(path, 'r+b') as archive_file:
+        archive_file.truncate(archive_file.seek(0, 2) - 1)
+    with pytest.raises(ValueError):
+        CycleArchive(path)
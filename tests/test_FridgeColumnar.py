@@ -0,0 +1,45 @@
+"""
+Summaries from the columnar store against those from the running totals
+"""
+import random
+from datetime import datetime, timedelta
+import pytest
+from FridgeData import FridgeData
+
+numpy = pytest.importorskip('numpy')
+
+
+def Log_Line(rng, fridge_id, cycle_id):
+    start = datetime(2019, 1, 1) + timedelta(days=rng.randint(0, 400))
+    times = sorted(start + timedelta(minutes=rng.randint(0, 20000)) for _ in range(4))
+    return f"{fridge_id},{cycle_id}," + ",".join(f"{t:%Y-%m-%d %H:%M:%S}" for t in times)
+
+
+def Summary_Values(summary):
+    return summary.num_of_cycles, summary.total_time, summary.totals, summary.averages, summary.percents, \
+        summary.percentiles
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_columnar_summaries_match_running_totals(tmp_path, seed):
+    rng = random.Random(seed)
+    # Sparse and outlying cycle numbers, out of order, with corrections of cycles seen before
+    cycle_ids = [rng.randint(-5, 60) for _ in range(200)] + [99, 10 ** 12, -10 ** 9]
+    lines = [Log_Line(rng, rng.randint(0, 3), rng.choice(cycle_ids)) for _ in range(400)]
+    plain = FridgeData(history_file=str(tmp_path / 'plain.journal'))
+    columnar = FridgeData(history_file=str(tmp_path / 'columnar.journal'), columnar=True, verify_summaries=True)
+    position = 0
+    while position < len(lines):
+        number = rng.randint(1, 40)
+        plain.Update(lines[position:position + number])
+        columnar.Update(lines[position:position + number])
+        position += number
+        for fridge_id in plain.List_Fridges():
+            assert Summary_Values(columnar.Get_Fridge_Summary_Data(fridge_id)) == \
+                   Summary_Values(plain.Get_Fridge_Summary_Data(fridge_id))
+    # The arrays hold a row per cycle, not per cycle number
+    for fridge_id, fridge in columnar._columnar._fridges.items():
+        assert fridge.count == len(plain.Get_Fridge_Cycle_Data(fridge_id))
+        assert len(fridge.cycle_ids) <= 2 * max(16, fridge.count)
+    plain.Close()
+    columnar.Close()
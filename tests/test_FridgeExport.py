@@ -0,0 +1,120 @@
+"""
+Columnar and CSV exports of a FridgeData, with and without the fridge and time window filters,
+read back against the rows of the data exported
+"""
+import csv
+import math
+import os
+from datetime import datetime
+import pytest
+from FridgeData import FridgeData
+from FridgeExport import TABLES, NULL_INT64, Summary_Row, Cycle_Row, Read_Columnar, Read_Schema
+from FridgeLogGenerator import Generate_Log_Lines
+from FridgeRecords import To_Epoch
+
+BLOCK_ROWS = 7
+FILTERS = [
+    (None, None, None),
+    ([1, 3], None, None),
+    (None, datetime(2019, 3, 1), None),
+    (None, None, datetime(2019, 3, 1)),
+    ([0, 2, 9], datetime(2019, 2, 10), datetime(2019, 4, 20, 12, 30)),
+    (None, datetime(2030, 1, 1), None),
+]
+
+
+def Normalized(table, row):
+    """
+    The row with NULL_INT64 and NaN as None, and the int and float columns as such
+    """
+    values = []
+    for (name, column_type), value in zip(TABLES[table], row):
+        if value is None or value == '' or value == NULL_INT64 or (isinstance(value, float) and math.isnan(value)):
+            values.append(None)
+        else:
+            values.append(int(value) if column_type == 'int64' else float(value))
+    return tuple(values)
+
+
+def Expected_Rows(fridge_data, fridge_ids, start, end):
+    """
+    Rows of each table, picking the fridges and the cycles overlapping the window here rather than
+    through the exporter
+    """
+    bounds = (float('-inf') if start is None else To_Epoch(start), float('inf') if end is None else To_Epoch(end))
+    rows = {table: [] for table in TABLES}
+    for fridge_id in sorted(fridge_data.List_Fridges()):
+        if fridge_ids is not None and fridge_id not in fridge_ids:
+            continue
+        summary = fridge_data.Get_Fridge_Summary_Data(fridge_id, start, end)
+        if summary is not None:
+            rows['summaries'].append(Normalized('summaries', Summary_Row(fridge_id, summary)))
+        for cycle_id, cycle in sorted(fridge_data.Get_Fridge_Cycle_Data(fridge_id).items()):
+            if cycle.cooldown_start < bounds[1] and cycle.warmup_end > bounds[0]:
+                rows['cycles'].append(Normalized('cycles', Cycle_Row(cycle)))
+    return rows
+
+
+def Columnar_Rows(path):
+    rows = {table: [] for table in TABLES}
+    for table, block in Read_Columnar(path):
+        assert 0 < len(block['fridge_id']) <= BLOCK_ROWS
+        names = [name for name, column_type in TABLES[table]]
+        rows[table].extend(Normalized(table, row) for row in zip(*[block[name] for name in names]))
+    return rows
+
+
+def Csv_Rows(paths):
+    rows = {table: [] for table in TABLES}
+    for path in paths:
+        table = os.path.basename(path).split('_')[-2]
+        with open(path, newline='') as csv_file:
+            reader = csv.reader(csv_file)
+            assert next(reader) == [name for name, column_type in TABLES[table]]
+            table_rows = [Normalized(table, row) for row in reader]
+        assert 0 < len(table_rows) <= BLOCK_ROWS
+        rows[table].extend(table_rows)
+    return rows
+
+
+@pytest.fixture(scope='module')
+def fridge_data(tmp_path_factory):
+    path = tmp_path_factory.mktemp('export') / 'export.journal'
+    fridge_data = FridgeData(history_file=str(path), report=None)
+    fridge_data.Update(list(Generate_Log_Lines(4, 25, seed=11, out_of_order=0.2, corrections=0.1)))
+    yield fridge_data
+    fridge_data.Close()
+
+
+@pytest.mark.parametrize('fridge_ids, start, end', FILTERS)
+def test_columnar_round_trip(tmp_path, fridge_data, fridge_ids, start, end):
+    path = str(tmp_path / 'fridges.fx')
+    written = fridge_data.Export(path, 'columnar', fridge_ids, start, end, block_rows=BLOCK_ROWS)
+    expected = Expected_Rows(fridge_data, fridge_ids, start, end)
+    assert Columnar_Rows(path) == expected
+    assert written == {table: len(rows) for table, rows in expected.items()}
+    metadata = Read_Schema(path)['metadata']
+    assert metadata['fridges'] == fridge_ids
+    assert metadata['since'] == (None if start is None else str(start))
+    assert metadata['until'] == (None if end is None else str(end))
+    assert not os.path.exists(path + '.tmp')
+
+
+@pytest.mark.parametrize('fridge_ids, start, end', FILTERS)
+def test_csv_round_trip(tmp_path, fridge_data, fridge_ids, start, end):
+    base = str(tmp_path / 'fridges')
+    written = fridge_data.Export(base, 'csv', fridge_ids, start, end, block_rows=BLOCK_ROWS)
+    expected = Expected_Rows(fridge_data, fridge_ids, start, end)
+    paths = sorted(os.path.join(str(tmp_path), name) for name in os.listdir(str(tmp_path)) if name.endswith('.csv'))
+    assert Csv_Rows(paths) == expected
+    assert written == {table: len(rows) for table, rows in expected.items()}
+
+
+def test_filters_pick_what_they_should(fridge_data):
+    everything = Expected_Rows(fridge_data, None, None, None)
+    assert len(everything['summaries']) == 4 and len(everything['cycles']) == 100
+    some = Expected_Rows(fridge_data, [1, 3], None, None)
+    assert {row[0] for row in some['cycles']} == {1, 3} and len(some['cycles']) == 50
+    window = Expected_Rows(fridge_data, None, datetime(2019, 3, 1), None)
+    assert 0 < len(window['cycles']) < 100
+    assert Expected_Rows(fridge_data, None, datetime(2030, 1, 1), None) == {'summaries': [], 'cycles': []}
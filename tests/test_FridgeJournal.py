@@ -0,0 +1,306 @@
+"""
+FridgeJournal recovery and Compact against the states the records were made from
+"""
+import copy
+import os
+import random
+import subprocess
+import sys
+from datetime import datetime, timedelta
+import pytest
+from FridgeData import FridgeData
+from FridgeLogGenerator import Generate_Log_Lines
+from FridgeJournal import FridgeJournal, JournalWriter, Compact, JOURNAL_MAGIC, INDEX_MAGIC, INDEX_ENTRY, \
+    HISTORY_CHECKPOINT, HISTORY_DELTA, Timestamp_Key
+
+
+def Write_History(path, rng, number, checkpoint_every=4):
+    """
+    Append number records, a checkpoint every so many and deltas between, as FridgeData does
+    :return:
+    List of (timestamp, full state after the record) for each record
+    """
+    journal = FridgeJournal(path)
+    state = {'fridge_summary_data': {}, 'fridge_and_cycle_data': {}}
+    states = []
+    checkpoint_offset = None
+    start = datetime(2020, 12, 1)
+    for number in range(number):
+        timestamp = str(start + timedelta(hours=number, microseconds=rng.randint(0, 999999)))
+        changed = {}
+        for _ in range(rng.randint(1, 4)):
+            fridge_id = rng.randint(0, 5)
+            cycle_id = rng.randint(0, 20)
+            changed.setdefault(fridge_id, {})[cycle_id] = rng.random()
+        for fridge_id, cycles in changed.items():
+            state['fridge_and_cycle_data'].setdefault(fridge_id, {}).update(cycles)
+            state['fridge_summary_data'][fridge_id] = len(state['fridge_and_cycle_data'][fridge_id])
+        state['timestamp'] = timestamp
+        if number % checkpoint_every == 0:
+            record = dict(copy.deepcopy(state), kind=HISTORY_CHECKPOINT)
+        else:
+            record = {'timestamp': timestamp, 'kind': HISTORY_DELTA, 'checkpoint_offset': checkpoint_offset,
+                      'fridge_summary_data': {fridge_id: state['fridge_summary_data'][fridge_id]
+                                              for fridge_id in changed},
+                      'fridge_and_cycle_data': changed}
+        offset, length = journal.Append(record)
+        if number % checkpoint_every == 0:
+            checkpoint_offset = offset
+        states.append((timestamp, copy.deepcopy(state)))
+    return states
+
+
+def Full_State(record):
+    return {key: record[key] for key in ['timestamp', 'fridge_summary_data', 'fridge_and_cycle_data']}
+
+
+def State_Of(journal, offset):
+    return Full_State(journal.Read_State(offset))
+
+
+def Assert_Journal_Holds(path, states):
+    journal = FridgeJournal(path)
+    index = journal.Index()
+    assert [key for key, offset, length in index] == [Timestamp_Key(timestamp) for timestamp, state in states]
+    assert [(offset, length) for key, offset, length in index] == journal.Scan()
+    for (key, offset, length), (timestamp, state) in zip(index, states):
+        assert State_Of(journal, offset) == state
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_read_state_rebuilds_every_record(tmp_path, seed):
+    path = str(tmp_path / 'h.journal')
+    states = Write_History(path, random.Random(seed), 30)
+    Assert_Journal_Holds(path, states)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_torn_tail_is_dropped_and_appends_continue(tmp_path, seed):
+    rng = random.Random(seed)
+    path = str(tmp_path / 'h.journal')
+    states = Write_History(path, rng, 12)
+    frames = FridgeJournal(path).Scan()
+    # Cut the journal part way through one of the last records, as a crash mid write would
+    torn = rng.randrange(len(frames) - 3, len(frames))
+    offset, length = frames[torn]
+    with open(path, 'r+b') as journal_file:
+        journal_file.truncate(offset + rng.randint(1, length - 1))
+    kept = states[:torn]
+    Assert_Journal_Holds(path, kept)
+
+    # The next append truncates the torn bytes and lands right after the last good record
+    journal = FridgeJournal(path)
+    state = dict(copy.deepcopy(kept[-1][1]), kind=HISTORY_CHECKPOINT, timestamp=str(datetime(2021, 1, 1)))
+    assert journal.Append(state)[0] == offset
+    Assert_Journal_Holds(path, kept + [(state['timestamp'], Full_State(state))])
+
+
+def test_garbage_after_the_last_record_is_ignored(tmp_path):
+    path = str(tmp_path / 'h.journal')
+    states = Write_History(path, random.Random(1), 6)
+    with open(path, 'ab') as journal_file:
+        journal_file.write(b'FRec\x00\x00\x00\x10not a record')
+    Assert_Journal_Holds(path, states)
+
+
+@pytest.mark.parametrize('damage', ['missing', 'empty', 'torn_entry', 'short', 'stale', 'bad_magic'])
+def test_index_is_rebuilt(tmp_path, damage):
+    rng = random.Random(3)
+    path = str(tmp_path / 'h.journal')
+    index_path = path + '.idx'
+    states = Write_History(path, rng, 10)
+    if damage == 'missing':
+        os.remove(index_path)
+    elif damage == 'empty':
+        open(index_path, 'wb').close()
+    elif damage == 'torn_entry':
+        # Crash while appending an index entry
+        with open(index_path, 'ab') as index_file:
+            index_file.write(b'\x01' * (INDEX_ENTRY.size // 2))
+    elif damage == 'short':
+        # Records written to the journal, their index entries lost
+        with open(index_path, 'r+b') as index_file:
+            index_file.truncate(len(INDEX_MAGIC) + 4 * INDEX_ENTRY.size)
+    elif damage == 'stale':
+        # Journal cut back under the index (e.g. restored from an older copy)
+        frames = FridgeJournal(path).Scan()
+        with open(path, 'r+b') as journal_file:
+            journal_file.truncate(frames[6][0])
+        states = states[:6]
+    elif damage == 'bad_magic':
+        with open(index_path, 'r+b') as index_file:
+            index_file.write(b'XXXXXXXX')
+    Assert_Journal_Holds(path, states)
+    # and the index on disk was put right
+    with open(index_path, 'rb') as index_file:
+        data = index_file.read()
+    assert data[:len(INDEX_MAGIC)] == INDEX_MAGIC
+    assert len(data) == len(INDEX_MAGIC) + len(states) * INDEX_ENTRY.size
+    # and records appended after it are indexed in step
+    journal = FridgeJournal(path)
+    state = dict(copy.deepcopy(states[-1][1]), kind=HISTORY_CHECKPOINT, timestamp=str(datetime(2021, 1, 1)))
+    journal.Append(state)
+    states.append((state['timestamp'], Full_State(state)))
+    Assert_Journal_Holds(path, states)
+
+
+def test_write_behind_matches_direct_appends(tmp_path):
+    path = str(tmp_path / 'direct.journal')
+    states = Write_History(path, random.Random(4), 20)
+    records = [record for offset, record in FridgeJournal(path).Records()]
+
+    behind_path = str(tmp_path / 'behind.journal')
+    writer = JournalWriter(FridgeJournal(behind_path), sync_interval=0.01, sync_records=3)
+    offsets = [writer.Append(record)[0] for record in records]
+    writer.Close()
+    assert offsets == [offset for offset, length in FridgeJournal(path).Scan()]
+    Assert_Journal_Holds(behind_path, states)
+
+
+def Cycle_Times(fridge_and_cycle_data):
+    return {fridge_id: {cycle_id: (cycle.cooldown_start, cycle.cooldown_end, cycle.warmup_start, cycle.warmup_end)
+                        for cycle_id, cycle in cycles.items()}
+            for fridge_id, cycles in fridge_and_cycle_data.items()}
+
+
+def test_write_failure_between_updates_writes_a_checkpoint_next(tmp_path):
+    path = str(tmp_path / 'h.journal')
+    lines = list(Generate_Log_Lines(4, 40, seed=2, corrections=0.1))
+    fridge_data = FridgeData(history_file=path, write_behind=True, sync_interval=60, sync_records=1000)
+    journal = fridge_data.Get_Journal()
+    fridge_data.Update(lines[:60])
+    fridge_data.Flush()
+    fridge_data.Update(lines[60:90])
+
+    # The write of the queued delta fails, as the next update is made
+    write_frames = journal._Write_Frames
+    failures = []
+
+    def Failing_Write_Frames(entries):
+        if not failures:
+            failures.append(entries)
+            raise OSError("disk full")
+        return write_frames(entries)
+    journal._Write_Frames = Failing_Write_Frames
+    fridge_data.Flush()
+    assert failures
+    for start in range(90, len(lines), 30):
+        fridge_data.Update(lines[start:start + 30])
+    fridge_data.Close()
+
+    reopened = FridgeJournal(path)
+    kinds = [record.get('kind') for offset, record in reopened.Records()]
+    assert kinds == [HISTORY_CHECKPOINT, HISTORY_CHECKPOINT] + [HISTORY_DELTA] * (len(kinds) - 2)
+    state = reopened.Read_State(reopened.Index()[-1][1])
+    assert Cycle_Times(state['fridge_and_cycle_data']) == \
+        Cycle_Times({fridge_id: fridge_data.Get_Fridge_Cycle_Data(fridge_id) for fridge_id in fridge_data.List_Fridges()})
+    for fridge_id in fridge_data.List_Fridges():
+        assert state['fridge_summary_data'][fridge_id].totals == fridge_data.Get_Fridge_Summary_Data(fridge_id).totals
+
+
+def test_writer_append_takes_the_checkpoint_after_a_failure(tmp_path):
+    journal = FridgeJournal(str(tmp_path / 'h.journal'))
+    writer = JournalWriter(journal, sync_interval=60, sync_records=1000)
+    timestamp = str(datetime(2020, 12, 1))
+    checkpoint = {'timestamp': timestamp, 'kind': HISTORY_CHECKPOINT, 'fridge_summary_data': {1: 1},
+                  'fridge_and_cycle_data': {1: {0: 0.5}}}
+    offset, length, replaced = writer.Append(checkpoint, lambda: checkpoint)
+    assert not replaced
+    def Failing_Write_Frames(entries):
+        raise OSError("disk full")
+    journal._Write_Frames = Failing_Write_Frames
+    writer.Flush()
+    assert writer.Failures() == 1
+    del journal._Write_Frames
+    delta = {'timestamp': timestamp, 'kind': HISTORY_DELTA, 'checkpoint_offset': offset,
+             'fridge_summary_data': {}, 'fridge_and_cycle_data': {}}
+    # The delta's checkpoint was lost, the checkpoint goes instead; after that deltas are taken again
+    assert writer.Append(delta, lambda: checkpoint) == (offset, length, True)
+    delta['checkpoint_offset'] = offset
+    assert writer.Append(delta, lambda: checkpoint)[2] is False
+    writer.Close()
+    assert [record['kind'] for offset, record in FridgeJournal(journal.Get_Path()).Records()] == \
+        [HISTORY_CHECKPOINT, HISTORY_DELTA]
+
+
+def test_new_journal_starts_with_magic(tmp_path):
+    path = str(tmp_path / 'h.journal')
+    journal = FridgeJournal(path)
+    journal.Append({'timestamp': str(datetime(2020, 12, 1)), 'fridge_summary_data': {}, 'fridge_and_cycle_data': {}})
+    with open(path, 'rb') as journal_file:
+        assert journal_file.read(len(JOURNAL_MAGIC)) == JOURNAL_MAGIC
+    assert len(journal.Index()) == 1
+
+
+@pytest.mark.parametrize('keep_records', [None, 1, 5, 13, 40])
+@pytest.mark.parametrize('checkpoint_records', [1, 3, 50])
+def test_compact_keeps_the_newest_states(tmp_path, keep_records, checkpoint_records):
+    path = str(tmp_path / 'h.journal')
+    states = Write_History(path, random.Random(keep_records or 0), 25)
+    read, written = Compact(path, checkpoint_records=checkpoint_records, keep_records=keep_records)
+    kept = states if keep_records is None else states[-keep_records:]
+    assert (read, written) == (len(states), len(kept))
+    Assert_Journal_Holds(path, kept)
+
+    journal = FridgeJournal(path)
+    kinds = [record.get('kind', HISTORY_CHECKPOINT) for offset, record in journal.Records()]
+    assert kinds[0] == HISTORY_CHECKPOINT
+    # No more than checkpoint_records deltas in a row
+    run = 0
+    for kind in kinds:
+        run = run + 1 if kind == HISTORY_DELTA else 0
+        assert run <= checkpoint_records
+    assert not os.path.exists(path + '.compact') and not os.path.exists(path + '.compact.idx')
+
+
+def test_compact_keeping_nothing_leaves_an_empty_journal(tmp_path):
+    path = str(tmp_path / 'h.journal')
+    states = Write_History(path, random.Random(0), 5)
+    assert Compact(path, keep_days=0) == (len(states), 0)
+    assert FridgeJournal(path).Index() == []
+    Assert_Journal_Holds(path, [])
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="no advisory locks")
+def test_second_writer_is_refused(tmp_path):
+    path = str(tmp_path / 'h.journal')
+    journal = FridgeJournal(path)
+    journal.Append({'timestamp': str(datetime(2020, 12, 1)), 'kind': HISTORY_CHECKPOINT})
+    other = FridgeJournal(path)
+    with pytest.raises(ValueError, match=str(os.getpid())):
+        other.Append({'timestamp': str(datetime(2020, 12, 2)), 'kind': HISTORY_CHECKPOINT})
+    with pytest.raises(ValueError):
+        Compact(path)
+    # Reading needs no lock
+    assert len(other.Index()) == 1
+    journal.Unlock()
+    other.Append({'timestamp': str(datetime(2020, 12, 2)), 'kind': HISTORY_CHECKPOINT})
+    assert len(FridgeJournal(path).Index()) == 2
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="no advisory locks")
+def test_fridge_data_refuses_a_journal_in_use(tmp_path):
+    path = str(tmp_path / 'h.journal')
+    fridge_data = FridgeData(history_file=path, report=None)
+    with pytest.raises(ValueError):
+        FridgeData(history_file=path, report=None)
+    fridge_data.Close()
+    FridgeData(history_file=path, report=None).Close()
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason="no advisory locks")
+def test_journal_held_by_another_process_is_refused(tmp_path):
+    path = str(tmp_path / 'h.journal')
+    holder = subprocess.Popen([sys.executable, '-c', 'import sys; from FridgeJournal import FridgeJournal; '
+                               'journal = FridgeJournal(sys.argv[1]); journal.Lock(); print("locked", flush=True); '
+                               'sys.stdin.read()', path],
+                              cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                              stdin=subprocess.PIPE, stdout=subprocess.PIPE, universal_newlines=True)
+    try:
+        assert holder.stdout.readline().strip() == 'locked'
+        with pytest.raises(ValueError, match=f"process {holder.pid}"):
+            FridgeData(history_file=path, report=None)
+    finally:
+        holder.communicate()
+    # Released when the holder exits
+    FridgeData(history_file=path, report=None).Close()
@@ -0,0 +1,82 @@
+"""
+Load_Files sharded over worker processes against loading in one process and against Update over
+the same lines
+"""
+import os
+import random
+import pytest
+import FridgeData as FridgeDataModule
+from FridgeData import FridgeData
+from FridgeLogGenerator import Generate_Log_Lines
+
+
+def Summary_Values(summary):
+    return summary.num_of_cycles, summary.total_time, summary.totals, summary.averages, summary.percents, \
+        summary.percentiles
+
+
+def State(fridge_data):
+    return {fridge_id: (Summary_Values(fridge_data.Get_Fridge_Summary_Data(fridge_id)),
+                        {cycle: (record.cooldown_start, record.cooldown_end, record.warmup_start, record.warmup_end,
+                                 record.next_cycle_start)
+                         for cycle, record in fridge_data.Get_Fridge_Cycle_Data(fridge_id).items()})
+            for fridge_id in fridge_data.List_Fridges()}
+
+
+@pytest.fixture
+def logs(tmp_path):
+    """
+    Three logs with the lines dealt out between them at random, so every fridge is split across
+    them, and the last correcting cycles of the others
+    """
+    rng = random.Random(7)
+    lines = list(Generate_Log_Lines(5, 40, seed=7, out_of_order=0.2, comments=0.05, invalid=0.05,
+                                    corrections=0.1, header=False))
+    others = list(Generate_Log_Lines(5, 40, seed=8, header=False))
+    pieces = [[], [], []]
+    for line in lines:
+        pieces[rng.randrange(3)].append(line)
+    pieces[2].extend(rng.sample(others, 30))
+    paths = []
+    for number, piece in enumerate(pieces):
+        paths.append(str(tmp_path / f"fridge_{number}.log"))
+        with open(paths[-1], 'w') as log_file:
+            log_file.write("".join(line + "\n" for line in piece))
+    assert all({line.split(',')[0] for line in piece} >= {'0', '1', '2', '3', '4'} for piece in pieces)
+    return paths, [line for piece in pieces for line in piece]
+
+
+@pytest.mark.parametrize('processes', [2, 3])
+def test_sharded_load_matches_one_process(tmp_path, monkeypatch, logs, processes):
+    paths, lines = logs
+    # Several chunks a file, so lines are split across parse workers as well
+    monkeypatch.setattr(FridgeDataModule, 'LOAD_CHUNK_BYTES', 1000)
+    single = FridgeData(history_file=str(tmp_path / 'single.journal'), report=None)
+    single_offsets = single.Load_Files(paths, processes=1)
+    sharded = FridgeData(history_file=str(tmp_path / 'sharded.journal'), report=None)
+    sharded_offsets = sharded.Load_Files(paths, processes=processes)
+    updated = FridgeData(history_file=str(tmp_path / 'updated.journal'), report=None)
+    updated.Update(lines)
+
+    assert sharded_offsets == single_offsets == {path: os.path.getsize(path) for path in paths}
+    assert State(sharded) == State(single) == State(updated)
+    assert Summary_Values(sharded.Get_Fleet_Summary_Data()) == Summary_Values(updated.Get_Fleet_Summary_Data())
+    for stats in [sharded.Get_Stats()['recent'][-1], single.Get_Stats()['recent'][-1]]:
+        assert stats['lines'] == len(lines)
+        assert stats['rejected'] == updated.Get_Stats()['recent'][-1]['rejected']
+    for fridge_data in [single, sharded, updated]:
+        fridge_data.Close()
+
+
+def test_sharded_load_onto_existing_data(tmp_path, logs):
+    paths, lines = logs
+    with open(paths[0]) as log_file:
+        first_lines = log_file.read().splitlines()
+    loaded = FridgeData(history_file=str(tmp_path / 'loaded.journal'), report=None)
+    loaded.Update(first_lines)
+    loaded.Load_Files(paths[1:], processes=2)
+    updated = FridgeData(history_file=str(tmp_path / 'updated.journal'), report=None)
+    updated.Update(lines)
+    assert State(loaded) == State(updated)
+    loaded.Close()
+    updated.Close()
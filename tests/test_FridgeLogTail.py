@@ -0,0 +1,78 @@
+"""
+LogTail following a log that is appended to, part written, truncated and rotated
+"""
+import os
+from FridgeLogTail import LogTail
+
+
+def Append(path, text):
+    with open(path, 'ab') as log_file:
+        log_file.write(text.encode('utf-8'))
+
+
+def test_missing_file_reads_nothing(tmp_path):
+    tail = LogTail(str(tmp_path / 'fridge.log'))
+    assert tail.Read_New_Lines() == []
+    assert tail.Get_Offset() == 0
+
+
+def test_appended_lines(tmp_path):
+    path = str(tmp_path / 'fridge.log')
+    Append(path, "a\nb\n")
+    tail = LogTail(path)
+    assert tail.Read_New_Lines() == ["a\n", "b\n"]
+    assert tail.Read_New_Lines() == []
+    Append(path, "c\n")
+    assert tail.Read_New_Lines() == ["c\n"]
+    assert tail.Get_Offset() == os.path.getsize(path)
+
+
+def test_partial_trailing_line_is_held_back(tmp_path):
+    path = str(tmp_path / 'fridge.log')
+    Append(path, "a\nb")
+    tail = LogTail(path)
+    assert tail.Read_New_Lines() == ["a\n"]
+    assert tail.Get_Offset() == 2
+    Append(path, "cd")
+    assert tail.Read_New_Lines() == []
+    Append(path, "e\nf")
+    assert tail.Read_New_Lines() == ["bcde\n"]
+    Append(path, "\n")
+    assert tail.Read_New_Lines() == ["f\n"]
+
+
+def test_truncated_log_is_read_from_the_top(tmp_path):
+    path = str(tmp_path / 'fridge.log')
+    Append(path, "a\nb\nc\n")
+    tail = LogTail(path)
+    assert tail.Read_New_Lines() == ["a\n", "b\n", "c\n"]
+    with open(path, 'wb') as log_file:
+        log_file.write(b"x\n")
+    assert tail.Read_New_Lines() == ["x\n"]
+    assert tail.Get_Offset() == 2
+
+
+def test_rotated_log_is_read_from_the_top(tmp_path):
+    path = str(tmp_path / 'fridge.log')
+    Append(path, "a\nb\n")
+    tail = LogTail(path)
+    assert tail.Read_New_Lines() == ["a\n", "b\n"]
+    # A new file, longer than what was read of the old one, moved into place
+    rotated = str(tmp_path / 'fridge.log.new')
+    Append(rotated, "x\ny\nz\n")
+    old_inode = os.stat(path).st_ino
+    os.replace(rotated, path)
+    assert os.stat(path).st_ino != old_inode
+    assert tail.Read_New_Lines() == ["x\n", "y\n", "z\n"]
+    Append(path, "w\n")
+    assert tail.Read_New_Lines() == ["w\n"]
+
+
+def test_mark_read_starts_at_the_offset(tmp_path):
+    path = str(tmp_path / 'fridge.log')
+    Append(path, "a\nb\n")
+    tail = LogTail(path)
+    tail.Mark_Read(2)
+    assert tail.Read_New_Lines() == ["b\n"]
+    tail.Reset()
+    assert tail.Read_New_Lines() == ["a\n", "b\n"]
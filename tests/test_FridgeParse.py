@@ -0,0 +1,53 @@
+"""
+Parse_Log_Line, and the reasons it gives Update for the lines it rejects
+"""
+import pytest
+from FridgeData import FridgeData, Parse_Log_Line, Parse_Epoch_Seconds, REJECT_FIELD_COUNT, REJECT_BAD_ID, \
+    REJECT_BAD_TIMESTAMP, REJECT_COOLDOWN_ORDER, REJECT_WARMUP_ORDER
+
+GOOD = "3,7,2019-01-05 08:10:00,2019-01-06 14:27:00,2019-01-10 08:15:00,2019-01-11 09:12:00"
+
+
+def test_good_line():
+    record, reason = Parse_Log_Line(GOOD)
+    assert reason is None
+    assert record == (3, 7, Parse_Epoch_Seconds("2019-01-05 08:10:00"), Parse_Epoch_Seconds("2019-01-06 14:27:00"),
+                      Parse_Epoch_Seconds("2019-01-10 08:15:00"), Parse_Epoch_Seconds("2019-01-11 09:12:00"))
+
+
+@pytest.mark.parametrize('line, reason', [
+    # Bad field count
+    ("3,7,2019-01-05 08:10:00,2019-01-06 14:27:00,2019-01-10 08:15:00", REJECT_FIELD_COUNT),
+    (GOOD + ",2019-01-12 00:00:00", REJECT_FIELD_COUNT),
+    ("3", REJECT_FIELD_COUNT),
+    # Bad ids
+    ("x,7,2019-01-05 08:10:00,2019-01-06 14:27:00,2019-01-10 08:15:00,2019-01-11 09:12:00", REJECT_BAD_ID),
+    ("3,7.5,2019-01-05 08:10:00,2019-01-06 14:27:00,2019-01-10 08:15:00,2019-01-11 09:12:00", REJECT_BAD_ID),
+    # Bad timestamps
+    ("3,7,2019-01-05,2019-01-06 14:27:00,2019-01-10 08:15:00,2019-01-11 09:12:00", REJECT_BAD_TIMESTAMP),
+    ("3,7,2019-01-05 08:10:00,2019-02-30 14:27:00,2019-01-10 08:15:00,2019-01-11 09:12:00", REJECT_BAD_TIMESTAMP),
+    ("3,7,2019-01-05 08:10:00,2019-01-06 24:27:00,2019-01-10 08:15:00,2019-01-11 09:12:00", REJECT_BAD_TIMESTAMP),
+    ("3,7,2019-01-05 08:10:00,2019-01-06 14:27:00,2019-01-10 08:61:00,2019-01-11 09:12:00", REJECT_BAD_TIMESTAMP),
+    ("3,7,2019-01-05 08:10:00,2019-01-06 14:27:00,2019-01-10 08:15:00,", REJECT_BAD_TIMESTAMP),
+    # Out of order times
+    ("3,7,2019-01-06 14:27:01,2019-01-06 14:27:00,2019-01-10 08:15:00,2019-01-11 09:12:00", REJECT_COOLDOWN_ORDER),
+    ("3,7,2019-01-05 08:10:00,2019-01-06 14:27:00,2019-01-11 09:12:00,2019-01-10 08:15:00", REJECT_WARMUP_ORDER),
+])
+def test_rejected_lines(line, reason):
+    assert Parse_Log_Line(line) == (None, reason)
+
+
+def test_unpadded_timestamps_fall_back_to_strptime():
+    assert Parse_Epoch_Seconds("2019-1-5 8:10:00") == Parse_Epoch_Seconds("2019-01-05 08:10:00")
+
+
+def test_update_counts_reject_reasons(tmp_path):
+    fridge_data = FridgeData(history_file=str(tmp_path / 'fridge.journal'), report=None)
+    fridge_data.Update(["#fridge_id,cooldown_number,cooldown_start,cooldown_end,warmup_start,warmup_end", GOOD,
+                        "3,8,2019-01-12", "3,x,2019-01-05 08:10:00,2019-01-06 14:27:00,2019-01-10 08:15:00,",
+                        "3,9,2019-01-13 00:00:00,2019-01-12 00:00:00,2019-01-14 00:00:00,2019-01-15 00:00:00"])
+    stats = fridge_data.Get_Stats()['recent'][-1]
+    assert stats['rejected'] == 3
+    assert stats['rejected_reasons'] == {REJECT_FIELD_COUNT: 1, REJECT_BAD_ID: 1, REJECT_COOLDOWN_ORDER: 1}
+    assert fridge_data.List_Cycles_of_Fridge(3) == [7]
+    fridge_data.Close()
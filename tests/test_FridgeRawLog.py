@@ -0,0 +1,97 @@
+"""
+RawLogStore holding, spilling and dropping batches against the batches added
+"""
+import os
+import random
+import pytest
+from FridgeRawLog import RawLogStore
+
+
+def Random_Batch(rng, number):
+    # Random hex hardly compresses, so the spilled sizes follow the batch sizes
+    return [f"{rng.randint(0, 9)},{rng.getrandbits(256):064x}" for _ in range(number)]
+
+
+def Spill_Files(spill_dir):
+    return sorted(os.listdir(spill_dir)) if os.path.isdir(spill_dir) else []
+
+
+def Assert_Newest_Kept(store, added):
+    """
+    The batches kept are the newest ones added, in order, and the dropped ones are gone
+    """
+    kept = list(store.Batches())
+    assert kept == added[len(added) - len(kept):]
+    assert store.Get_Number_of_Batches() == len(kept)
+    for timestamp, lines in added[:len(added) - len(kept)]:
+        assert store.Get_Batch(timestamp) is None
+    for timestamp, lines in kept:
+        assert store.Get_Batch(timestamp) == lines
+    return kept
+
+
+def test_memory_limits_without_spilling(tmp_path):
+    rng = random.Random(0)
+    store = RawLogStore(max_updates=5, max_bytes=50 * 70)
+    added = []
+    for timestamp in range(40):
+        added.append((timestamp, Random_Batch(rng, rng.randint(0, 20))))
+        store.Add_Batch(*added[-1])
+        assert store.Get_Memory_Bytes() <= 50 * 70 or store.Get_Number_of_Batches() == 0
+        kept = Assert_Newest_Kept(store, added)
+        assert len(kept) <= 5
+        assert store.Get_Memory_Bytes() == sum(len(line) + 1 for timestamp, lines in kept for line in lines)
+    assert store.Get_Spilled_Bytes() == 0
+
+
+def test_spilled_batches_read_back(tmp_path):
+    rng = random.Random(1)
+    spill_dir = str(tmp_path / 'spill')
+    store = RawLogStore(max_updates=3, max_bytes=10 ** 6, spill_dir=spill_dir, spill_max_bytes=10 ** 9)
+    added = []
+    for timestamp in range(30):
+        added.append((timestamp, Random_Batch(rng, rng.randint(0, 10))))
+        store.Add_Batch(*added[-1])
+    assert Assert_Newest_Kept(store, added) == added
+    assert store.Get_Memory_Bytes() == sum(len(line) + 1 for timestamp, lines in added[-3:] for line in lines)
+    assert store.Get_Spilled_Bytes() == sum(os.path.getsize(os.path.join(spill_dir, name))
+                                            for name in Spill_Files(spill_dir))
+    store.Close()
+    assert Spill_Files(spill_dir) == []
+    # Only what was in memory is left
+    assert list(store.Batches()) == added[-3:]
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_spill_eviction_under_spill_max_bytes(tmp_path, seed):
+    rng = random.Random(seed)
+    spill_dir = str(tmp_path / 'spill')
+    spill_max_bytes = 20000
+    store = RawLogStore(max_updates=2, max_bytes=2000, spill_dir=spill_dir, spill_max_bytes=spill_max_bytes)
+    added = []
+    dropped_any = False
+    for timestamp in range(200):
+        added.append((timestamp, Random_Batch(rng, rng.randint(1, 30))))
+        store.Add_Batch(*added[-1])
+        on_disk = sum(os.path.getsize(os.path.join(spill_dir, name)) for name in Spill_Files(spill_dir))
+        assert store.Get_Spilled_Bytes() == on_disk <= spill_max_bytes
+        kept = Assert_Newest_Kept(store, added)
+        dropped_any = dropped_any or len(kept) < len(added)
+    assert dropped_any
+    # Segments are a quarter of the limit, so eviction only drops the oldest part of what was spilled
+    assert store.Get_Spilled_Bytes() > spill_max_bytes // 2
+    store.Close()
+    assert Spill_Files(spill_dir) == []
+
+
+def test_batch_larger_than_spill_max_bytes_is_dropped(tmp_path):
+    rng = random.Random(4)
+    spill_dir = str(tmp_path / 'spill')
+    store = RawLogStore(max_updates=1, spill_dir=spill_dir, spill_max_bytes=1000)
+    store.Add_Batch(0, Random_Batch(rng, 100))
+    store.Add_Batch(1, Random_Batch(rng, 2))
+    store.Add_Batch(2, Random_Batch(rng, 2))
+    assert [timestamp for timestamp, lines in store.Batches()] == [1, 2]
+    assert store.Get_Batch(0) is None
+    assert store.Get_Spilled_Bytes() <= 1000
+    store.Close()
@@ -0,0 +1,86 @@
+"""
+FridgeTotals kept up to date through added, replaced and removed cycles against a recompute over
+the cycles left
+"""
+import random
+import pytest
+from FridgeRecords import CycleRecord, FridgeTotals, PHASES
+
+
+def Random_Cycle(rng, fridge_id, cycle):
+    cooldown_start = rng.randint(0, 10 ** 8)
+    cooldown_end = cooldown_start + rng.randint(0, 10 ** 5)
+    warmup_start = cooldown_end + rng.randint(-100, 10 ** 6)
+    warmup_end = warmup_start + rng.randint(0, 10 ** 5)
+    record = CycleRecord(fridge_id, cycle, cooldown_start, cooldown_end, warmup_start, warmup_end)
+    if rng.random() < 0.8:
+        record.next_cycle_start = warmup_end + rng.randint(0, 10 ** 6)
+    return record
+
+
+def Recompute(cycles):
+    totals = FridgeTotals()
+    for record in cycles.values():
+        totals.Add_Cycle(record)
+        totals.Add_Wait(record)
+    return totals
+
+
+def Assert_Matches(totals, cycles):
+    waits = [record.next_cycle_wait_time for record in cycles.values() if record.next_cycle_start is not None]
+    assert totals.num_of_cycles == len(cycles)
+    assert totals.num_of_waits == len(waits)
+    assert totals.Totals() == {'cooldown_time': sum(record.cooldown_time for record in cycles.values()),
+                               'running_time': sum(record.running_time for record in cycles.values()),
+                               'warmup_time': sum(record.warmup_time for record in cycles.values()),
+                               'next_cycle_wait_time': sum(waits)}
+    recomputed = Recompute(cycles)
+    assert totals.Percentiles() == recomputed.Percentiles()
+    for phase in PHASES:
+        assert totals.sketches[phase].Count() == recomputed.sketches[phase].Count()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_totals_through_replaced_and_removed_cycles(seed):
+    rng = random.Random(seed)
+    totals = FridgeTotals()
+    cycles = {}
+    for step in range(600):
+        cycle = rng.randint(0, 80)
+        if cycle in cycles:
+            old = cycles.pop(cycle)
+            totals.Remove_Wait(old)
+            totals.Remove_Cycle(old)
+        if rng.random() < 0.7:
+            cycles[cycle] = Random_Cycle(rng, 0, cycle)
+            totals.Add_Cycle(cycles[cycle])
+            totals.Add_Wait(cycles[cycle])
+        if step % 50 == 0:
+            Assert_Matches(totals, cycles)
+    Assert_Matches(totals, cycles)
+    # Down to nothing again
+    for record in cycles.values():
+        totals.Remove_Wait(record)
+        totals.Remove_Cycle(record)
+    Assert_Matches(totals, {})
+    assert totals.Percentiles() == {phase: None for phase in PHASES}
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_fleet_totals_merged_and_subtracted(seed):
+    rng = random.Random(seed)
+    fridges = {fridge_id: {cycle: Random_Cycle(rng, fridge_id, cycle) for cycle in range(rng.randint(1, 60))}
+               for fridge_id in range(5)}
+    fridge_totals = {fridge_id: Recompute(cycles) for fridge_id, cycles in fridges.items()}
+    fleet = FridgeTotals()
+    for totals in fridge_totals.values():
+        fleet.Merge(totals)
+    # Replace two fridges, as a fridge's totals are taken out of the fleet's and put back changed
+    for fridge_id in rng.sample(sorted(fridges), 2):
+        fleet.Subtract(fridge_totals[fridge_id])
+        fridges[fridge_id] = {cycle: Random_Cycle(rng, fridge_id, cycle) for cycle in range(rng.randint(1, 60))}
+        fridge_totals[fridge_id] = Recompute(fridges[fridge_id])
+        fleet.Merge(fridge_totals[fridge_id])
+    everything = {(fridge_id, cycle): record for fridge_id, cycles in fridges.items()
+                  for cycle, record in cycles.items()}
+    Assert_Matches(fleet, everything)
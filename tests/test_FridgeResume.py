@@ -0,0 +1,106 @@
+"""
+Resume_Files after the logs were appended to, or had their start rewritten, against loading them
+from scratch
+"""
+import pytest
+from FridgeData import FridgeData
+from FridgeLogGenerator import Generate_Log_Lines
+
+
+def Summary_Values(summary):
+    return summary.num_of_cycles, summary.total_time, summary.totals, summary.averages, summary.percents
+
+
+def Cycle_Values(fridge_data, fridge_id):
+    return {cycle: (record.cooldown_start, record.cooldown_end, record.warmup_start, record.warmup_end,
+                    record.next_cycle_start)
+            for cycle, record in fridge_data.Get_Fridge_Cycle_Data(fridge_id).items()}
+
+
+def Write_Log(path, lines, mode='w'):
+    with open(path, mode) as log_file:
+        log_file.write("".join(line + "\n" for line in lines))
+
+
+def Assert_Matches_Scratch(tmp_path, fridge_data, paths):
+    scratch = FridgeData(history_file=str(tmp_path / 'scratch.journal'), report=None)
+    scratch.Load_Files(paths)
+    assert fridge_data.List_Fridges() == scratch.List_Fridges()
+    for fridge_id in scratch.List_Fridges():
+        assert Summary_Values(fridge_data.Get_Fridge_Summary_Data(fridge_id)) == \
+               Summary_Values(scratch.Get_Fridge_Summary_Data(fridge_id))
+        assert Cycle_Values(fridge_data, fridge_id) == Cycle_Values(scratch, fridge_id)
+    scratch.Close()
+
+
+@pytest.fixture
+def logs(tmp_path):
+    """
+    Two logs loaded into a journal, and the lines not yet in them
+    """
+    lines = list(Generate_Log_Lines(4, 30, seed=3, header=False))
+    first = [line for line in lines if int(line.split(',')[0]) < 2]
+    second = [line for line in lines if int(line.split(',')[0]) >= 2]
+    paths = [str(tmp_path / 'fridge_a.log'), str(tmp_path / 'fridge_b.log')]
+    Write_Log(paths[0], first[:40])
+    Write_Log(paths[1], second[:40])
+    fridge_data = FridgeData(history_file=str(tmp_path / 'h.journal'), report=None)
+    fridge_data.Load_Files(paths)
+    fridge_data.Close()
+    return paths, [first[40:], second[40:]]
+
+
+def Resume(tmp_path, paths):
+    messages = []
+    fridge_data = FridgeData(history_file=str(tmp_path / 'h.journal'), report=messages.append)
+    offsets = fridge_data.Resume_Files(paths)
+    return fridge_data, offsets, messages
+
+
+def test_resume_reads_only_what_was_appended(tmp_path, logs):
+    paths, unread = logs
+    Write_Log(paths[0], unread[0], 'a')
+    Write_Log(paths[1], unread[1][:5], 'a')
+    fridge_data, offsets, messages = Resume(tmp_path, paths)
+    assert any(message.startswith("Resumed") for message in messages)
+    kinds = [(stats['kind'], stats['lines']) for stats in fridge_data.Get_Stats()['recent']]
+    assert kinds == [('resume', 0), ('update', len(unread[0]) + 5)]
+    Assert_Matches_Scratch(tmp_path, fridge_data, paths)
+    fridge_data.Close()
+
+    # And again from the history that resume wrote
+    Write_Log(paths[1], unread[1][5:], 'a')
+    fridge_data, offsets, messages = Resume(tmp_path, paths)
+    assert [stats['kind'] for stats in fridge_data.Get_Stats()['recent']] == ['resume', 'update']
+    Assert_Matches_Scratch(tmp_path, fridge_data, paths)
+    fridge_data.Close()
+
+
+def test_resume_with_nothing_appended(tmp_path, logs):
+    paths, unread = logs
+    fridge_data, offsets, messages = Resume(tmp_path, paths)
+    assert [stats['kind'] for stats in fridge_data.Get_Stats()['recent']] == ['resume']
+    Assert_Matches_Scratch(tmp_path, fridge_data, paths)
+    fridge_data.Close()
+
+
+def test_rewritten_prefix_falls_back_to_a_full_load(tmp_path, logs):
+    paths, unread = logs
+    with open(paths[0]) as log_file:
+        lines = log_file.read().splitlines()
+    # The same length, so only the hash of the start can tell
+    lines[0] = lines[0][:-1] + ('1' if lines[0][-1] != '1' else '2')
+    Write_Log(paths[0], lines + unread[0])
+    fridge_data, offsets, messages = Resume(tmp_path, paths)
+    assert any(message.startswith("Loading the logs in full") for message in messages)
+    assert [stats['kind'] for stats in fridge_data.Get_Stats()['recent']] == ['load']
+    Assert_Matches_Scratch(tmp_path, fridge_data, paths)
+    fridge_data.Close()
+
+
+def test_missing_log_falls_back_to_a_full_load(tmp_path, logs):
+    paths, unread = logs
+    fridge_data, offsets, messages = Resume(tmp_path, paths[:1])
+    assert any(message.startswith("Loading the logs in full") for message in messages)
+    Assert_Matches_Scratch(tmp_path, fridge_data, paths[:1])
+    fridge_data.Close()
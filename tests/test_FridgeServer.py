@@ -0,0 +1,93 @@
+"""
+FridgeServer ETags and 304s, and responses over a connection
+"""
+import asyncio
+import json
+import pytest
+from FridgeData import FridgeData
+from FridgeLogGenerator import Generate_Log_Lines
+from FridgeServer import FridgeServer
+
+
+@pytest.fixture
+def fridge_data(tmp_path):
+    fridge_data = FridgeData(history_file=str(tmp_path / 'fridge.journal'), report=None)
+    lines = list(Generate_Log_Lines(3, 10, seed=1))
+    fridge_data.Update(lines[:20])
+    fridge_data.Update(lines[20:])
+    yield fridge_data
+    fridge_data.Close()
+
+
+def test_matching_etag_gets_a_304(fridge_data):
+    server = FridgeServer(fridge_data)
+    status, etag, body = server.Respond('GET', '/fleet')
+    assert status == 200 and etag and json.loads(body)['fleet']['num_of_cycles'] == 30
+    assert server.Respond('GET', '/fleet', etag) == (304, etag, b'')
+    assert server.Respond('GET', '/fleet', f'"other", {etag}') == (304, etag, b'')
+    assert server.Respond('GET', '/fleet', '"other"') == (200, etag, body)
+
+
+def test_etag_changes_with_the_data_shown(fridge_data):
+    server = FridgeServer(fridge_data)
+    fleet_etag = server.Respond('GET', '/fleet')[1]
+    fridge_etags = {fridge_id: server.Respond('GET', f'/fridges/{fridge_id}')[1] for fridge_id in range(3)}
+    # A new cycle of fridge 1 only
+    fridge_data.Update(["1,10,2030-01-05 08:10:00,2030-01-06 14:27:00,2030-01-10 08:15:00,2030-01-11 09:12:00"])
+    status, etag, body = server.Respond('GET', '/fleet', fleet_etag)
+    assert status == 200 and etag != fleet_etag and json.loads(body)['fleet']['num_of_cycles'] == 31
+    status, etag, body = server.Respond('GET', '/fridges/1', fridge_etags[1])
+    assert status == 200 and etag != fridge_etags[1] and 10 in json.loads(body)['cycles']
+    for fridge_id in (0, 2):
+        assert server.Respond('GET', f'/fridges/{fridge_id}', fridge_etags[fridge_id])[0] == 304
+
+
+def test_etags_of_another_server_do_not_match(fridge_data):
+    etag = FridgeServer(fridge_data).Respond('GET', '/fleet')[1]
+    assert FridgeServer(fridge_data).Respond('GET', '/fleet', etag)[0] == 200
+
+
+def test_errors_have_no_etag(fridge_data):
+    server = FridgeServer(fridge_data)
+    assert server.Respond('GET', '/fridges/9')[:2] == (404, None)
+    assert server.Respond('POST', '/fleet')[:2] == (405, None)
+    assert server.Respond('GET', '/history/99')[:2] == (404, None)
+
+
+async def Request(port, target, if_none_match=None):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    request = f"GET {target} HTTP/1.1\r\nHost: localhost\r\nConnection: close\r\n"
+    if if_none_match is not None:
+        request += f"If-None-Match: {if_none_match}\r\n"
+    writer.write((request + "\r\n").encode('latin-1'))
+    response = await reader.read()
+    writer.close()
+    head, _, body = response.partition(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    headers = {name.lower(): value.strip() for name, value in (line.split(':', 1) for line in lines[1:])}
+    return int(lines[0].split(' ')[1]), headers, body
+
+
+def test_history_records_over_a_connection(fridge_data):
+    server = FridgeServer(fridge_data)
+
+    async def Run():
+        server._lock = asyncio.Lock()
+        listener = await asyncio.start_server(server._Handle_Connection, '127.0.0.1', 0)
+        port = listener.sockets[0].getsockname()[1]
+        async with listener:
+            status, headers, body = await Request(port, '/fleet')
+            assert status == 200 and json.loads(body)['fleet']['num_of_cycles'] == 30
+            status, headers, body = await Request(port, '/history')
+            assert status == 200 and len(json.loads(body)['records']) == 2
+            status, headers, body = await Request(port, '/history/1?cycles=1')
+            assert status == 200
+            record = json.loads(body)
+            assert record['record'] == 1 and sorted(record['cycles']) == ['0', '1', '2']
+            assert sum(len(cycles) for cycles in record['cycles'].values()) == 30
+            status, again, body = await Request(port, '/history/1?cycles=1', headers['etag'])
+            assert status == 304 and body == b'' and again['content-length'] == '0'
+            status, headers, body = await Request(port, '/history/0')
+            assert status == 200 and json.loads(body)['record'] == 0
+
+    asyncio.run(Run())
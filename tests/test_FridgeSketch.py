@@ -0,0 +1,142 @@
+"""
+QuantileSketch against exact quantiles of the values kept in a sorted list
+"""
+import math
+import random
+import pytest
+from FridgeSketch import QuantileSketch, QUANTILES
+
+ACCURACY = 0.01
+
+
+def Exact(values, quantile):
+    # Nearest rank, as the sketch
+    values = sorted(values)
+    return values[max(1, math.ceil(quantile * len(values) - 1e-9)) - 1]
+
+
+def Assert_Close(sketch, values, quantiles=QUANTILES.values()):
+    assert sketch.Count() == len(values)
+    for quantile in quantiles:
+        exact = Exact(values, quantile)
+        assert sketch.Quantile(quantile) == pytest.approx(exact, rel=ACCURACY, abs=1e-9), quantile
+
+
+def Durations(rng, number):
+    # Seconds to weeks, as phase durations are, with some repeats and a few zero and negative
+    # (out of order log lines) values
+    values = [rng.lognormvariate(8, 2) for _ in range(number)]
+    values += [rng.choice(values) for _ in range(number // 10)]
+    values += [0.0] * (number // 50) + [-rng.uniform(1, 1000) for _ in range(number // 50)]
+    rng.shuffle(values)
+    return values
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_quantiles_within_accuracy(seed):
+    rng = random.Random(seed)
+    values = Durations(rng, 2000)
+    sketch = QuantileSketch(ACCURACY)
+    for value in values:
+        sketch.Add(value)
+    Assert_Close(sketch, values, [0.0, 0.01, 0.25] + list(QUANTILES.values()) + [1.0])
+    assert sketch.Quantiles().keys() == QUANTILES.keys()
+
+
+@pytest.mark.parametrize('number', range(1, 13))
+def test_small_counts_take_the_nearest_rank(number):
+    # Far enough apart that each value has its own bucket, so the sketch must land on the exact one
+    values = [-4.0, 0.0] + [2.0 ** n for n in range(number - 2)] if number > 2 else [3.0, 7.0][:number]
+    sketch = QuantileSketch(ACCURACY)
+    for value in reversed(values):
+        sketch.Add(value)
+    Assert_Close(sketch, values, [0.0, 0.1, 0.25, 0.5, 0.75] + list(QUANTILES.values()) + [1.0])
+    # p50 of an even count is the lower middle value, the top ones only the largest for few values
+    assert sketch.Quantile(0.5) == pytest.approx(sorted(values)[(number + 1) // 2 - 1], rel=ACCURACY)
+    assert sketch.Quantile(1.0) == pytest.approx(max(values), rel=ACCURACY)
+    assert sketch.Quantile(0.0) == pytest.approx(min(values), rel=ACCURACY)
+
+
+def test_nearest_rank_of_a_hundred_values():
+    values = [1.1 ** n for n in range(1, 101)]
+    sketch = QuantileSketch(ACCURACY)
+    for value in values:
+        sketch.Add(value)
+    for quantile, rank in [(0.07, 7), (0.075, 8), (0.5, 50), (0.505, 51), (0.95, 95), (0.99, 99), (0.995, 100)]:
+        assert sketch.Quantile(quantile) == pytest.approx(values[rank - 1], rel=ACCURACY)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_remove_matches_never_added(seed):
+    rng = random.Random(seed)
+    values = Durations(rng, 1000)
+    removed = rng.sample(range(len(values)), 400)
+    kept = [value for i, value in enumerate(values) if i not in set(removed)]
+    sketch = QuantileSketch(ACCURACY)
+    for value in values:
+        sketch.Add(value)
+    for i in removed:
+        sketch.Remove(values[i])
+    fresh = QuantileSketch(ACCURACY)
+    for value in kept:
+        fresh.Add(value)
+    assert sketch.__getstate__() == fresh.__getstate__()
+    Assert_Close(sketch, kept)
+
+
+def test_remove_everything_leaves_an_empty_sketch():
+    sketch = QuantileSketch(ACCURACY)
+    for value in [5.0, 0.0, -3.0, 5.0]:
+        sketch.Add(value)
+    for value in [5.0, 0.0, -3.0, 5.0]:
+        sketch.Remove(value)
+    assert sketch.Count() == 0
+    assert sketch.Quantiles() == {name: None for name in QUANTILES}
+    assert sketch.__getstate__() == QuantileSketch(ACCURACY).__getstate__()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_merge_and_subtract(seed):
+    rng = random.Random(seed)
+    values = Durations(rng, 1500)
+    parts = [values[:500], values[500:900], values[900:]]
+    sketches = []
+    for part in parts:
+        sketch = QuantileSketch(ACCURACY)
+        for value in part:
+            sketch.Add(value)
+        sketches.append(sketch)
+    whole = QuantileSketch(ACCURACY)
+    for value in values:
+        whole.Add(value)
+
+    merged = QuantileSketch(ACCURACY)
+    for sketch in sketches:
+        merged.Merge(sketch)
+    assert merged.__getstate__() == whole.__getstate__()
+    Assert_Close(merged, values)
+
+    merged.Subtract(sketches[1])
+    Assert_Close(merged, parts[0] + parts[2])
+
+
+def test_folded_buckets_keep_the_high_quantiles():
+    rng = random.Random(7)
+    # Values over twelve orders of magnitude, far more buckets than allowed; only the top
+    # couple of orders keep their own buckets
+    values = [10 ** rng.uniform(-3, 9) for _ in range(5000)]
+    sketch = QuantileSketch(ACCURACY, max_buckets=200)
+    for value in values:
+        sketch.Add(value)
+    assert len(sketch._positive) <= 200
+    Assert_Close(sketch, values, [0.95, 0.99])
+
+    # Merging in a sketch folded at a lower point, and taking it out again
+    other = QuantileSketch(ACCURACY, max_buckets=200)
+    other_values = [10 ** rng.uniform(-3, 6) for _ in range(2000)]
+    for value in other_values:
+        other.Add(value)
+    sketch.Merge(other)
+    Assert_Close(sketch, values + other_values, [0.95, 0.99])
+    sketch.Subtract(other)
+    Assert_Close(sketch, values, [0.95, 0.99])
@@ -0,0 +1,123 @@
+"""
+FridgeData.Update in batches (out of order, replacing and appending cycles), and Ingest, against a
+FridgeData made from scratch over the same lines
+"""
+import os
+import random
+import pytest
+from FridgeData import FridgeData
+from FridgeLogGenerator import Generate_Log_Lines
+
+
+def Summary_Values(summary):
+    return summary.num_of_cycles, summary.total_time, summary.totals, summary.averages, \
+        summary.percents, summary.percentiles
+
+
+def Wait_Times(fridge_data, fridge_id):
+    return {cycle: record.next_cycle_wait_time
+            for cycle, record in fridge_data.Get_Fridge_Cycle_Data(fridge_id).items()}
+
+
+def Assert_Matches_Scratch(tmp_path, fridge_data, lines):
+    scratch = FridgeData(history_file=str(tmp_path / 'scratch.journal'), report=None)
+    scratch.Update(lines)
+    assert fridge_data.List_Fridges() == scratch.List_Fridges()
+    for fridge_id in scratch.List_Fridges():
+        assert Summary_Values(fridge_data.Get_Fridge_Summary_Data(fridge_id)) == \
+               Summary_Values(scratch.Get_Fridge_Summary_Data(fridge_id))
+        assert Wait_Times(fridge_data, fridge_id) == Wait_Times(scratch, fridge_id)
+    assert Summary_Values(fridge_data.Get_Fleet_Summary_Data()) == \
+           Summary_Values(scratch.Get_Fleet_Summary_Data())
+    scratch.Close()
+
+
+def Update_In_Batches(tmp_path, rng, lines, check_every_batch=True):
+    fridge_data = FridgeData(history_file=str(tmp_path / 'update.journal'), report=None)
+    position = 0
+    while position < len(lines):
+        number = rng.randint(1, 30)
+        fridge_data.Update(lines[position:position + number])
+        position += number
+        if check_every_batch:
+            Assert_Matches_Scratch(tmp_path, fridge_data, lines[:position])
+    return fridge_data
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_out_of_order_cycles(tmp_path, seed):
+    rng = random.Random(seed)
+    lines = list(Generate_Log_Lines(4, 30, seed=seed, out_of_order=0.4))
+    fridge_data = Update_In_Batches(tmp_path, rng, lines)
+    fridge_data.Close()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_cycles_arriving_backwards(tmp_path, seed):
+    rng = random.Random(seed)
+    lines = list(Generate_Log_Lines(3, 25, seed=seed, header=False))
+    lines.reverse()
+    fridge_data = Update_In_Batches(tmp_path, rng, lines)
+    fridge_data.Close()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_replaced_cycles(tmp_path, seed):
+    rng = random.Random(seed)
+    lines = list(Generate_Log_Lines(3, 25, seed=seed, corrections=0.3))
+    # And the same cycles again later, from another log with other times
+    others = list(Generate_Log_Lines(3, 25, seed=seed + 100, header=False))
+    lines += rng.sample(others, len(others) // 3)
+    fridge_data = Update_In_Batches(tmp_path, rng, lines)
+    fridge_data.Close()
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_appended_cycles(tmp_path, seed):
+    lines = list(Generate_Log_Lines(4, 40, seed=seed))
+    fridge_data = FridgeData(history_file=str(tmp_path / 'update.journal'), report=None)
+    fridge_data.Update(lines[:len(lines) // 2])
+    for line in lines[len(lines) // 2:]:
+        fridge_data.Update([line])
+    Assert_Matches_Scratch(tmp_path, fridge_data, lines)
+    fridge_data.Close()
+
+
+def Ingest_All(fridge_data, source, chunk_lines):
+    return [progress for progress in fridge_data.Ingest(source, chunk_lines=chunk_lines)]
+
+
+@pytest.mark.parametrize('chunk_lines', [1, 7, 50, 100000])
+def test_ingest_matches_update(tmp_path, chunk_lines):
+    lines = list(Generate_Log_Lines(4, 30, seed=chunk_lines, out_of_order=0.3, comments=0.1, invalid=0.1,
+                                    corrections=0.2))
+    path = str(tmp_path / 'fridge.log')
+    with open(path, 'w') as log_file:
+        log_file.write("".join(line + "\n" for line in lines))
+    fridge_data = FridgeData(history_file=str(tmp_path / 'ingest.journal'), report=None)
+    progress = Ingest_All(fridge_data, path, chunk_lines)
+    assert progress[-1]['lines'] == len(lines)
+    assert progress[-1]['bytes'] == progress[-1]['total_bytes'] == os.path.getsize(path)
+    assert len(progress) == -(-len(lines) // chunk_lines)
+    Assert_Matches_Scratch(tmp_path, fridge_data, lines)
+    fridge_data.Close()
+
+    # The same from an open file of text lines
+    fridge_data = FridgeData(history_file=str(tmp_path / 'text.journal'), report=None)
+    with open(path) as log_file:
+        Ingest_All(fridge_data, log_file, chunk_lines)
+    Assert_Matches_Scratch(tmp_path, fridge_data, lines)
+    fridge_data.Close()
+
+
+def test_ingest_leaves_a_partial_last_line(tmp_path):
+    lines = list(Generate_Log_Lines(2, 10, seed=5))
+    path = str(tmp_path / 'fridge.log')
+    with open(path, 'w') as log_file:
+        log_file.write("".join(line + "\n" for line in lines[:-1]) + lines[-1][:-4])
+    fridge_data = FridgeData(history_file=str(tmp_path / 'ingest.journal'), report=None)
+    progress = Ingest_All(fridge_data, path, 6)
+    assert progress[-1]['lines'] == len(lines) - 1
+    assert progress[-1]['bytes'] == os.path.getsize(path) - len(lines[-1]) + 4
+    Assert_Matches_Scratch(tmp_path, fridge_data, lines[:-1])
+    fridge_data.Close()
@@ -0,0 +1,147 @@
+"""
+Cycle views and rankings against sorting every cycle
+"""
+import random
+from datetime import datetime, timedelta
+import pytest
+from FridgeData import FridgeData, Render_Fridge
+from FridgeRecords import PHASES
+from FridgeViews import CycleView, CycleRankIndex, Top_Cycles, Last_Cycles, Top_Cycles_Of
+
+
+def Brute_Ranked(durations, smallest=False):
+    return sorted(((duration, cycle_id) for cycle_id, duration in durations.items() if duration is not None),
+                  reverse=not smallest)
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_rank_index_follows_changed_durations(seed):
+    rng = random.Random(seed)
+    # Few distinct durations, so ties (broken by cycle id) are common
+    durations = {cycle_id: rng.choice([None, 5, 10, 10, 20, 30]) for cycle_id in range(30)}
+    index = CycleRankIndex('cooldown_time', {cycle_id: {'cooldown_time': duration}
+                                             for cycle_id, duration in durations.items()})
+    for _ in range(300):
+        cycle_id = rng.randrange(40)
+        duration = rng.choice([None, 0, 5, 10, 15, 20, 30, rng.uniform(0, 40)])
+        durations[cycle_id] = duration
+        index.Set(cycle_id, duration)
+        assert list(index.Ranked()) == Brute_Ranked(durations)
+        assert list(index.Ranked(smallest=True)) == Brute_Ranked(durations, smallest=True)
+        assert len(index) == sum(duration is not None for duration in durations.values())
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('smallest', [False, True])
+def test_top_cycles_merges_the_fridges(seed, smallest):
+    rng = random.Random(seed)
+    fridges = {fridge_id: {cycle_id: {'warmup_time': rng.choice([None, rng.randint(0, 50)])}
+                           for cycle_id in range(rng.randint(0, 20))}
+               for fridge_id in range(6)}
+    everything = sorted(((cycle['warmup_time'], fridge_id, cycle_id)
+                         for fridge_id, cycles in fridges.items() for cycle_id, cycle in cycles.items()
+                         if cycle['warmup_time'] is not None), reverse=not smallest)
+    indexes = {fridge_id: CycleRankIndex('warmup_time', cycles) for fridge_id, cycles in fridges.items()}
+    for n in [0, 1, 5, len(everything), len(everything) + 5]:
+        ranked = {fridge_id: index.Ranked(smallest) for fridge_id, index in indexes.items()}
+        assert Top_Cycles(ranked, n, smallest) == everything[:n]
+        top = Top_Cycles_Of(sorted(fridges), fridges.get, 'warmup_time', n, smallest)
+        assert [entry[:3] for entry in top] == everything[:n]
+
+
+def test_cycle_view_is_a_mapping_over_its_positions():
+    cycles = {cycle_id: 'record %d' % cycle_id for cycle_id in [2, 3, 5, 8, 13, 21]}
+    cycle_ids = sorted(cycles)
+    view = CycleView(cycles, cycle_ids, range(1, 4))
+    assert list(view) == [3, 5, 8]
+    assert len(view) == 3
+    assert dict(view) == {3: 'record 3', 5: 'record 5', 8: 'record 8'}
+    assert 2 not in view and 13 not in view and 4 not in view and 5 in view
+    with pytest.raises(KeyError):
+        view[13]
+    assert list(CycleView(cycles, cycle_ids, range(0))) == []
+
+
+def test_last_cycles():
+    cycles = {cycle_id: cycle_id * 10 for cycle_id in random.Random(1).sample(range(1000), 50)}
+    for n in [0, 1, 10, 50, 60]:
+        view = Last_Cycles(cycles, n)
+        assert list(view) == (sorted(cycles)[-n:] if n else [])
+        assert all(view[cycle_id] == cycle_id * 10 for cycle_id in view)
+
+
+def Log_Line(fridge_id, cycle_id, times):
+    return f"{fridge_id},{cycle_id}," + ",".join(f"{t:%Y-%m-%d %H:%M:%S}" for t in times) + "\n"
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_fridge_data_rankings_stay_up_to_date(tmp_path, seed):
+    """
+    Rankings asked for early are kept up to date through new cycles and corrections, including the
+    wait of the cycle before each changed one
+    """
+    rng = random.Random(seed)
+    fridge_data = FridgeData(history_file=str(tmp_path / 'h.journal'))
+
+    def Random_Line():
+        start = datetime(2020, 1, 1) + timedelta(hours=rng.randint(0, 20000))
+        times = [start]
+        for _ in range(3):
+            times.append(times[-1] + timedelta(minutes=rng.choice([10, 20, 30, rng.randint(1, 5000)])))
+        return Log_Line(rng.randint(0, 3), rng.randint(0, 25), times)
+
+    fridge_data.Update([Random_Line() for _ in range(40)])
+    for phase in PHASES:
+        fridge_data.Get_Top_Cycles(phase)
+    for _ in range(15):
+        fridge_data.Update([Random_Line() for _ in range(rng.randint(1, 6))])
+        for phase in PHASES:
+            for smallest in [False, True]:
+                everything = sorted(((getattr(cycle, phase), fridge_id, cycle_id)
+                                     for fridge_id in fridge_data.List_Fridges()
+                                     for cycle_id, cycle in fridge_data.Get_Fridge_Cycle_Data(fridge_id).items()
+                                     if getattr(cycle, phase) is not None), reverse=not smallest)
+                top = fridge_data.Get_Top_Cycles(phase, 8, smallest=smallest)
+                assert [(seconds, cycle.fridge_id, cycle.cycle) for seconds, cycle in top] == everything[:8]
+                fridge_id = rng.choice(list(fridge_data.List_Fridges()))
+                top = fridge_data.Get_Top_Cycles(phase, 3, fridge_id, smallest)
+                assert [(seconds, cycle.fridge_id, cycle.cycle) for seconds, cycle in top] == \
+                       [entry for entry in everything if entry[1] == fridge_id][:3]
+    fridge_data.Close()
+
+
+def test_fridge_cycle_view_pages(tmp_path):
+    fridge_data = FridgeData(history_file=str(tmp_path / 'h.journal'))
+    start = datetime(2020, 1, 1)
+    fridge_data.Update([Log_Line(0, cycle_id, [start + timedelta(days=cycle_id * 10 + day) for day in range(4)])
+                        for cycle_id in range(0, 40, 2)])
+    cycle_ids = sorted(fridge_data.Get_Fridge_Cycle_Data(0))
+    for offset in [0, 3, 19, 20, 25, -1, -5, -30]:
+        for limit in [None, 0, 1, 4, 100]:
+            view = fridge_data.Get_Fridge_Cycle_View(0, offset, limit)
+            first = max(0, len(cycle_ids) + offset) if offset < 0 else offset
+            expected = cycle_ids[first:] if limit is None else cycle_ids[first:first + limit]
+            assert list(view) == expected, (offset, limit)
+            assert all(view[cycle_id] is fridge_data.Get_Fridge_Cycle_Data(0)[cycle_id] for cycle_id in view)
+    assert fridge_data.Get_Fridge_Cycle_View(7) is None
+    fridge_data.Close()
+
+
+def test_selected_cycle_is_listed_with_last(tmp_path):
+    fridge_data = FridgeData(history_file=str(tmp_path / 'h.journal'))
+    start = datetime(2020, 1, 1)
+    fridge_data.Update([Log_Line(0, cycle_id, [start + timedelta(days=cycle_id * 10 + day) for day in range(4)])
+                        for cycle_id in range(10)])
+
+    def Listed(**kwargs):
+        block = Render_Fridge(fridge_data, 0, showSummary=False, **kwargs)
+        return [int(line.split()[0]) for line in block.splitlines()[2:-1]]
+
+    assert Listed(last=3) == [7, 8, 9]
+    assert Listed(last=3, selected_cycle=2) == [2]
+    assert Listed(last=3, selected_cycle=8) == [8]
+    assert Listed(selected_cycle=42) == []
+    # Within a time window the selected cycle still has to fall in it
+    assert Listed(last=1, selected_cycle=2, start=start + timedelta(days=15)) == [2]
+    assert Listed(last=1, selected_cycle=0, start=start + timedelta(days=15)) == []
+    fridge_data.Close()
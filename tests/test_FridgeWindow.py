@@ -0,0 +1,111 @@
+"""
+CycleWindowIndex against summing every cycle's clipped phases by hand
+"""
+import random
+import pytest
+from FridgeRecords import CycleRecord
+from FridgeWindow import CycleWindowIndex, PHASES
+
+
+def _Overlap(interval_start, interval_end, start, end):
+    return max(0, min(interval_end, end) - max(interval_start, start))
+
+
+def Brute_Summary(cycle_ids, cycles, start, end):
+    totals = {phase: 0 for phase in PHASES}
+    number_of_cycles = 0
+    for i, cycle_id in enumerate(cycle_ids):
+        cycle = cycles[cycle_id]
+        if cycle.cooldown_start < end and cycle.warmup_end > start:
+            number_of_cycles += 1
+        totals['cooldown_time'] += _Overlap(cycle.cooldown_start, cycle.cooldown_end, start, end)
+        totals['running_time'] += _Overlap(cycle.cooldown_end, cycle.warmup_start, start, end)
+        totals['warmup_time'] += _Overlap(cycle.warmup_start, cycle.warmup_end, start, end)
+        if i + 1 < len(cycle_ids):
+            totals['next_cycle_wait_time'] += _Overlap(cycle.warmup_end, cycles[cycle_ids[i + 1]].cooldown_start,
+                                                       start, end)
+    if number_of_cycles == 0:
+        return None
+    first, last = cycles[cycle_ids[0]], cycles[cycle_ids[-1]]
+    return number_of_cycles, _Overlap(first.cooldown_start, last.warmup_end, start, end), totals
+
+
+def Make_Cycles(rng, number, ordered=True):
+    cycles = {}
+    t = 1000000
+    for cycle_id in range(number):
+        if ordered:
+            times = [t]
+            for _ in range(3):
+                times.append(times[-1] + rng.randint(0, 500))
+            t = times[-1] + rng.randint(0, 300)
+        else:
+            times = sorted(rng.randint(1000000, 1000000 + 300 * number) for _ in range(4))
+        cycles[cycle_id] = CycleRecord(0, cycle_id, *times)
+    return cycles
+
+
+def Windows(rng, cycles, count=200):
+    low = min(cycle.cooldown_start for cycle in cycles.values()) - 100
+    high = max(cycle.warmup_end for cycle in cycles.values()) + 100
+    windows = [(low, high), (low, low + 1), (high - 1, high)]
+    for _ in range(count):
+        start = rng.randint(low, high)
+        windows.append((start, start + rng.randint(0, (high - low) // rng.choice([1, 5, 50]) + 1)))
+    # Windows starting or ending exactly on phase boundaries
+    for cycle in rng.sample(list(cycles.values()), min(10, len(cycles))):
+        windows.append((cycle.cooldown_end, cycle.warmup_end))
+        windows.append((cycle.warmup_start, cycle.warmup_end + 1))
+    return windows
+
+
+@pytest.mark.parametrize('seed', range(5))
+@pytest.mark.parametrize('ordered', [True, False])
+def test_summary_matches_brute_force(seed, ordered):
+    rng = random.Random(seed)
+    cycles = Make_Cycles(rng, rng.choice([1, 2, 3, 40]), ordered)
+    cycle_ids = sorted(cycles)
+    index = CycleWindowIndex()
+    index.Rebuild_From(0, cycle_ids, cycles)
+    if ordered:
+        assert index.Is_Ordered()
+    for start, end in Windows(rng, cycles):
+        assert index.Summary(start, end) == Brute_Summary(cycle_ids, cycles, start, end), (start, end)
+        expected_ids = [cycle_id for cycle_id in cycle_ids
+                        if cycles[cycle_id].cooldown_start < end and cycles[cycle_id].warmup_end > start]
+        assert index.Window_Cycle_Ids(start, end) == expected_ids
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_rebuild_from_matches_full_build(seed):
+    rng = random.Random(seed)
+    cycles = Make_Cycles(rng, 30)
+    cycle_ids = sorted(cycles)
+    index = CycleWindowIndex()
+    index.Rebuild_From(0, cycle_ids, cycles)
+    for _ in range(20):
+        # Correct a cycle, or append a new one, and bring the index up to date from there only
+        if rng.random() < 0.5:
+            cycle_id = rng.choice(cycle_ids)
+            cycle = cycles[cycle_id]
+            shift = rng.randint(-50, 50)
+            cycle.Set_Timestamps(cycle.cooldown_start, cycle.cooldown_end, cycle.warmup_start,
+                                 max(cycle.warmup_start, cycle.warmup_end + shift))
+        else:
+            last = cycles[cycle_ids[-1]]
+            cycle_id = cycle_ids[-1] + 1
+            start = last.warmup_end + rng.randint(0, 300)
+            cycles[cycle_id] = CycleRecord(0, cycle_id, start, start + 10, start + 20, start + 30)
+            cycle_ids.append(cycle_id)
+        index.Rebuild_From(cycle_ids.index(cycle_id), cycle_ids, cycles)
+
+        full = CycleWindowIndex()
+        full.Rebuild_From(0, cycle_ids, cycles)
+        assert (index.cycle_ids, index.boundaries, index.prefix, index.unordered) == \
+               (full.cycle_ids, full.boundaries, full.prefix, full.unordered)
+        for start, end in Windows(rng, cycles, 20):
+            assert index.Summary(start, end) == Brute_Summary(cycle_ids, cycles, start, end)
+
+
+def test_empty_index_has_no_summary():
+    assert CycleWindowIndex().Summary(0, 10) is None